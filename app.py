@@ -8,10 +8,17 @@ import streamlit as st
 import os
 import json
 import re
+import sqlite3
 import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 
+import estimator
+from concurrency import DEFAULT_CLAUDE_WORKERS, DEFAULT_OLLAMA_WORKERS
+
 # --- Configuration ---
 st.set_page_config(
     page_title="Nare",
@@ -24,7 +31,8 @@ DATA_DIR = Path.home() / ".pm_saboteurs"
 DATA_DIR.mkdir(exist_ok=True)
 
 PREFS_FILE = DATA_DIR / "preferences.json"
-CACHE_FILE = DATA_DIR / "cache.json"
+CACHE_FILE = DATA_DIR / "cache.json"  # Legacy JSON cache; its keys predate the current format, so it is not read
+CACHE_DB = DATA_DIR / "cache.db"
 LOG_FILE = DATA_DIR / "interactions.log"
 FEEDBACK_FILE = DATA_DIR / "feedback.json"
 AUDIT_FILE = DATA_DIR / "audit_trail.json"
@@ -59,6 +67,8 @@ def log_interaction(event_type: str, data: dict, include_content: bool = True):
             "backend": data.get("backend"),
             "cost": data.get("cost"),
             "latency": data.get("latency"),
+            "input_tokens": data.get("input_tokens"),
+            "output_tokens": data.get("output_tokens"),
         }
     
     # Append to log file
@@ -292,61 +302,387 @@ def record_preference(winner: str, context: str):
     record_audit_event("model_preference", {"winner": winner, "context": context})
 
 
+@st.cache_resource
+def get_prefs_lock() -> threading.Lock:
+    """Process-wide lock guarding read-modify-write of the preferences file."""
+    return threading.Lock()
+
+
 def record_cost(cost: float):
     """Add to total cost tracker."""
-    prefs = load_preferences()
-    prefs["total_cost"] = prefs.get("total_cost", 0.0) + cost
-    save_preferences(prefs)
+    # Eval runs record costs from worker threads
+    with get_prefs_lock():
+        prefs = load_preferences()
+        prefs["total_cost"] = prefs.get("total_cost", 0.0) + cost
+        save_preferences(prefs)
 
 
 # --- Response Caching ---
-def load_cache():
-    """Load response cache from file."""
-    if CACHE_FILE.exists():
-        try:
-            return json.loads(CACHE_FILE.read_text())
-        except:
-            pass
-    return {}
+CACHE_MAX_ENTRIES = 20_000  # LRU cap
+CACHE_TTL_SECONDS = 30 * 24 * 3600  # Entries older than this are treated as misses
+CACHE_EVICT_INTERVAL = 100  # Run an eviction sweep every N writes
+SEMANTIC_CACHE_THRESHOLD = 0.95  # Min cosine similarity for a near-duplicate entry to reuse a response
 
 
-def save_cache(cache):
-    """Save response cache to file."""
-    # Keep cache under 100 entries
-    if len(cache) > 100:
-        # Remove oldest entries
-        sorted_keys = sorted(cache.keys(), key=lambda k: cache[k].get('timestamp', 0))
-        for key in sorted_keys[:len(cache) - 100]:
-            del cache[key]
-    CACHE_FILE.write_text(json.dumps(cache, indent=2))
+def connect_cache_db() -> sqlite3.Connection:
+    """
+    Open a connection to the response cache.
+    
+    SQLite in WAL mode lets concurrent Streamlit sessions read while one writes;
+    connections are cheap, so each call opens its own instead of sharing one
+    across threads.
+    """
+    init_cache_db()
+    conn = sqlite3.connect(CACHE_DB, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
 
 
-def get_cache_key(context: str, user_input: str, use_rag: bool) -> str:
-    """Generate a cache key from inputs."""
+@st.cache_resource
+def init_cache_db() -> bool:
+    """Create the cache schema once per process."""
+    conn = sqlite3.connect(CACHE_DB, timeout=10, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                stats TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        # Embeddings of cached inputs for the semantic tier, partitioned by scope
+        # (context, model, RAG on/off, prompt version, encoder). AUTOINCREMENT ids
+        # are never reused, so readers can pick up new rows by id. The table
+        # only holds derived data, so one from before ids is simply rebuilt.
+        schema = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'semantic_index'").fetchone()
+        if schema and "AUTOINCREMENT" not in schema[0]:
+            conn.execute("DROP TABLE semantic_index")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_index (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                scope TEXT NOT NULL,
+                embedding BLOB NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_semantic_scope ON semantic_index(scope)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_stats (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            )
+        """)
+    finally:
+        conn.close()
+    return True
+
+
+def evict_cache(conn: sqlite3.Connection):
+    """Drop expired entries, then least recently used ones beyond CACHE_MAX_ENTRIES."""
+    conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - CACHE_TTL_SECONDS,))
+    conn.execute(
+        "DELETE FROM responses WHERE key IN "
+        "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+        (CACHE_MAX_ENTRIES,)
+    )
+    stale = [key for (key,) in conn.execute("SELECT key FROM semantic_index WHERE key NOT IN (SELECT key FROM responses)")]
+    conn.executemany("DELETE FROM semantic_index WHERE key = ?", [(key,) for key in stale])
+    remove_from_semantic_index(stale)
+
+
+def clear_cache():
+    """Remove every cached response."""
+    conn = connect_cache_db()
+    try:
+        conn.execute("DELETE FROM responses")
+        conn.execute("DELETE FROM semantic_index")
+        conn.execute("DELETE FROM cache_stats WHERE name != 'generation'")
+        # Tells other processes' in-memory semantic indexes to reload
+        conn.execute("INSERT INTO cache_stats VALUES ('generation', 1) "
+                     "ON CONFLICT(name) DO UPDATE SET value = value + 1")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    reset_semantic_index()
+
+
+def get_cache_size() -> int:
+    """Number of cached responses."""
+    conn = connect_cache_db()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def get_cache_key(context: str, user_input: str, use_rag: bool, model: str = "", rag_context: str = "") -> str:
+    """Generate a cache key from inputs, the model and the prompt version."""
     import hashlib
-    content = f"{context}|{user_input}|{use_rag}"
+    content = f"{context}|{user_input}|{use_rag}|{model}|{PROMPT_VERSION}|{rag_context}"
     return hashlib.md5(content.encode()).hexdigest()
 
-def get_cached_response(context: str, user_input: str, use_rag: bool) -> tuple[str, dict] | None:
+def get_cached_response(context: str, user_input: str, use_rag: bool,
+                        model: str = "", rag_context: str = "") -> tuple[str, dict] | None:
     """Get cached response if available."""
-    cache = load_cache()
-    key = get_cache_key(context, user_input, use_rag)
-    if key in cache:
-        entry = cache[key]
-        return entry['response'], entry['stats']
-    return None
+    key = get_cache_key(context, user_input, use_rag, model, rag_context)
+    now = time.time()
+    conn = connect_cache_db()
+    try:
+        row = conn.execute(
+            "SELECT response, stats, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        response, stats, created_at = row
+        if now - created_at > CACHE_TTL_SECONDS:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        # Touch for LRU ordering
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return response, json.loads(stats)
+    finally:
+        conn.close()
+
+def cache_response(context: str, user_input: str, use_rag: bool, response: str, stats: dict,
+                   model: str = "", rag_context: str = "", embedding=None):
+    """
+    Cache a response for future use.
+    
+    Args:
+        embedding: Optional normalized embedding of user_input; indexes the
+            entry for semantic (near-duplicate) lookups
+    """
+    key = get_cache_key(context, user_input, use_rag, model, rag_context)
+    now = time.time()
+    conn = connect_cache_db()
+    try:
+        cursor = conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (key, response, json.dumps(stats), now, now)
+        )
+        rowid = cursor.lastrowid
+        if embedding is not None:
+            conn.execute(
+                "INSERT OR REPLACE INTO semantic_index (key, scope, embedding) VALUES (?, ?, ?)",
+                (key, get_semantic_scope(context, use_rag, model), embedding.astype("float32").tobytes())
+            )
+        # rowids grow monotonically across processes, so they double as a write counter
+        if rowid % CACHE_EVICT_INTERVAL == 0:
+            evict_cache(conn)
+    finally:
+        conn.close()
 
-def cache_response(context: str, user_input: str, use_rag: bool, response: str, stats: dict):
-    """Cache a response for future use."""
-    import time
-    cache = load_cache()
-    key = get_cache_key(context, user_input, use_rag)
-    cache[key] = {
-        'response': response,
-        'stats': stats,
-        'timestamp': time.time()
+
+def get_semantic_scope(context: str, use_rag: bool, model: str) -> str:
+    """Partition for semantic matches: only the input text may differ, and only embeddings of one encoder are compared."""
+    import hashlib
+    from rag import ENCODER_ID
+    return hashlib.md5(f"{context}|{use_rag}|{model}|{PROMPT_VERSION}|{ENCODER_ID}".encode()).hexdigest()
+
+
+def embed_for_semantic_cache(user_input: str):
+    """Normalized embedding of the input from rag's encoder, or None if RAG deps are unavailable."""
+    try:
+        import numpy as np
+        from rag import embed_query
+        # Shares rag's query embedding cache, so with RAG on this is usually free
+        vector = embed_query(user_input)
+        return vector / (np.linalg.norm(vector) or 1.0)
+    except Exception:
+        return None
+
+
+# --- Semantic Index ---
+# Normalized embeddings of cached inputs, held in memory per scope so a lookup
+# is one matrix-vector product instead of reading every blob from SQLite.
+# Rows written since the last lookup (by any process) are picked up by id.
+@st.cache_resource
+def get_semantic_indexes() -> dict:
+    """Process-wide per-scope embedding matrices, the highest id loaded and the cache generation."""
+    return {"lock": threading.Lock(), "scopes": {}, "max_id": 0, "generation": 0}
+
+
+def _add_semantic_row(index: dict, key: str, vector):
+    """Insert or overwrite one key's row, doubling the matrix when full."""
+    import numpy as np
+    
+    if index["matrix"] is not None and len(vector) != index["matrix"].shape[1]:
+        return  # Written by a different encoder; never comparable
+    if key in index["positions"]:
+        index["matrix"][index["positions"][key]] = vector
+        return
+    if index["matrix"] is None:
+        index["matrix"] = np.empty((64, len(vector)), dtype="float32")
+    elif index["size"] == len(index["matrix"]):
+        index["matrix"] = np.concatenate([index["matrix"], np.empty_like(index["matrix"])])
+    index["matrix"][index["size"]] = vector
+    index["positions"][key] = index["size"]
+    index["keys"].append(key)
+    index["size"] += 1
+
+
+def remove_from_semantic_index(keys: list):
+    """Drop keys from the in-memory index, moving the last row into each gap."""
+    indexes = get_semantic_indexes()
+    with indexes["lock"]:
+        for key in keys:
+            for index in indexes["scopes"].values():
+                position = index["positions"].pop(key, None)
+                if position is None:
+                    continue
+                last = index["size"] - 1
+                if position != last:
+                    moved_key = index["keys"][last]
+                    index["matrix"][position] = index["matrix"][last]
+                    index["keys"][position] = moved_key
+                    index["positions"][moved_key] = position
+                index["keys"].pop()
+                index["size"] -= 1
+                break
+
+
+def reset_semantic_index():
+    """Forget everything loaded; the next lookup reloads from SQLite."""
+    indexes = get_semantic_indexes()
+    with indexes["lock"]:
+        indexes["scopes"].clear()
+        indexes["max_id"] = 0
+
+
+def sync_semantic_index(conn: sqlite3.Connection, indexes: dict):
+    """Load semantic_index rows added since the last sync. Caller holds the lock."""
+    import numpy as np
+    
+    generation = conn.execute("SELECT value FROM cache_stats WHERE name = 'generation'").fetchone()
+    generation = generation[0] if generation else 0
+    if generation != indexes["generation"]:
+        # The cache was cleared, perhaps by another process
+        indexes["scopes"].clear()
+        indexes["max_id"] = 0
+        indexes["generation"] = generation
+    
+    rows = conn.execute(
+        "SELECT id, key, scope, embedding FROM semantic_index WHERE id > ? ORDER BY id", (indexes["max_id"],)
+    ).fetchall()
+    for row_id, key, scope, blob in rows:
+        index = indexes["scopes"].setdefault(scope, {"keys": [], "positions": {}, "matrix": None, "size": 0})
+        _add_semantic_row(index, key, np.frombuffer(blob, dtype="float32"))
+        indexes["max_id"] = row_id
+
+
+def find_semantic_match(context: str, use_rag: bool, model: str, embedding,
+                        threshold: float = SEMANTIC_CACHE_THRESHOLD) -> tuple[str, dict, float] | None:
+    """Most similar cached response in the same scope, if above threshold. Returns (response, stats, similarity)."""
+    import numpy as np
+    
+    indexes = get_semantic_indexes()
+    conn = connect_cache_db()
+    try:
+        with indexes["lock"]:
+            sync_semantic_index(conn, indexes)
+            index = indexes["scopes"].get(get_semantic_scope(context, use_rag, model))
+            if not index or index["size"] == 0 or index["matrix"].shape[1] != len(embedding):
+                return None
+            similarities = index["matrix"][:index["size"]] @ embedding
+            best = int(np.argmax(similarities))
+            key = index["keys"][best]
+        if similarities[best] < threshold:
+            return None
+        
+        row = conn.execute(
+            "SELECT response, stats, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            # Evicted by another process; stop matching it
+            remove_from_semantic_index([key])
+            return None
+        if time.time() - row[2] > CACHE_TTL_SECONDS:
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return row[0], json.loads(row[1]), float(similarities[best])
+    finally:
+        conn.close()
+
+
+def record_cache_stats(**increments):
+    """Add to the persistent cache counters (hits, semantic_hits, misses, cost_saved, time_saved)."""
+    conn = connect_cache_db()
+    try:
+        conn.executemany(
+            "INSERT INTO cache_stats VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            list(increments.items())
+        )
+    finally:
+        conn.close()
+
+
+def get_cache_stats() -> dict:
+    """Cache counters with a derived hit rate."""
+    conn = connect_cache_db()
+    try:
+        stats = dict(conn.execute("SELECT name, value FROM cache_stats").fetchall())
+    finally:
+        conn.close()
+    
+    hits = int(stats.get("hits", 0))
+    misses = int(stats.get("misses", 0))
+    return {
+        "hits": hits,
+        "semantic_hits": int(stats.get("semantic_hits", 0)),
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "cost_saved": stats.get("cost_saved", 0.0),
+        "time_saved": stats.get("time_saved", 0.0),
     }
-    save_cache(cache)
+
+
+def lookup_cached_response(context: str, user_input: str, use_rag: bool,
+                           model: str = "", rag_context: str = "", embedding=None) -> tuple[str, dict] | None:
+    """
+    get_cached_response plus hit/miss accounting.
+    
+    If embedding is given, an exact miss falls back to the semantic tier.
+    On a hit, the returned stats describe this (free) request; the original
+    cost and latency are kept under cost_saved / time_saved.
+    """
+    cached = get_cached_response(context, user_input, use_rag, model, rag_context)
+    cache_tier = "exact"
+    similarity = 1.0
+    
+    if cached is None and embedding is not None:
+        match = find_semantic_match(context, use_rag, model, embedding)
+        if match:
+            cached = match[:2]
+            cache_tier = "semantic"
+            similarity = match[2]
+    
+    if cached is None:
+        record_cache_stats(misses=1)
+        return None
+    
+    response, original = cached
+    stats = dict(original)
+    stats.update({
+        "time": 0.0,
+        "cost": 0.0,
+        "cached": True,
+        "cache_tier": cache_tier,
+        "cache_similarity": similarity,
+        "cost_saved": original.get("cost", 0.0),
+        "time_saved": original.get("time", 0.0),
+    })
+    record_cache_stats(
+        hits=1,
+        semantic_hits=1 if cache_tier == "semantic" else 0,
+        cost_saved=stats["cost_saved"],
+        time_saved=stats["time_saved"]
+    )
+    return response, stats
 
 # --- Constants ---
 CONTEXTS = {
@@ -487,30 +823,188 @@ OUTPUT FORMAT:
 # Keep SAGE_SYSTEM_PROMPT as alias for compatibility
 SAGE_SYSTEM_PROMPT = PM_SABOTEURS_PROMPT
 
-# --- LLM Backends ---
-def call_anthropic(api_key: str, context: str, user_input: str, use_rag: bool = True) -> tuple[str, dict]:
-    """Call Claude API (non-streaming). Returns (response_text, usage_info)."""
+# --- HTTP Clients ---
+# One keep-alive connection pool per API key and per Ollama host, shared
+# across sessions so follow-up turns and eval loops reuse open connections
+# instead of paying TCP/TLS setup on every call.
+# Both can point at a stand-in server (see mock_llm.py) for offline benchmarks and CI.
+# OLLAMA_HOST follows the Ollama CLI's convention, where the scheme is optional.
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+if "://" not in OLLAMA_HOST:
+    OLLAMA_HOST = f"http://{OLLAMA_HOST}"
+ANTHROPIC_BASE_URL = os.environ.get("ANTHROPIC_BASE_URL") or None  # None uses the SDK default
+HTTP_POOL_SIZE = 10
+HTTP_CONNECT_TIMEOUT = 5.0
+HTTP_READ_TIMEOUT = 120.0
+
+
+@st.cache_resource
+def get_client_registry() -> dict:
+    """Process-wide pooled clients and their connection counters."""
+    return {"lock": threading.Lock(), "anthropic": {}, "ollama": {}, "stats": {}}
+
+
+def _count_request(registry: dict, name: str, new_connection: bool = False):
+    """Bump an Anthropic client's request (or new-connection) counter."""
+    with registry["lock"]:
+        counts = registry["stats"].setdefault(name, {"requests": 0, "connections": 0})
+        counts["connections" if new_connection else "requests"] += 1
+
+
+def get_anthropic_client(api_key: str):
+    """Shared anthropic.Anthropic client for an API key, backed by a pooled httpx client."""
     import anthropic
-    import time
+    import hashlib
+    try:
+        # Newer SDK releases ship their HTTP layer as httpx2 and reject plain httpx clients
+        import httpx2 as httpx
+    except ImportError:
+        import httpx
+    
+    registry = get_client_registry()
+    key_hash = hashlib.sha256(api_key.encode()).hexdigest()[:12]
+    with registry["lock"]:
+        client = registry["anthropic"].get(key_hash)
+    if client is not None:
+        return client
+    
+    name = f"anthropic:{key_hash}"
+    
+    def trace(event_name, info):
+        # httpcore reports a TCP connect only when the pool has no idle connection
+        if event_name == "connection.connect_tcp.complete":
+            _count_request(registry, name, new_connection=True)
+    
+    def on_request(request):
+        request.extensions["trace"] = trace
+        _count_request(registry, name)
+    
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        event_hooks={"request": [on_request]}
+    )
+    client = anthropic.Anthropic(api_key=api_key, base_url=ANTHROPIC_BASE_URL, http_client=http_client)
     
-    client = anthropic.Anthropic(api_key=api_key)
+    with registry["lock"]:
+        # Another session may have raced us here; keep the first client
+        return registry["anthropic"].setdefault(key_hash, client)
+
+
+def get_ollama_session(host: str = OLLAMA_HOST):
+    """Shared requests.Session for an Ollama host with a keep-alive connection pool."""
+    import requests
+    from requests.adapters import HTTPAdapter
     
-    context_info = CONTEXTS[context]
+    registry = get_client_registry()
+    with registry["lock"]:
+        session = registry["ollama"].get(host)
+    if session is not None:
+        return session
     
-    # Get RAG context if enabled
-    rag_context = ""
-    rag_sources = []
-    if use_rag:
-        try:
-            from rag import build_context
-            rag_context, rag_sources = build_context(user_input, n_results=3)
-        except Exception as e:
-            # RAG not available, continue without it
-            pass
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount(host, adapter)
+    
+    with registry["lock"]:
+        return registry["ollama"].setdefault(host, session)
+
+
+def get_connection_stats() -> dict:
+    """
+    Requests sent and connections opened per pooled client.
+    
+    Returns:
+        Dict of client name -> {"requests", "connections", "reused"}
+    """
+    registry = get_client_registry()
+    with registry["lock"]:
+        stats = {name: dict(counts) for name, counts in registry["stats"].items()}
+        sessions = dict(registry["ollama"])
+    
+    # urllib3 keeps its own counters on each connection pool
+    for host, session in sessions.items():
+        pools = session.get_adapter(host).poolmanager.pools
+        counts = {"requests": 0, "connections": 0}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                counts["requests"] += pool.num_requests
+                counts["connections"] += pool.num_connections
+        stats[f"ollama:{host}"] = counts
+    
+    for counts in stats.values():
+        counts["reused"] = max(counts["requests"] - counts["connections"], 0)
+    return stats
+
+
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+
+# Claude Sonnet pricing, $ per 1M tokens
+CLAUDE_INPUT_PRICE = 3.00
+CLAUDE_OUTPUT_PRICE = 15.00
+# Prompt caching: writing a prefix to the cache costs 25% more than plain
+# input, reading it back costs 10% of plain input
+CLAUDE_CACHE_WRITE_MULTIPLIER = 1.25
+CLAUDE_CACHE_READ_MULTIPLIER = 0.10
+
+# How long Ollama keeps a model in memory after its last request. The server
+# default (5m) unloads between journal sessions, so every first reply paid a
+# multi-second load.
+OLLAMA_KEEP_ALIVE = "30m"
+# A request whose load_duration exceeds this had to load the model first
+OLLAMA_COLD_LOAD_THRESHOLD = 0.5
+
+
+def get_rag_context(user_input: str, use_rag: bool = True) -> tuple[str, list]:
+    """Retrieve framework context for the input. Returns (rag_context, rag_sources)."""
+    if not use_rag:
+        return "", []
+    try:
+        from rag import build_context
+        return build_context(user_input)
+    except Exception:
+        # RAG not available, continue without it
+        return "", []
+
+
+def get_rag_contexts(user_inputs: list, use_rag: bool = True) -> list:
+    """
+    Retrieve framework context for many inputs with one batched embed and search.
+    Returns a (rag_context, rag_sources) per input.
+    """
+    if not use_rag:
+        return [("", [])] * len(user_inputs)
+    try:
+        from rag import build_context_many
+        return build_context_many(user_inputs)
+    except Exception:
+        return [("", [])] * len(user_inputs)
+
+
+def get_entry_rag_context(user_input: str, use_rag: bool = True) -> tuple[str, list]:
+    """
+    Retrieve framework context for the entry being answered, once per entry.
+    
+    The result is kept in session state so the cost estimate and the call that
+    follows share one retrieval, and reruns of either step don't search again.
+    """
+    key = (user_input, use_rag)
+    cached = st.session_state.get("entry_rag")
+    if cached and cached["key"] == key:
+        return cached["result"]
+    
+    result = get_rag_context(user_input, use_rag)
+    st.session_state.entry_rag = {"key": key, "result": result}
+    return result
+
+
+def build_user_message(context: str, user_input: str, rag_context: str = "") -> str:
+    """Build the first-turn user message, with RAG context if present."""
+    context_info = CONTEXTS[context]
     
-    # Build user message with RAG context
     if rag_context:
-        user_message = f"""Context: User selected "{context_info['label']}"
+        return f"""Context: User selected "{context_info['label']}"
 Prompt they responded to: "{context_info['prompt']}"
 
 Their response:
@@ -521,67 +1015,101 @@ Their response:
 RELEVANT FRAMEWORK REFERENCE (use this to ground your response):
 
 {rag_context}"""
-    else:
-        user_message = f"""Context: User selected "{context_info['label']}"
+    
+    return f"""Context: User selected "{context_info['label']}"
 Prompt they responded to: "{context_info['prompt']}"
 
 Their response:
 {user_input}"""
+
+
+def calculate_claude_cost(input_tokens: int, output_tokens: int,
+                          cache_write_tokens: int = 0, cache_read_tokens: int = 0) -> float:
+    """Dollar cost of a Claude request. input_tokens excludes cached prompt tokens."""
+    input_cost = (input_tokens / 1_000_000) * CLAUDE_INPUT_PRICE
+    cache_cost = ((cache_write_tokens * CLAUDE_CACHE_WRITE_MULTIPLIER +
+                   cache_read_tokens * CLAUDE_CACHE_READ_MULTIPLIER) / 1_000_000) * CLAUDE_INPUT_PRICE
+    output_cost = (output_tokens / 1_000_000) * CLAUDE_OUTPUT_PRICE
+    return input_cost + cache_cost + output_cost
+
+
+def parse_claude_usage(usage) -> dict:
+    """Token counts and cost from a Claude response's usage block."""
+    # Cache fields are absent on older SDKs and None when caching wasn't requested
+    cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+    cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+    return {
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "cache_write_tokens": cache_write_tokens,
+        "cache_read_tokens": cache_read_tokens,
+        "cost": calculate_claude_cost(usage.input_tokens, usage.output_tokens,
+                                      cache_write_tokens, cache_read_tokens)
+    }
+
+
+def build_claude_system(prompt_caching: bool = False):
+    """System prompt for the Messages API, marked cacheable when prompt caching is on."""
+    if not prompt_caching:
+        return SAGE_SYSTEM_PROMPT
+    return [{"type": "text", "text": SAGE_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+
+
+def call_anthropic(api_key: str, context: str, user_input: str, use_rag: bool = True,
+                   rag_result: tuple = None, prompt_caching: bool = False) -> tuple[str, dict]:
+    """
+    Call Claude API (non-streaming). Returns (response_text, usage_info).
+    
+    Args:
+        rag_result: Optional precomputed (rag_context, rag_sources); retrieved here if None
+        prompt_caching: Cache the system prompt so repeat requests bill it at the read rate
+    """
+    import time
+    
+    client = get_anthropic_client(api_key)
+    
+    rag_context, rag_sources = rag_result if rag_result is not None else get_rag_context(user_input, use_rag)
+    user_message = build_user_message(context, user_input, rag_context)
     
     start_time = time.time()
     
     message = client.messages.create(
-        model="claude-sonnet-4-20250514",
+        model=CLAUDE_MODEL,
         max_tokens=1024,
-        system=SAGE_SYSTEM_PROMPT,
+        system=build_claude_system(prompt_caching),
         messages=[{"role": "user", "content": user_message}]
     )
     
     elapsed_time = time.time() - start_time
     
-    # Calculate cost (Claude Sonnet pricing: $3/1M input, $15/1M output)
-    input_tokens = message.usage.input_tokens
-    output_tokens = message.usage.output_tokens
-    input_cost = (input_tokens / 1_000_000) * 3.00
-    output_cost = (output_tokens / 1_000_000) * 15.00
-    total_cost = input_cost + output_cost
-    
     usage_info = {
         "time": elapsed_time,
-        "input_tokens": input_tokens,
-        "output_tokens": output_tokens,
-        "cost": total_cost,
+        **parse_claude_usage(message.usage),
         "rag_used": bool(rag_context),
+        "rag_tokens": estimator.count_tokens(rag_context),
         "rag_sources": rag_sources
     }
     
     return message.content[0].text, usage_info
 
 
-def call_anthropic_streaming(api_key: str, context: str, user_input: str, use_rag: bool = True, conversation_history: list = None):
+def call_anthropic_streaming(api_key: str, context: str, user_input: str, use_rag: bool = True,
+                             conversation_history: list = None, rag_result: tuple = None,
+                             prompt_caching: bool = False):
     """
     Call Claude API with streaming. Yields (chunk, usage_info).
     usage_info is None until the final chunk, then contains full stats.
     
     Args:
         conversation_history: Optional list of previous messages for multi-turn
+        rag_result: Optional precomputed (rag_context, rag_sources); retrieved here if None
+        prompt_caching: Cache the system prompt and, on follow-ups, the conversation so far
     """
-    import anthropic
     import time
     
-    client = anthropic.Anthropic(api_key=api_key)
-    
-    context_info = CONTEXTS[context]
+    client = get_anthropic_client(api_key)
     
-    # Get RAG context if enabled
-    rag_context = ""
-    rag_sources = []
-    if use_rag:
-        try:
-            from rag import build_context
-            rag_context, rag_sources = build_context(user_input, n_results=3)
-        except Exception as e:
-            pass
+    rag_context, rag_sources = rag_result if rag_result is not None else get_rag_context(user_input, use_rag)
     
     # Build messages array
     messages = []
@@ -593,6 +1121,11 @@ def call_anthropic_streaming(api_key: str, context: str, user_input: str, use_ra
                 "role": entry["role"],
                 "content": entry["content"]
             })
+        # Mark the end of the history so the next turn reads system prompt +
+        # earlier turns from the cache instead of resending them at full price
+        if prompt_caching and messages:
+            messages[-1]["content"] = [{"type": "text", "text": messages[-1]["content"],
+                                        "cache_control": {"type": "ephemeral"}}]
         # For follow-ups, frame it clearly as a continuation from the same person
         user_message = f"""[The same PM continues the conversation]
 
@@ -601,137 +1134,477 @@ def call_anthropic_streaming(api_key: str, context: str, user_input: str, use_ra
 [Remember: You are coaching THIS person through their situation. They may be responding to your insights, pushing back, asking for clarification, or sharing more context. Stay in your role as the Grounded PM coach.]"""
     else:
         # First message - include full context
-        if rag_context:
-            user_message = f"""Context: User selected "{context_info['label']}"
-Prompt they responded to: "{context_info['prompt']}"
-
-Their response:
-{user_input}
-
----
-
-RELEVANT FRAMEWORK REFERENCE (use this to ground your response):
-
-{rag_context}"""
-        else:
-            user_message = f"""Context: User selected "{context_info['label']}"
-Prompt they responded to: "{context_info['prompt']}"
-
-Their response:
-{user_input}"""
+        user_message = build_user_message(context, user_input, rag_context)
     
     # Add current user message
     messages.append({"role": "user", "content": user_message})
     
     start_time = time.time()
-    input_tokens = 0
-    output_tokens = 0
+    first_token_time = None
     
     with client.messages.stream(
-        model="claude-sonnet-4-20250514",
+        model=CLAUDE_MODEL,
         max_tokens=1024,
-        system=SAGE_SYSTEM_PROMPT,
+        system=build_claude_system(prompt_caching),
         messages=messages
     ) as stream:
         for text in stream.text_stream:
+            if first_token_time is None:
+                first_token_time = time.time() - start_time
             yield text, None
         
         # Get final message for token counts
         final_message = stream.get_final_message()
-        input_tokens = final_message.usage.input_tokens
-        output_tokens = final_message.usage.output_tokens
     
     elapsed_time = time.time() - start_time
     
-    # Calculate cost
-    input_cost = (input_tokens / 1_000_000) * 3.00
-    output_cost = (output_tokens / 1_000_000) * 15.00
-    total_cost = input_cost + output_cost
-    
     usage_info = {
         "time": elapsed_time,
-        "input_tokens": input_tokens,
-        "output_tokens": output_tokens,
-        "cost": total_cost,
+        **parse_claude_usage(final_message.usage),
         "rag_used": bool(rag_context),
+        "rag_tokens": estimator.count_tokens(rag_context),
         "rag_sources": rag_sources,
-        "turns": len(messages) // 2 + 1
+        "turns": len(messages) // 2 + 1,
+        "time_to_first_token": first_token_time
     }
     
     yield "", usage_info
 
 
-def call_ollama(model: str, context: str, user_input: str, use_rag: bool = True) -> tuple[str, dict]:
-    """Call local Ollama instance. Returns (response_text, usage_info)."""
-    import requests
-    import time
-    
-    context_info = CONTEXTS[context]
-    
-    # Get RAG context if enabled
-    rag_context = ""
-    rag_sources = []
-    if use_rag:
-        try:
-            from rag import build_context
-            rag_context, rag_sources = build_context(user_input, n_results=3)
-        except Exception as e:
-            # RAG not available, continue without it
-            pass
-    
-    # Build user message with RAG context
-    if rag_context:
-        user_message = f"""Context: User selected "{context_info['label']}"
-Prompt they responded to: "{context_info['prompt']}"
-
-Their response:
-{user_input}
+def build_ollama_prompt(user_message: str) -> str:
+    """Ollama's /api/generate takes one prompt, so the system prompt is inlined."""
+    return f"""{SAGE_SYSTEM_PROMPT}
 
 ---
 
-RELEVANT FRAMEWORK REFERENCE (use this to ground your response):
+{user_message}"""
 
-{rag_context}"""
-    else:
-        user_message = f"""Context: User selected "{context_info['label']}"
-Prompt they responded to: "{context_info['prompt']}"
 
-Their response:
-{user_input}"""
+def parse_ollama_usage(result: dict) -> dict:
+    """
+    Token counts and timings from a final Ollama response body.
     
-    full_prompt = f"""{SAGE_SYSTEM_PROMPT}
+    Ollama reports durations in nanoseconds; load_duration is the time spent
+    loading the model into memory, eval_duration the time spent generating.
+    """
+    output_tokens = result.get("eval_count", 0)
+    generation_time = result.get("eval_duration", 0) / 1e9
+    load_time = result.get("load_duration", 0) / 1e9
+    return {
+        "input_tokens": result.get("prompt_eval_count", 0),
+        "output_tokens": output_tokens,
+        "tokens_per_second": output_tokens / generation_time if generation_time else 0.0,
+        "load_time": load_time,
+        "model_state": "cold" if load_time > OLLAMA_COLD_LOAD_THRESHOLD else "warm",
+        "prompt_eval_time": result.get("prompt_eval_duration", 0) / 1e9,
+        "generation_time": generation_time,
+        "server_time": result.get("total_duration", 0) / 1e9,
+    }
 
----
 
-{user_message}"""
+def call_ollama(model: str, context: str, user_input: str, use_rag: bool = True,
+                rag_result: tuple = None) -> tuple[str, dict]:
+    """
+    Call local Ollama instance. Returns (response_text, usage_info).
+    
+    Args:
+        rag_result: Optional precomputed (rag_context, rag_sources); retrieved here if None
+    """
+    import time
+    
+    rag_context, rag_sources = rag_result if rag_result is not None else get_rag_context(user_input, use_rag)
+    full_prompt = build_ollama_prompt(build_user_message(context, user_input, rag_context))
     
     start_time = time.time()
     
-    response = requests.post(
-        "http://localhost:11434/api/generate",
+    response = get_ollama_session().post(
+        f"{OLLAMA_HOST}/api/generate",
         json={
             "model": model,
             "prompt": full_prompt,
-            "stream": False
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE
         },
-        timeout=120
+        timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
     )
     
     elapsed_time = time.time() - start_time
     
     if response.status_code == 200:
         result = response.json()
+        mark_ollama_resident(model)
         usage_info = {
             "time": elapsed_time,
             "cost": 0.0,
             "rag_used": bool(rag_context),
-            "rag_sources": rag_sources
+            "rag_tokens": estimator.count_tokens(rag_context),
+            "rag_sources": rag_sources,
+            **parse_ollama_usage(result)
         }
         return result["response"], usage_info
     else:
         raise Exception(f"Ollama error: {response.status_code}")
 
 
+def call_ollama_streaming(model: str, context: str, user_input: str, use_rag: bool = True,
+                          rag_result: tuple = None):
+    """
+    Call local Ollama instance with streaming. Yields (chunk, usage_info).
+    usage_info is None until the final chunk, then contains full stats.
+    
+    Ollama streams newline-delimited JSON objects, each with a "response"
+    fragment; the last one has "done": true.
+    
+    Args:
+        rag_result: Optional precomputed (rag_context, rag_sources); retrieved here if None
+    """
+    import time
+    
+    rag_context, rag_sources = rag_result if rag_result is not None else get_rag_context(user_input, use_rag)
+    full_prompt = build_ollama_prompt(build_user_message(context, user_input, rag_context))
+    
+    start_time = time.time()
+    first_token_time = None
+    final = {}
+    
+    with get_ollama_session().post(
+        f"{OLLAMA_HOST}/api/generate",
+        json={
+            "model": model,
+            "prompt": full_prompt,
+            "stream": True,
+            "keep_alive": OLLAMA_KEEP_ALIVE
+        },
+        stream=True,
+        timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    ) as response:
+        if response.status_code != 200:
+            raise Exception(f"Ollama error: {response.status_code}")
+        
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if "error" in data:
+                raise Exception(f"Ollama error: {data['error']}")
+            if data.get("response"):
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                yield data["response"], None
+            if data.get("done"):
+                final = data
+                break
+    
+    mark_ollama_resident(model)
+    elapsed_time = time.time() - start_time
+    
+    usage_info = {
+        "time": elapsed_time,
+        "cost": 0.0,
+        "rag_used": bool(rag_context),
+        "rag_tokens": estimator.count_tokens(rag_context),
+        "rag_sources": rag_sources,
+        "time_to_first_token": first_token_time,
+        **parse_ollama_usage(final)
+    }
+    
+    yield "", usage_info
+
+
+# --- Conversation History ---
+# Follow-ups resend the whole conversation, so input tokens grow every turn.
+# Past the budget, the oldest turns are folded into a rolling summary that is
+# generated once and kept in session state; recent turns stay verbatim.
+HISTORY_TOKEN_BUDGET = 2000
+HISTORY_KEEP_RECENT_EXCHANGES = 2
+HISTORY_SUMMARY_MAX_TOKENS = 300
+
+HISTORY_SUMMARY_PROMPT = """You summarize coaching conversations so the coach can continue them.
+Write a compact summary (under 200 words) of what the PM shared and what the coach said:
+their situation, the saboteur patterns identified, reframes offered, and anything they pushed back on.
+Write in third person about "the PM". No preamble."""
+
+
+def estimate_history_tokens(messages: list) -> int:
+    """Token count for a list of {role, content} messages, as every other estimate counts them."""
+    return sum(estimator.count_tokens(m["content"]) for m in messages)
+
+
+def get_history_key(messages: list) -> str:
+    """Fingerprint of a run of conversation turns."""
+    import hashlib
+    payload = json.dumps([(m["role"], m["content"]) for m in messages])
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+def summarize_history(api_key: str, messages: list, previous_summary: str = "") -> tuple[str, dict]:
+    """
+    Fold conversation turns into a running summary. Returns (summary, usage_info).
+    
+    Args:
+        messages: Turns to add to the summary, oldest first
+        previous_summary: Summary of the turns before these, if any
+    """
+    client = get_anthropic_client(api_key)
+    
+    transcript = "\n\n".join(
+        f"{'PM' if m['role'] == 'user' else 'Coach'}: {m['content']}" for m in messages
+    )
+    if previous_summary:
+        transcript = f"Summary so far:\n{previous_summary}\n\nLater turns:\n{transcript}"
+    
+    message = client.messages.create(
+        model=CLAUDE_MODEL,
+        max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+        system=HISTORY_SUMMARY_PROMPT,
+        messages=[{"role": "user", "content": transcript}]
+    )
+    
+    return message.content[0].text, parse_claude_usage(message.usage)
+
+
+def compact_history(api_key: str, history: list, summary_state: dict,
+                    budget: int = HISTORY_TOKEN_BUDGET,
+                    keep_recent: int = HISTORY_KEEP_RECENT_EXCHANGES) -> tuple[list, dict]:
+    """
+    Fit conversation history into a token budget.
+    
+    Args:
+        history: Conversation so far as {role, content} messages, user first
+        summary_state: Mutable dict (kept in session state) caching the rolling
+            summary and which turns it covers, so each turn is summarized once
+        budget: Token budget for the history sent with a follow-up
+        keep_recent: Exchanges at the end of the history that are always sent verbatim
+    
+    Returns:
+        (messages to send, info) where info has history_tokens,
+        history_tokens_saved and summary_cost
+    """
+    history_tokens = estimate_history_tokens(history)
+    info = {"history_tokens": history_tokens, "history_tokens_saved": 0, "summary_cost": 0.0}
+    
+    split = max(len(history) - keep_recent * 2, 0)
+    older, recent = history[:split], history[split:]
+    if history_tokens <= budget or not older:
+        return history, info
+    
+    # The summary is only reusable if the turns it covers are still the start
+    # of this conversation (a new session or a regenerate can change them)
+    covered = summary_state.get("covered", 0)
+    if covered > len(older) or summary_state.get("key") != get_history_key(older[:covered]):
+        summary_state.clear()
+        covered = 0
+    
+    if covered < len(older):
+        summary, usage = summarize_history(api_key, older[covered:], summary_state.get("summary", ""))
+        summary_state.update({"summary": summary, "covered": len(older), "key": get_history_key(older)})
+        info["summary_cost"] = usage["cost"]
+    
+    messages = [
+        {"role": "user", "content": f"[Summary of our conversation so far]\n\n{summary_state['summary']}"},
+        {"role": "assistant", "content": "Thanks, I have the context from earlier. Let's continue."},
+    ] + recent
+    info["history_tokens_saved"] = max(history_tokens - estimate_history_tokens(messages), 0)
+    return messages, info
+
+
+# --- Ollama Residency ---
+# Which models Ollama currently holds in memory, shared across sessions so a
+# model selected in one tab isn't loaded again by another.
+@st.cache_resource
+def get_ollama_residency() -> dict:
+    """Process-wide residency state: resident models and in-flight preloads."""
+    return {"lock": threading.Lock(), "resident": {}, "preloading": set()}
+
+
+def mark_ollama_resident(model: str, expires_at: str = None):
+    """Record that a model is loaded; expires_at comes from /api/ps when known."""
+    residency = get_ollama_residency()
+    with residency["lock"]:
+        residency["resident"][model] = expires_at
+
+
+def refresh_ollama_residency() -> dict:
+    """Sync resident models from Ollama's /api/ps. Returns {model: expires_at}."""
+    residency = get_ollama_residency()
+    try:
+        response = get_ollama_session().get(f"{OLLAMA_HOST}/api/ps", timeout=2)
+        if response.status_code == 200:
+            models = response.json().get("models", [])
+            with residency["lock"]:
+                residency["resident"] = {m["name"]: m.get("expires_at") for m in models}
+    except Exception:
+        pass
+    
+    with residency["lock"]:
+        return dict(residency["resident"])
+
+
+def is_ollama_model_warm(model: str) -> bool:
+    """Whether a model is known to be loaded (as of the last request or refresh)."""
+    residency = get_ollama_residency()
+    with residency["lock"]:
+        return model in residency["resident"]
+
+
+def preload_ollama_model(model: str) -> bool:
+    """
+    Load a model into Ollama's memory in a background thread.
+    
+    A generate request with no prompt loads the model and applies keep_alive
+    without producing output. Returns True if a preload was started, False if
+    the model is already resident or being loaded.
+    """
+    residency = get_ollama_residency()
+    with residency["lock"]:
+        if model in residency["resident"] or model in residency["preloading"]:
+            return False
+        residency["preloading"].add(model)
+    
+    def load():
+        try:
+            response = get_ollama_session().post(
+                f"{OLLAMA_HOST}/api/generate",
+                json={"model": model, "keep_alive": OLLAMA_KEEP_ALIVE},
+                timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+            )
+            if response.status_code == 200:
+                with residency["lock"]:
+                    residency["resident"][model] = None
+        except Exception:
+            # Ollama went away; the first real request will load the model
+            pass
+        finally:
+            with residency["lock"]:
+                residency["preloading"].discard(model)
+    
+    threading.Thread(target=load, name=f"ollama-preload-{model}", daemon=True).start()
+    return True
+
+
+def get_ollama_model_status(model: str) -> str:
+    """"warm", "loading" or "cold" for display."""
+    residency = get_ollama_residency()
+    with residency["lock"]:
+        if model in residency["resident"]:
+            return "warm"
+        if model in residency["preloading"]:
+            return "loading"
+    return "cold"
+
+
+# --- Cached Backends ---
+# Opt-in wrappers around the call_* functions. Retrieval runs first so the
+# cache key covers the exact RAG context the model would have seen.
+def replay_cached_response(response: str, stats: dict):
+    """Yield a cached response in word-sized chunks, matching the streaming contract."""
+    for chunk in re.findall(r'\S+\s*|\s+', response):
+        yield chunk, None
+    yield "", stats
+
+
+def cached_call_anthropic(api_key: str, context: str, user_input: str, use_rag: bool = True,
+                          use_cache: bool = True, semantic: bool = False,
+                          rag_result: tuple = None, prompt_caching: bool = False) -> tuple[str, dict]:
+    """call_anthropic with response caching; semantic also matches near-duplicate inputs."""
+    if rag_result is None:
+        rag_result = get_rag_context(user_input, use_rag)
+    if not use_cache:
+        return call_anthropic(api_key, context, user_input, use_rag=use_rag, rag_result=rag_result,
+                              prompt_caching=prompt_caching)
+    
+    embedding = embed_for_semantic_cache(user_input) if semantic else None
+    cache_key = {"model": CLAUDE_MODEL, "rag_context": rag_result[0]}
+    cached = lookup_cached_response(context, user_input, use_rag, embedding=embedding, **cache_key)
+    if cached:
+        return cached
+    
+    response, stats = call_anthropic(api_key, context, user_input, use_rag=use_rag, rag_result=rag_result,
+                                     prompt_caching=prompt_caching)
+    cache_response(context, user_input, use_rag, response, stats, embedding=embedding, **cache_key)
+    return response, stats
+
+
+def cached_call_anthropic_streaming(api_key: str, context: str, user_input: str, use_rag: bool = True,
+                                    conversation_history: list = None, use_cache: bool = True,
+                                    semantic: bool = False, rag_result: tuple = None,
+                                    prompt_caching: bool = False):
+    """
+    call_anthropic_streaming with response caching; semantic also matches
+    near-duplicate inputs. Follow-up turns are never cached.
+    """
+    if rag_result is None:
+        rag_result = get_rag_context(user_input, use_rag)
+    if not use_cache or conversation_history:
+        yield from call_anthropic_streaming(api_key, context, user_input, use_rag=use_rag,
+                                            conversation_history=conversation_history,
+                                            rag_result=rag_result, prompt_caching=prompt_caching)
+        return
+    
+    embedding = embed_for_semantic_cache(user_input) if semantic else None
+    cache_key = {"model": CLAUDE_MODEL, "rag_context": rag_result[0]}
+    cached = lookup_cached_response(context, user_input, use_rag, embedding=embedding, **cache_key)
+    if cached:
+        yield from replay_cached_response(*cached)
+        return
+    
+    full_response = ""
+    for chunk, usage_info in call_anthropic_streaming(api_key, context, user_input, use_rag=use_rag,
+                                                      rag_result=rag_result, prompt_caching=prompt_caching):
+        full_response += chunk
+        if usage_info:
+            cache_response(context, user_input, use_rag, full_response, usage_info,
+                           embedding=embedding, **cache_key)
+        yield chunk, usage_info
+
+
+def cached_call_ollama_streaming(model: str, context: str, user_input: str, use_rag: bool = True,
+                                 use_cache: bool = True, semantic: bool = False,
+                                 rag_result: tuple = None):
+    """call_ollama_streaming with response caching; semantic also matches near-duplicate inputs."""
+    if rag_result is None:
+        rag_result = get_rag_context(user_input, use_rag)
+    if not use_cache:
+        yield from call_ollama_streaming(model, context, user_input, use_rag=use_rag, rag_result=rag_result)
+        return
+    
+    embedding = embed_for_semantic_cache(user_input) if semantic else None
+    cache_key = {"model": model, "rag_context": rag_result[0]}
+    cached = lookup_cached_response(context, user_input, use_rag, embedding=embedding, **cache_key)
+    if cached:
+        yield from replay_cached_response(*cached)
+        return
+    
+    full_response = ""
+    for chunk, usage_info in call_ollama_streaming(model, context, user_input, use_rag=use_rag,
+                                                   rag_result=rag_result):
+        full_response += chunk
+        if usage_info:
+            cache_response(context, user_input, use_rag, full_response, usage_info,
+                           embedding=embedding, **cache_key)
+        yield chunk, usage_info
+
+
+def cached_call_ollama(model: str, context: str, user_input: str, use_rag: bool = True,
+                       use_cache: bool = True, semantic: bool = False,
+                       rag_result: tuple = None) -> tuple[str, dict]:
+    """call_ollama with response caching; semantic also matches near-duplicate inputs."""
+    if rag_result is None:
+        rag_result = get_rag_context(user_input, use_rag)
+    if not use_cache:
+        return call_ollama(model, context, user_input, use_rag=use_rag, rag_result=rag_result)
+    
+    embedding = embed_for_semantic_cache(user_input) if semantic else None
+    cache_key = {"model": model, "rag_context": rag_result[0]}
+    cached = lookup_cached_response(context, user_input, use_rag, embedding=embedding, **cache_key)
+    if cached:
+        return cached
+    
+    response, stats = call_ollama(model, context, user_input, use_rag=use_rag, rag_result=rag_result)
+    cache_response(context, user_input, use_rag, response, stats, embedding=embedding, **cache_key)
+    return response, stats
+
+
 def check_ollama_available() -> tuple[bool, list[str]]:
     """Check if Ollama is running and get available models."""
     # Cache result in session state to avoid repeated checks
@@ -747,12 +1620,13 @@ def check_ollama_available() -> tuple[bool, list[str]]:
             return st.session_state[cache_key]
     
     try:
-        import requests
-        response = requests.get("http://localhost:11434/api/tags", timeout=2)
+        response = get_ollama_session().get(f"{OLLAMA_HOST}/api/tags", timeout=2)
         if response.status_code == 200:
             data = response.json()
             models = [m["name"] for m in data.get("models", [])]
             result = (True, models) if models else (False, [])
+            # Models unload when keep_alive expires; resync what's resident
+            refresh_ollama_residency()
             st.session_state[cache_key] = result
             st.session_state[cache_time_key] = time.time()
             return result
@@ -798,6 +1672,12 @@ if "selected_ollama_model" not in st.session_state:
     st.session_state.selected_ollama_model = "llama3.1:8b"
 if "use_rag" not in st.session_state:
     st.session_state.use_rag = True
+if "use_cache" not in st.session_state:
+    st.session_state.use_cache = False  # Opt-in response cache
+if "use_semantic_cache" not in st.session_state:
+    st.session_state.use_semantic_cache = False  # Also reuse responses for near-duplicate entries
+if "use_prompt_caching" not in st.session_state:
+    st.session_state.use_prompt_caching = False  # Opt-in Anthropic prompt caching
 if "current_response" not in st.session_state:
     st.session_state.current_response = None
 if "current_response_model" not in st.session_state:
@@ -818,6 +1698,8 @@ if "compare_voted" not in st.session_state:
 # Multi-turn conversation state
 if "conversation_history" not in st.session_state:
     st.session_state.conversation_history = []  # List of {role, content, stats}
+if "history_summary" not in st.session_state:
+    st.session_state.history_summary = {}  # Rolling summary of compacted turns
 if "follow_up_mode" not in st.session_state:
     st.session_state.follow_up_mode = False
 if "regenerating" not in st.session_state:
@@ -831,6 +1713,20 @@ if "request_timestamps" not in st.session_state:
 get_session_id()
 
 
+def start_rag_warmup():
+    """Load the RAG model and index in the background so the first request doesn't pay for it."""
+    try:
+        import rag
+        rag.start_warmup()
+    except Exception:
+        # RAG not available, requests fall back to no grounding
+        pass
+
+
+# Idempotent: the first script run after the server boots starts the load
+start_rag_warmup()
+
+
 # --- Rate Limiting ---
 RATE_LIMIT_REQUESTS = 10  # Max requests per window
 RATE_LIMIT_WINDOW = 60  # Window in seconds (1 minute)
@@ -884,7 +1780,9 @@ def render_token_stats_table(stats: dict, estimated: dict = None, show_input_out
     if not estimated:
         return
     
-    actual_total = stats.get('input_tokens', 0) + stats.get('output_tokens', 0)
+    # Claude reports cached prompt tokens separately from input_tokens
+    actual_input = stats.get('input_tokens', 0) + stats.get('cache_read_tokens', 0) + stats.get('cache_write_tokens', 0)
+    actual_total = actual_input + stats.get('output_tokens', 0)
     est_input = estimated.get('user', 0) + estimated.get('system', 0) + estimated.get('rag', 0)
     est_total = estimated.get('total', 0)
     
@@ -902,7 +1800,7 @@ def render_token_stats_table(stats: dict, estimated: dict = None, show_input_out
     
     # Use columns for a simple table layout
     if show_input_output:
-        input_diff = stats.get('input_tokens', 0) - est_input
+        input_diff = actual_input - est_input
         output_diff = stats.get('output_tokens', 0) - estimated.get('output', 0)
         
         col1, col2, col3, col4, col5 = st.columns([1.5, 1, 1, 1, 1])
@@ -923,7 +1821,7 @@ def render_token_stats_table(stats: dict, estimated: dict = None, show_input_out
         col1.caption("Actual")
         col2.caption(f"${stats['cost']:.4f}")
         col3.caption(f"{actual_total:,}")
-        col4.caption(f"{stats.get('input_tokens', 0):,}")
+        col4.caption(f"{actual_input:,}")
         col5.caption(f"{stats.get('output_tokens', 0):,}")
         
         col1, col2, col3, col4, col5 = st.columns([1.5, 1, 1, 1, 1])
@@ -1280,6 +2178,71 @@ def render_data_management_page():
     
     st.markdown("---")
     
+    # Response cache
+    st.markdown("## ⚡ Response Cache")
+    
+    cache_stats = get_cache_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+    col2.metric("Hits", cache_stats["hits"], help=f"{cache_stats['semantic_hits']} from near-duplicate entries")
+    col3.metric("Misses", cache_stats["misses"])
+    col4.metric("💰 Saved", f"${cache_stats['cost_saved']:.4f}")
+    st.caption(f"{get_cache_size():,} cached responses · {cache_stats['time_saved']:.0f}s of generation skipped · "
+               f"Turn on **Reuse cached responses** when choosing a model")
+    
+    st.markdown("---")
+    
+    # RAG warm-up
+    st.markdown("## 🔍 Knowledge Base Loading")
+    
+    try:
+        import rag
+        load_status = rag.get_load_status()
+    except Exception:
+        load_status = None
+    
+    if load_status is None:
+        st.caption("RAG is unavailable (sentence-transformers / chromadb not installed).")
+    else:
+        state_labels = {
+            "not started": "⚪ Not started",
+            "loading": "⏳ Loading in background",
+            "ready": "✅ Ready",
+            "failed": "❌ Failed (loads on first request)",
+        }
+        st.caption(state_labels[load_status["state"]])
+        timing_labels = {
+            "import_encoder": "Import encoder runtime",
+            "load_embedding_model": "Load embedding model",
+            "import_chromadb": "Import ChromaDB",
+            "open_collection": "Open collection",
+            "first_encode": "First encode",
+            "warmup_total": "Total warm-up",
+        }
+        for key, label in timing_labels.items():
+            if key in load_status["timings"]:
+                st.caption(f"{label}: {load_status['timings'][key]:.2f}s")
+        
+        query_cache = rag.get_query_cache_stats()
+        st.caption(f"Query embedding cache: {query_cache['hits'] + query_cache['disk_hits']} hits · "
+                   f"{query_cache['misses']} misses · {query_cache['size']} cached")
+    
+    st.markdown("---")
+    
+    # Connection pools
+    st.markdown("## 🔌 Connections")
+    
+    connection_stats = get_connection_stats()
+    if not connection_stats:
+        st.caption("No backend requests yet this server session.")
+    for name, counts in connection_stats.items():
+        # Key hashes stand in for API keys so they never show up on screen
+        label = "Claude API" if name.startswith("anthropic:") else f"Ollama ({name.split(':', 1)[1]})"
+        st.caption(f"{label}: {counts['requests']} requests · {counts['connections']} connections opened · "
+                   f"{counts['reused']} reused")
+    
+    st.markdown("---")
+    
     # Feedback Data
     st.markdown("## 👍 Feedback Data")
     
@@ -1358,7 +2321,7 @@ def render_data_management_page():
     - **Feedback**: `{FEEDBACK_FILE.name}`
     - **Audit Trail**: `{AUDIT_FILE.name}`
     - **Logs**: `{LOG_FILE.name}`
-    - **Cache**: `{CACHE_FILE.name}`
+    - **Cache**: `{CACHE_DB.name}`
     """)
     
     st.markdown("---")
@@ -1380,6 +2343,7 @@ def render_data_management_page():
             for f in [PREFS_FILE, FEEDBACK_FILE, AUDIT_FILE, LOG_FILE, CACHE_FILE]:
                 if f.exists():
                     f.unlink()
+            clear_cache()
             st.success("All data cleared!")
             st.rerun()
 
@@ -1674,25 +2638,39 @@ def extract_saboteurs_from_response(response: str) -> list:
     return detected
 
 
-def run_evaluation(entries: list, api_key: str = None, use_rag: bool = True, use_ollama: bool = False, ollama_model: str = "llama3.1:8b") -> list:
-    """Run evaluation on a list of golden dataset entries."""
+def run_evaluation(entries: list, api_key: str = None, use_rag: bool = True, use_ollama: bool = False, ollama_model: str = "llama3.1:8b", use_cache: bool = False, prompt_caching: bool = False, rag_results: list = None) -> list:
+    """
+    Run evaluation on a list of golden dataset entries.
+    
+    Args:
+        rag_results: Optional precomputed (rag_context, rag_sources) per entry;
+            otherwise retrieved for all entries in one batch
+    """
     results = []
     
-    for entry in entries:
+    if rag_results is None and use_rag:
+        rag_results = get_rag_contexts([entry["text"] for entry in entries])
+    
+    for i, entry in enumerate(entries):
         try:
             if use_ollama:
-                response, stats = call_ollama(
+                response, stats = cached_call_ollama(
                     ollama_model,
                     entry["context"],
                     entry["text"],
-                    use_rag=use_rag
+                    use_rag=use_rag,
+                    use_cache=use_cache,
+                    rag_result=rag_results[i] if rag_results else None
                 )
             else:
-                response, stats = call_anthropic(
+                response, stats = cached_call_anthropic(
                     api_key,
                     entry["context"],
                     entry["text"],
-                    use_rag=use_rag
+                    use_rag=use_rag,
+                    use_cache=use_cache,
+                    prompt_caching=prompt_caching,
+                    rag_result=rag_results[i] if rag_results else None
                 )
                 record_cost(stats['cost'])
             
@@ -1733,6 +2711,65 @@ def run_evaluation(entries: list, api_key: str = None, use_rag: bool = True, use
     return results
 
 
+def run_evaluation_parallel(entries: list, backends: list, api_key: str = None, use_rag: bool = True,
+                            ollama_model: str = "llama3.1:8b", use_cache: bool = False, on_result=None,
+                            prompt_caching: bool = False) -> dict:
+    """
+    Run evaluation on several backends at once, overlapping entries and backends.
+    
+    Args:
+        entries: Golden dataset entries
+        backends: Any of "claude", "ollama"
+        prompt_caching: Cache Claude's system prompt; the first Claude request
+            runs alone so the rest read the cache instead of each writing it
+        on_result: Optional callback(backend, index, result), called from the
+            calling thread as each result arrives (safe for Streamlit updates)
+    
+    Returns:
+        Dict of backend -> results list, in the same order as entries
+    """
+    pools = {
+        "claude": ThreadPoolExecutor(max_workers=DEFAULT_CLAUDE_WORKERS, thread_name_prefix="eval-claude"),
+        "ollama": ThreadPoolExecutor(max_workers=DEFAULT_OLLAMA_WORKERS, thread_name_prefix="eval-ollama"),
+    }
+    results = {backend: [None] * len(entries) for backend in backends}
+    
+    # Retrieve context for every entry once, shared by all backends
+    rag_results = get_rag_contexts([entry["text"] for entry in entries]) if use_rag else None
+    
+    try:
+        futures = {}
+        for i, entry in enumerate(entries):
+            for backend in backends:
+                future = pools[backend].submit(
+                    run_evaluation,
+                    [entry],
+                    api_key=api_key,
+                    use_rag=use_rag,
+                    use_ollama=backend == "ollama",
+                    ollama_model=ollama_model,
+                    use_cache=use_cache,
+                    prompt_caching=prompt_caching,
+                    rag_results=[rag_results[i]] if rag_results else None
+                )
+                futures[future] = (backend, i)
+                if prompt_caching and backend == "claude" and i == 0:
+                    # run_evaluation records errors instead of raising
+                    future.result()
+        
+        for future in as_completed(futures):
+            backend, i = futures[future]
+            result = future.result()[0]
+            results[backend][i] = result
+            if on_result:
+                on_result(backend, i, result)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    return results
+
+
 def render_eval_page():
     """Render the evaluation dashboard."""
     st.markdown("# 🧪 Evals")
@@ -1772,6 +2809,11 @@ def render_eval_page():
     
     with col2:
         use_rag = st.checkbox("🔍 Use RAG", value=True)
+        use_cache = st.checkbox("⚡ Reuse cached responses", value=False,
+                                help="Skip API calls for entries already run with the same model, prompt version and RAG context")
+        prompt_caching = st.checkbox("💾 Cache the coaching prompt (Claude)", value=False,
+                                     help="Bill the system prompt at 10% of the input price after the first entry",
+                                     disabled=backend == "Ollama (Local)")
     
     # Number of test cases slider
     total_cases = len(GOLDEN_DATASET)
@@ -1783,9 +2825,17 @@ def render_eval_page():
         help=f"Run a subset for quick testing, or all {total_cases} for full evaluation"
     )
     
-    # Show estimated time (based on real-world testing: ~13s per case for Compare Both, ~6s for single)
-    est_time_per_case = 13 if backend == "Compare Both" else 6  # seconds
-    est_total_time = num_cases * est_time_per_case
+    # Show estimated time from median latency of past responses (~6s per Claude
+    # case, ~7s per Llama case until there's history). Cases run concurrently,
+    # so the slowest backend's pool sets the pace.
+    claude_time = num_cases * estimator.predict_response(LOG_FILE, "claude")["latency"] / DEFAULT_CLAUDE_WORKERS
+    ollama_time = num_cases * estimator.predict_response(LOG_FILE, "ollama")["latency"] / DEFAULT_OLLAMA_WORKERS
+    if backend == "Compare Both":
+        est_total_time = max(claude_time, ollama_time)
+    elif backend == "Ollama (Local)":
+        est_total_time = ollama_time
+    else:
+        est_total_time = claude_time
     if est_total_time < 60:
         time_str = f"~{est_total_time:.0f} seconds"
     else:
@@ -1799,6 +2849,8 @@ def render_eval_page():
         ollama_model = st.selectbox("Ollama Model", ollama_models)
     elif ollama_available and ollama_models:
         ollama_model = ollama_models[0]
+    if ollama_available and backend != "Claude API":
+        preload_ollama_model(ollama_model)
     
     # Initialize results in session state
     if "eval_results" not in st.session_state:
@@ -1832,87 +2884,51 @@ Detected: **{saboteurs}**
 """)
         
         if backend == "Compare Both":
-            # Run both backends
-            claude_results = []
-            ollama_results = []
-            
-            for i, entry in enumerate(test_cases):
-                status.text(f"🔄 Testing {entry['id']} ({i+1}/{num_cases})...")
-                progress.progress((i + 0.5) / num_cases)
-                
-                # Claude
-                claude_result = run_evaluation(
-                    [entry], 
-                    api_key=st.session_state.api_key,
-                    use_rag=use_rag,
-                    use_ollama=False
-                )
-                claude_results.extend(claude_result)
-                if claude_result and "error" not in claude_result[0]:
-                    show_live_update(
-                        entry['id'], 
-                        entry['text'], 
-                        claude_result[0]['detected'],
-                        claude_result[0]['primary_correct'],
-                        "Claude"
-                    )
-                
-                progress.progress((i + 0.75) / num_cases)
-                
-                # Ollama
-                ollama_result = run_evaluation(
-                    [entry], 
-                    use_rag=use_rag,
-                    use_ollama=True,
-                    ollama_model=ollama_model
+            backends = ["claude", "ollama"]
+        elif backend == "Ollama (Local)":
+            backends = ["ollama"]
+        else:
+            backends = ["claude"]
+        
+        backend_labels = {"claude": "Claude", "ollama": "Llama"}
+        total_runs = num_cases * len(backends)
+        completed = 0
+        status.text(f"🔄 Running {total_runs} evaluations...")
+        
+        def on_result(backend_key, i, result):
+            nonlocal completed
+            completed += 1
+            progress.progress(completed / total_runs)
+            status.text(f"🔄 Finished {test_cases[i]['id']} ({completed}/{total_runs})...")
+            if "error" not in result:
+                show_live_update(
+                    test_cases[i]['id'],
+                    test_cases[i]['text'],
+                    result['detected'],
+                    result['primary_correct'],
+                    backend_labels[backend_key] if len(backends) > 1 else ""
                 )
-                ollama_results.extend(ollama_result)
-                if ollama_result and "error" not in ollama_result[0]:
-                    show_live_update(
-                        entry['id'], 
-                        entry['text'], 
-                        ollama_result[0]['detected'],
-                        ollama_result[0]['primary_correct'],
-                        "Llama"
-                    )
-                
-                progress.progress((i + 1) / num_cases)
-            
-            st.session_state.eval_results = claude_results
-            st.session_state.eval_results_compare = ollama_results
-            st.session_state.eval_backend = "Compare Both"
+        
+        results = run_evaluation_parallel(
+            test_cases,
+            backends,
+            api_key=st.session_state.api_key,
+            use_rag=use_rag,
+            ollama_model=ollama_model,
+            use_cache=use_cache,
+            on_result=on_result,
+            prompt_caching=prompt_caching
+        )
+        
+        if backend == "Compare Both":
+            st.session_state.eval_results = results["claude"]
+            st.session_state.eval_results_compare = results["ollama"]
             st.session_state.eval_ollama_model = ollama_model
-            st.session_state.eval_num_cases = num_cases
         else:
-            # Single backend
-            use_ollama = backend == "Ollama (Local)"
-            results = []
-            
-            for i, entry in enumerate(test_cases):
-                status.text(f"🔄 Testing {entry['id']} ({i+1}/{num_cases})...")
-                progress.progress((i + 1) / num_cases)
-                
-                result = run_evaluation(
-                    [entry], 
-                    api_key=st.session_state.api_key,
-                    use_rag=use_rag,
-                    use_ollama=use_ollama,
-                    ollama_model=ollama_model
-                )
-                results.extend(result)
-                
-                if result and "error" not in result[0]:
-                    show_live_update(
-                        entry['id'], 
-                        entry['text'], 
-                        result[0]['detected'],
-                        result[0]['primary_correct']
-                    )
-            
-            st.session_state.eval_results = results
+            st.session_state.eval_results = results[backends[0]]
             st.session_state.eval_results_compare = None
-            st.session_state.eval_backend = backend
-            st.session_state.eval_num_cases = num_cases
+        st.session_state.eval_backend = backend
+        st.session_state.eval_num_cases = num_cases
         
         progress.empty()
         status.empty()
@@ -1972,6 +2988,11 @@ def calculate_metrics(results: list) -> dict:
     recall = true_positives / total_expected if total_expected > 0 else 0
     f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
     
+    # Usage: token counts for both backends, generation speed and load time for Ollama
+    all_stats = [r["stats"] for r in successful]
+    speeds = [s["tokens_per_second"] for s in all_stats if s.get("tokens_per_second")]
+    cold_starts = sum(1 for s in all_stats if s.get("model_state") == "cold" and not s.get("cached"))
+    
     return {
         "successful": successful,
         "errors": errors,
@@ -1982,7 +3003,15 @@ def calculate_metrics(results: list) -> dict:
         "missed": total_missed,
         "precision": precision,
         "recall": recall,
-        "f1": f1
+        "f1": f1,
+        "avg_time": sum(s.get("time", 0) for s in all_stats) / len(all_stats),
+        "total_input_tokens": sum(s.get("input_tokens", 0) for s in all_stats),
+        "total_output_tokens": sum(s.get("output_tokens", 0) for s in all_stats),
+        "total_cache_read_tokens": sum(s.get("cache_read_tokens", 0) for s in all_stats),
+        "total_cache_write_tokens": sum(s.get("cache_write_tokens", 0) for s in all_stats),
+        "avg_tokens_per_second": sum(speeds) / len(speeds) if speeds else None,
+        "total_load_time": sum(s.get("load_time", 0) for s in all_stats),
+        "cold_starts": cold_starts
     }
 
 
@@ -2115,6 +3144,22 @@ def render_comparison_results(claude_results: list, ollama_results: list, ollama
                claude_metrics['missed'], ollama_metrics['missed'],
                higher_better=False)
     
+    metric_row("Avg Time",
+               f"{claude_metrics['avg_time']:.1f}s",
+               f"{ollama_metrics['avg_time']:.1f}s",
+               claude_metrics['avg_time'], ollama_metrics['avg_time'],
+               higher_better=False)
+    
+    metric_row("Input / Output Tokens",
+               f"{claude_metrics['total_input_tokens']:,} / {claude_metrics['total_output_tokens']:,}",
+               f"{ollama_metrics['total_input_tokens']:,} / {ollama_metrics['total_output_tokens']:,}",
+               0, 0)
+    
+    if ollama_metrics['avg_tokens_per_second'] is not None:
+        st.caption(f"{ollama_model}: {ollama_metrics['avg_tokens_per_second']:.1f} tok/s generation · "
+                   f"{ollama_metrics['total_load_time']:.1f}s spent loading the model "
+                   f"({ollama_metrics['cold_starts']} cold starts)")
+    
     # Detailed results by entry
     st.markdown("---")
     st.markdown("### 🔍 Detailed Results for Each Test Case")
@@ -2179,6 +3224,18 @@ def render_single_results(results: list, backend: str):
     col3.metric("Missed", metrics['missed'])
     col4.metric("Errors", len(errors))
     
+    # Display usage - Row 3
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Avg Time", f"{metrics['avg_time']:.1f}s")
+    col2.metric("Input Tokens", f"{metrics['total_input_tokens']:,}",
+                help=f"Plus {metrics['total_cache_read_tokens']:,} read from and "
+                     f"{metrics['total_cache_write_tokens']:,} written to the prompt cache")
+    col3.metric("Output Tokens", f"{metrics['total_output_tokens']:,}")
+    if metrics['avg_tokens_per_second'] is not None:
+        col4.metric("Speed", f"{metrics['avg_tokens_per_second']:.1f} tok/s",
+                    help=f"Model load time across the run: {metrics['total_load_time']:.1f}s "
+                         f"({metrics['cold_starts']} cold starts)")
+    
     # Breakdown tabs
     st.markdown("---")
     st.markdown("## 🔍 Detailed Breakdown")
@@ -2438,26 +3495,24 @@ def render_step_3_model():
     with st.expander("📝 Your entry", expanded=False):
         st.markdown(user_input)
     
-    # Calculate and show token estimates
-    user_tokens = len(user_input) // 4
-    system_tokens = 500  # Approximate system prompt size
+    # Estimate from the prompt that will actually be sent, with output size and
+    # latency learned from past responses in this context
     use_rag = st.session_state.get("use_rag", True)
-    rag_tokens = 300 if use_rag else 0
-    estimated_output = 400  # Typical response size
-    estimated_total = user_tokens + system_tokens + rag_tokens + estimated_output
-    estimated_cost = ((user_tokens + system_tokens + rag_tokens) / 1_000_000) * 3.00 + (estimated_output / 1_000_000) * 15.00
+    rag_context, _ = get_entry_rag_context(user_input, use_rag)
+    estimate = estimator.estimate_request(
+        SAGE_SYSTEM_PROMPT, PROMPT_VERSION,
+        build_user_message(st.session_state.context, user_input, rag_context), rag_context,
+        LOG_FILE, "claude", st.session_state.context
+    )
+    estimated_input = estimate["user"] + estimate["system"] + estimate["rag"]
+    estimated_cost = calculate_claude_cost(estimated_input, estimate["output"])
+    ollama_latency = estimator.predict_response(LOG_FILE, "ollama", st.session_state.context)["latency"]
     
     # Store estimates for later comparison
-    st.session_state.estimated_tokens = {
-        "user": user_tokens,
-        "system": system_tokens,
-        "rag": rag_tokens,
-        "output": estimated_output,
-        "total": estimated_total,
-        "cost": estimated_cost
-    }
+    st.session_state.estimated_tokens = {**estimate, "cost": estimated_cost}
     
-    st.caption(f"💰 Estimated cost: **${estimated_cost:.4f}** · {estimated_total:,} tokens")
+    st.caption(f"💰 Estimated cost: **${estimated_cost:.4f}** · {estimate['total']:,} tokens · "
+               f"⏱️ ~{estimate['latency']:.0f}s Claude, ~{ollama_latency:.0f}s Ollama")
     st.markdown("")
     
     # Model options
@@ -2511,6 +3566,10 @@ def render_step_3_model():
         
         if ollama_available:
             st.success(f"✅ {ollama_models[0]} ready")
+            # Start loading the model while the user decides
+            preload_ollama_model(ollama_models[0])
+            if get_ollama_model_status(ollama_models[0]) == "loading":
+                st.caption("⏳ Loading model into memory...")
             if st.button("Use Ollama", key="use_ollama", type="primary", use_container_width=True):
                 st.session_state.selected_model = "ollama"
                 st.session_state.selected_ollama_model = ollama_models[0]
@@ -2551,6 +3610,25 @@ def render_step_3_model():
     use_rag = st.checkbox("🔍 Use RAG grounding (recommended)", value=True, 
                           help="Ground responses in the saboteur framework for better accuracy")
     st.session_state.use_rag = use_rag
+    
+    use_cache = st.checkbox("⚡ Reuse cached responses", value=st.session_state.use_cache,
+                            help="Answer identical entries from the local cache instead of calling the model again")
+    st.session_state.use_cache = use_cache
+    
+    if use_cache:
+        use_semantic_cache = st.checkbox(
+            "≈ Also match near-identical entries", value=st.session_state.use_semantic_cache,
+            help=f"Reuse a cached response when your entry is at least {SEMANTIC_CACHE_THRESHOLD:.0%} similar to one already answered"
+        )
+        st.session_state.use_semantic_cache = use_semantic_cache
+    
+    if has_api_key:
+        use_prompt_caching = st.checkbox(
+            "💾 Cache the coaching prompt (Claude)", value=st.session_state.use_prompt_caching,
+            help="Claude stores the system prompt and earlier turns for 5 minutes; "
+                 "repeat requests read them at 10% of the input price (the first write costs 25% more)"
+        )
+        st.session_state.use_prompt_caching = use_prompt_caching
 
 
 def render_step_4_results():
@@ -2577,6 +3655,7 @@ def render_step_4_results():
             st.session_state.compare_ollama_response = None
             st.session_state.compare_voted = False
             st.session_state.conversation_history = []  # Clear multi-turn history
+            st.session_state.history_summary = {}
             st.session_state.follow_up_mode = False
             st.session_state.regenerating = False
             st.rerun()
@@ -2611,6 +3690,9 @@ def render_claude_response(user_input: str, use_rag: bool):
         stats = st.session_state.current_stats
         st.markdown(response)
     else:
+        # Regenerating always asks the model for a fresh response
+        use_cache = st.session_state.get("use_cache") and not st.session_state.get("regenerating")
+        
         # Clear regenerating flag
         st.session_state.regenerating = False
         
@@ -2623,15 +3705,26 @@ def render_claude_response(user_input: str, use_rag: bool):
         stats = None
         
         try:
-            # Build conversation history for multi-turn
+            # Build conversation history for multi-turn, summarizing older turns past the budget
             conversation = st.session_state.conversation_history.copy()
+            history_info = None
+            if conversation:
+                conversation, history_info = compact_history(
+                    api_key, conversation, st.session_state.history_summary
+                )
+                if history_info["summary_cost"]:
+                    record_cost(history_info["summary_cost"])
             
-            for chunk, usage_info in call_anthropic_streaming(
+            for chunk, usage_info in cached_call_anthropic_streaming(
                 api_key,
                 st.session_state.context,
                 user_input,
                 use_rag=use_rag,
-                conversation_history=conversation if conversation else None
+                conversation_history=conversation if conversation else None,
+                use_cache=use_cache,
+                semantic=st.session_state.get("use_semantic_cache", False),
+                rag_result=get_entry_rag_context(user_input, use_rag),
+                prompt_caching=st.session_state.get("use_prompt_caching", False)
             ):
                 if chunk:
                     full_response += chunk
@@ -2641,6 +3734,9 @@ def render_claude_response(user_input: str, use_rag: bool):
             
             response_placeholder.markdown(full_response)
             
+            if history_info:
+                stats = {**stats, **history_info}
+            
             # Cache response
             st.session_state.current_response = full_response
             st.session_state.current_response_model = "claude"
@@ -2668,6 +3764,8 @@ def render_claude_response(user_input: str, use_rag: bool):
                 "backend": "claude",
                 "cost": stats.get('cost', 0),
                 "latency": stats.get('time', 0),
+                "input_tokens": stats.get('input_tokens', 0),
+                "output_tokens": stats.get('output_tokens', 0),
                 "turn": len([h for h in st.session_state.conversation_history if h['role'] == 'user']),
             }, include_content=True)
             
@@ -2698,7 +3796,15 @@ def render_claude_response(user_input: str, use_rag: bool):
         col4.metric("📤 Output", f"{stats['output_tokens']:,}")
         
         if stats.get('rag_used'):
-            st.caption("🔍 RAG grounding was used")
+            st.caption(f"🔍 RAG grounding was used · {stats.get('rag_tokens', 0):,} context tokens")
+        if stats.get('cache_read_tokens') or stats.get('cache_write_tokens'):
+            st.caption(f"💾 Prompt cache: {stats['cache_read_tokens']:,} tokens read · "
+                       f"{stats['cache_write_tokens']:,} written")
+        if stats.get('history_tokens_saved'):
+            st.caption(f"🗜️ Earlier turns summarized · ~{stats['history_tokens_saved']:,} history tokens saved")
+        if stats.get('cached'):
+            match_note = f" (≈{stats['cache_similarity']:.0%} match)" if stats.get('cache_tier') == "semantic" else ""
+            st.caption(f"⚡ Served from cache{match_note} · saved ${stats['cost_saved']:.4f} and {stats['time_saved']:.1f}s")
         
         # Show comparison table if we have estimates
         estimated = st.session_state.get("estimated_tokens")
@@ -2783,62 +3889,94 @@ def render_ollama_response(user_input: str, use_rag: bool):
         stats = st.session_state.current_stats
         st.markdown(response)
     else:
+        # Regenerating always asks the model for a fresh response
+        use_cache = st.session_state.get("use_cache") and not st.session_state.get("regenerating")
+        
         # Clear regenerating flag
         st.session_state.regenerating = False
         
-        with st.spinner(f"Asking {model}..."):
-            try:
-                response, stats = call_ollama(
-                    model,
-                    st.session_state.context,
-                    user_input,
-                    use_rag=use_rag
-                )
-                
-                st.markdown(response)
-                
-                # Cache
-                st.session_state.current_response = response
-                st.session_state.current_response_model = "ollama"
-                st.session_state.current_stats = stats
-                
-                # Add to conversation history
-                st.session_state.conversation_history.append({
-                    "role": "user",
-                    "content": user_input,
-                })
-                st.session_state.conversation_history.append({
-                    "role": "assistant", 
-                    "content": response,
-                    "stats": stats,
-                })
-                
-                # Log
-                log_interaction("response", {
-                    "context": st.session_state.context,
-                    "input": user_input,
-                    "output": response,
-                    "backend": "ollama",
-                    "cost": 0,
-                    "latency": stats.get('time', 0),
-                    "turn": len([h for h in st.session_state.conversation_history if h['role'] == 'user']),
-                }, include_content=True)
-                
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-                return
+        response_placeholder = st.empty()
+        response_placeholder.caption(f"Asking {model}...")
+        response = ""
+        stats = None
+        
+        try:
+            for chunk, usage_info in cached_call_ollama_streaming(
+                model,
+                st.session_state.context,
+                user_input,
+                use_rag=use_rag,
+                use_cache=use_cache,
+                semantic=st.session_state.get("use_semantic_cache", False),
+                rag_result=get_entry_rag_context(user_input, use_rag)
+            ):
+                if chunk:
+                    response += chunk
+                    response_placeholder.markdown(response + "▌")
+                if usage_info:
+                    stats = usage_info
+            
+            response_placeholder.markdown(response)
+            
+            # Cache
+            st.session_state.current_response = response
+            st.session_state.current_response_model = "ollama"
+            st.session_state.current_stats = stats
+            
+            # Add to conversation history
+            st.session_state.conversation_history.append({
+                "role": "user",
+                "content": user_input,
+            })
+            st.session_state.conversation_history.append({
+                "role": "assistant", 
+                "content": response,
+                "stats": stats,
+            })
+            
+            # Log
+            log_interaction("response", {
+                "context": st.session_state.context,
+                "input": user_input,
+                "output": response,
+                "backend": "ollama",
+                "cost": 0,
+                "latency": stats.get('time', 0),
+                "input_tokens": stats.get('input_tokens', 0),
+                "output_tokens": stats.get('output_tokens', 0),
+                "turn": len([h for h in st.session_state.conversation_history if h['role'] == 'user']),
+            }, include_content=True)
+            
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+            return
     
     # Stats section
     st.markdown("---")
     st.markdown("### 📊 Response Stats")
     
     if stats:
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         col1.metric("⏱️ Time", f"{stats['time']:.1f}s")
-        col2.metric("💰 Cost", "Free")
+        if stats.get('time_to_first_token') is not None:
+            col2.metric("⚡ First Token", f"{stats['time_to_first_token']:.1f}s")
+        col3.metric("💰 Cost", "Free")
+        
+        if 'output_tokens' in stats:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("📥 Input", f"{stats['input_tokens']:,}")
+            col2.metric("📤 Output", f"{stats['output_tokens']:,}")
+            col3.metric("🚀 Speed", f"{stats['tokens_per_second']:.1f} tok/s")
+            model_note = " (cold start)" if stats.get('model_state') == "cold" else ""
+            st.caption(f"Model load {stats['load_time']:.1f}s{model_note} · "
+                       f"prompt {stats['prompt_eval_time']:.1f}s · "
+                       f"generation {stats['generation_time']:.1f}s")
         
         if stats.get('rag_used'):
-            st.caption("🔍 RAG grounding was used")
+            st.caption(f"🔍 RAG grounding was used · {stats.get('rag_tokens', 0):,} context tokens")
+        if stats.get('cached'):
+            match_note = f" (≈{stats['cache_similarity']:.0%} match)" if stats.get('cache_tier') == "semantic" else ""
+            st.caption(f"⚡ Served from cache{match_note} · saved {stats['time_saved']:.1f}s")
     
     # Action buttons: Regenerate
     st.markdown("---")
@@ -2868,74 +4006,166 @@ def render_ollama_response(user_input: str, use_rag: bool):
     render_follow_up_section("ollama")
 
 
+def format_rag_sources(stats: dict) -> str:
+    """Caption listing the knowledge docs a response was grounded in."""
+    sources = stats.get('rag_sources') or []
+    if not sources:
+        return ""
+    caption = "🔍 Sources: " + ", ".join(s.replace("_", " ").title() for s in sources)
+    if stats.get('rag_tokens'):
+        caption += f" · {stats['rag_tokens']:,} tokens"
+    return caption
+
+
+def drain_streams_concurrently(streams: dict, on_update) -> dict:
+    """
+    Consume several (chunk, usage_info) generators at once.
+    
+    Each generator runs on its own thread; on_update(name, text_so_far) is
+    called from the calling thread as chunks arrive, so it may touch Streamlit.
+    
+    Returns:
+        Dict of name -> (full_text, usage_info, error)
+    """
+    events = queue.Queue()
+    done = object()
+    
+    def pump(name, stream):
+        try:
+            for chunk, usage_info in stream:
+                events.put((name, chunk, usage_info, None))
+        except Exception as e:
+            events.put((name, "", None, e))
+        events.put((name, done, None, None))
+    
+    for name, stream in streams.items():
+        threading.Thread(target=pump, args=(name, stream), name=f"stream-{name}", daemon=True).start()
+    
+    results = {name: ["", None, None] for name in streams}
+    remaining = len(streams)
+    while remaining:
+        name, chunk, usage_info, error = events.get()
+        if chunk is done:
+            remaining -= 1
+            continue
+        if error:
+            results[name][2] = error
+        if chunk:
+            results[name][0] += chunk
+            on_update(name, results[name][0])
+        if usage_info:
+            results[name][1] = usage_info
+    
+    return {name: tuple(result) for name, result in results.items()}
+
+
 def render_compare_response(user_input: str, use_rag: bool):
     """Render side-by-side comparison with voting."""
     api_key = st.session_state.api_key
     ollama_model = st.session_state.get("selected_ollama_model", "llama3.1:8b")
+    use_cache = st.session_state.get("use_cache", False)
+    semantic = st.session_state.get("use_semantic_cache", False)
+    
+    need_claude = not st.session_state.get("compare_claude_response")
+    need_ollama = not st.session_state.get("compare_ollama_response")
+    
+    # Retrieve once so both models are grounded in the same sources
+    rag_result = get_entry_rag_context(user_input, use_rag) if (need_claude or need_ollama) else None
     
     col1, col2 = st.columns(2)
     
-    # Claude response
     with col1:
         st.markdown("### ☁️ Claude")
-        
-        if st.session_state.get("compare_claude_response"):
-            st.markdown(st.session_state.compare_claude_response)
+        claude_placeholder = st.empty()
+        claude_footer = st.container()
+    
+    with col2:
+        st.markdown(f"### 🏠 {ollama_model}")
+        ollama_placeholder = st.empty()
+        ollama_footer = st.container()
+    
+    placeholders = {"claude": claude_placeholder, "ollama": ollama_placeholder}
+    
+    # Both models stream at the same time, each rendering as tokens arrive
+    streams = {}
+    if need_claude:
+        streams["claude"] = cached_call_anthropic_streaming(
+            api_key,
+            st.session_state.context,
+            user_input,
+            use_rag=use_rag,
+            use_cache=use_cache,
+            semantic=semantic,
+            rag_result=rag_result,
+            prompt_caching=st.session_state.get("use_prompt_caching", False)
+        )
+    if need_ollama:
+        streams["ollama"] = cached_call_ollama_streaming(
+            ollama_model,
+            st.session_state.context,
+            user_input,
+            use_rag=use_rag,
+            use_cache=use_cache,
+            semantic=semantic,
+            rag_result=rag_result
+        )
+    
+    results = drain_streams_concurrently(
+        streams,
+        lambda name, text: placeholders[name].markdown(text + "▌")
+    )
+    
+    # Claude response
+    with claude_footer:
+        stats = None
+        if not need_claude:
+            claude_placeholder.markdown(st.session_state.compare_claude_response)
             stats = st.session_state.compare_claude_stats
         else:
-            response_placeholder = st.empty()
-            full_response = ""
-            stats = None
-            
-            try:
-                for chunk, usage_info in call_anthropic_streaming(
-                    api_key,
-                    st.session_state.context,
-                    user_input,
-                    use_rag=use_rag
-                ):
-                    if chunk:
-                        full_response += chunk
-                        response_placeholder.markdown(full_response + "▌")
-                    if usage_info:
-                        stats = usage_info
-                
-                response_placeholder.markdown(full_response)
+            full_response, stats, error = results["claude"]
+            if error:
+                claude_placeholder.markdown(full_response)
+                st.error(f"Error: {str(error)}")
+                stats = None
+            else:
+                claude_placeholder.markdown(full_response)
                 st.session_state.compare_claude_response = full_response
                 st.session_state.compare_claude_stats = stats
                 record_cost(stats['cost'])
-                
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
         
         if stats:
-            st.caption(f"⏱️ {stats['time']:.1f}s · 💰 ${stats['cost']:.4f}")
+            cached_note = f" · ⚡ cached ({stats['cache_tier']})" if stats.get('cached') else ""
+            st.caption(f"⏱️ {stats['time']:.1f}s · 💰 ${stats['cost']:.4f}{cached_note}")
+            prompt_cache_note = f" · 💾 {stats['cache_read_tokens']:,} cached" if stats.get('cache_read_tokens') else ""
+            st.caption(f"📥 {stats['input_tokens']:,} · 📤 {stats['output_tokens']:,} tokens{prompt_cache_note}")
+            if stats.get('rag_used'):
+                st.caption(format_rag_sources(stats))
     
     # Ollama response
-    with col2:
-        st.markdown(f"### 🏠 {ollama_model}")
-        
-        if st.session_state.get("compare_ollama_response"):
-            st.markdown(st.session_state.compare_ollama_response)
+    with ollama_footer:
+        stats = None
+        if not need_ollama:
+            ollama_placeholder.markdown(st.session_state.compare_ollama_response)
             stats = st.session_state.compare_ollama_stats
         else:
-            with st.spinner("Generating..."):
-                try:
-                    response, stats = call_ollama(
-                        ollama_model,
-                        st.session_state.context,
-                        user_input,
-                        use_rag=use_rag
-                    )
-                    st.markdown(response)
-                    st.session_state.compare_ollama_response = response
-                    st.session_state.compare_ollama_stats = stats
-                    
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+            full_response, stats, error = results["ollama"]
+            if error:
+                ollama_placeholder.markdown(full_response)
+                st.error(f"Error: {str(error)}")
+                stats = None
+            else:
+                ollama_placeholder.markdown(full_response)
+                st.session_state.compare_ollama_response = full_response
+                st.session_state.compare_ollama_stats = stats
         
         if stats:
-            st.caption(f"⏱️ {stats['time']:.1f}s · 💰 Free")
+            cached_note = f" · ⚡ cached ({stats['cache_tier']})" if stats.get('cached') else ""
+            st.caption(f"⏱️ {stats['time']:.1f}s · 💰 Free{cached_note}")
+            if 'output_tokens' in stats:
+                st.caption(f"📥 {stats['input_tokens']:,} · 📤 {stats['output_tokens']:,} tokens · "
+                           f"{stats['tokens_per_second']:.1f} tok/s · {stats.get('model_state', 'warm')} model")
+            if stats.get('rag_used'):
+                st.caption(format_rag_sources(stats))
     
     # Voting section
     st.markdown("---")
@@ -0,0 +1,42 @@
+"""
+Sage Bench Utils
+Helpers shared by the benchmarks and the scripts they run in fresh
+interpreters. Imports nothing beyond the standard library at module level,
+so a cold-start measurement only pays for what it's measuring.
+"""
+
+import math
+from pathlib import Path
+from typing import List
+
+STORES = ["chroma", "numpy", "numpy-float16"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile: the smallest value with at least pct% of values at or below it."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB."""
+    # ru_maxrss can carry over the parent's peak through exec on Linux; VmHWM can't
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) / 1024 for line in f if line.startswith("VmHWM"))
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024)  # Bytes on macOS
+
+
+def open_store(store: str, path: Path):
+    """Open (or create) a benchmark collection of the given store type in path."""
+    if store.startswith("numpy"):
+        from vector_store import NumpyVectorStore
+        return NumpyVectorStore(path, dtype="float16" if store.endswith("float16") else "float32")
+    
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
+    return client.get_or_create_collection(name="bench", metadata={"hnsw:space": "cosine"})
@@ -0,0 +1,9 @@
+"""
+Sage Concurrency
+Concurrent requests per backend, shared by the app and the eval CLI.
+"""
+
+# The Anthropic API handles parallel requests well; a local Ollama server
+# runs one generation at a time, so more workers there only queue.
+DEFAULT_CLAUDE_WORKERS = 4
+DEFAULT_OLLAMA_WORKERS = 1
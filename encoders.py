@@ -0,0 +1,303 @@
+"""
+Sage Encoders
+Interchangeable text embedding backends for RAG:
+
+- sentence-transformers: the reference model on PyTorch (default)
+- onnx: the same model exported to ONNX with int8 weights, run on ONNX
+  Runtime; no torch import, a fraction of the memory
+- ollama: the local Ollama server's embedding endpoint
+
+Every encoder has encode(texts) -> float32 array of L2-normalized rows.
+Pick one with SAGE_ENCODER. Embeddings from different encoders aren't
+comparable, so rag.py keeps a separate index per encoder_id().
+
+Create the ONNX model once with: python encoders.py export-onnx
+Compare backends with:           python encoders.py bench
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+ENCODERS = ["sentence-transformers", "onnx", "ollama"]
+
+# Same convention as app.py: the scheme is optional
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+if "://" not in OLLAMA_HOST:
+    OLLAMA_HOST = f"http://{OLLAMA_HOST}"
+OLLAMA_EMBED_MODEL = os.environ.get("SAGE_OLLAMA_EMBED_MODEL", "nomic-embed-text")
+OLLAMA_KEEP_ALIVE = "30m"
+
+ONNX_MODELS_DIR = Path(os.environ.get("SAGE_ONNX_MODELS_DIR", Path.home() / ".sage_models"))
+ONNX_MODEL_FILE = "model_int8.onnx"
+ONNX_MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2 was trained on at most 256 tokens
+
+DEFAULT_BATCH_SIZE = 32
+BENCH_QUERIES = 50
+
+
+def encoder_id(backend: str, model_name: str) -> str:
+    """Identifies the vectors a backend produces; indexes are kept per ID."""
+    if backend == "sentence-transformers":
+        return f"sentence-transformers/{model_name}"
+    if backend == "onnx":
+        return f"onnx-int8/{model_name}"
+    if backend == "ollama":
+        return f"ollama/{OLLAMA_EMBED_MODEL}"
+    raise ValueError(f"Unknown encoder {backend!r}; expected one of {', '.join(ENCODERS)}")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+class SentenceTransformerEncoder:
+    """The reference model via sentence-transformers (imports torch)."""
+    
+    def __init__(self, model_name: str):
+        start = time.perf_counter()
+        from sentence_transformers import SentenceTransformer
+        self.import_seconds = time.perf_counter() - start
+        self.model = SentenceTransformer(model_name)
+    
+    def encode(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        return _normalize(np.asarray(self.model.encode(texts, batch_size=batch_size), dtype=np.float32))
+
+
+class OnnxEncoder:
+    """
+    int8 ONNX export of a sentence-transformers model (see export_onnx).
+    
+    Tokenizes with the tokenizers library and mean-pools the last hidden
+    state, as the original model's pooling layer does.
+    """
+    
+    def __init__(self, model_name: str, model_dir: Path = None):
+        model_dir = Path(model_dir or ONNX_MODELS_DIR / f"{model_name}-int8")
+        if not (model_dir / ONNX_MODEL_FILE).exists():
+            raise FileNotFoundError(f"No ONNX model in {model_dir}; create it with: python encoders.py export-onnx")
+        
+        start = time.perf_counter()
+        import onnxruntime
+        from tokenizers import Tokenizer
+        self.import_seconds = time.perf_counter() - start
+        
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(ONNX_MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+        
+        self.session = onnxruntime.InferenceSession(str(model_dir / ONNX_MODEL_FILE),
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+    
+    def encode(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        batches = []
+        for i in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[i:i + batch_size])
+            feed = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: feed[name] for name in self.input_names})[0]
+            mask = feed["attention_mask"][..., None].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        return _normalize(np.vstack(batches))
+
+
+class OllamaEncoder:
+    """Embeddings from the local Ollama server's /api/embed endpoint."""
+    
+    def __init__(self, model: str = OLLAMA_EMBED_MODEL, host: str = OLLAMA_HOST):
+        start = time.perf_counter()
+        import requests
+        self.import_seconds = time.perf_counter() - start
+        self.model = model
+        self.host = host
+        self.session = requests.Session()
+    
+    def encode(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            response = self.session.post(
+                f"{self.host}/api/embed",
+                json={"model": self.model, "input": texts[i:i + batch_size], "keep_alive": OLLAMA_KEEP_ALIVE},
+                timeout=(5.0, 120.0)
+            )
+            if response.status_code != 200:
+                raise Exception(f"Ollama embed error: {response.status_code} {response.text[:200]}")
+            vectors.extend(response.json()["embeddings"])
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def create_encoder(backend: str, model_name: str):
+    """Load the encoder for a backend name from ENCODERS."""
+    if backend == "sentence-transformers":
+        return SentenceTransformerEncoder(model_name)
+    if backend == "onnx":
+        return OnnxEncoder(model_name)
+    if backend == "ollama":
+        return OllamaEncoder()
+    raise ValueError(f"Unknown encoder {backend!r}; expected one of {', '.join(ENCODERS)}")
+
+
+def export_onnx(model_name: str, output_dir: Path = None) -> Path:
+    """
+    Export a sentence-transformers model to ONNX with int8 weights.
+    
+    A one-off step needing sentence-transformers, torch, onnx and
+    onnxruntime; OnnxEncoder itself only needs onnxruntime and tokenizers.
+    
+    Returns:
+        The directory holding model_int8.onnx and tokenizer.json
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+    
+    output_dir = Path(output_dir or ONNX_MODELS_DIR / f"{model_name}-int8")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    st_model.tokenizer.save_pretrained(str(output_dir))
+    
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+        
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+    
+    sample = st_model.tokenizer(["warm up"], return_tensors="pt", return_token_type_ids=True)
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = output_dir / "model_fp32.onnx"
+    torch.onnx.export(
+        LastHiddenState(transformer),
+        tuple(sample[name] for name in input_names),
+        str(fp32_path),
+        input_names=input_names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+        opset_version=17,
+        dynamo=False
+    )
+    
+    quantize_dynamic(str(fp32_path), str(output_dir / ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+    return output_dir
+
+
+# Runs in a fresh interpreter per backend so imports and RSS are measured cold
+BENCH_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import bench_utils, encoders
+encoder = encoders.create_encoder(sys.argv[1], sys.argv[2])
+loaded = time.perf_counter()
+dim = encoder.encode(["warm up"]).shape[1]
+first = time.perf_counter()
+latencies = []
+for query in json.loads(sys.argv[3]):
+    query_start = time.perf_counter()
+    encoder.encode([query])
+    latencies.append((time.perf_counter() - query_start) * 1000)
+batch_start = time.perf_counter()
+encoder.encode(json.loads(sys.argv[3]))
+batch_seconds = time.perf_counter() - batch_start
+print(json.dumps({
+    "dim": int(dim),
+    "import_seconds": encoder.import_seconds,
+    "load_seconds": loaded - start,
+    "first_encode_seconds": first - loaded,
+    "p50_ms": bench_utils.percentile(latencies, 50),
+    "p95_ms": bench_utils.percentile(latencies, 95),
+    "batch_queries_per_second": len(latencies) / batch_seconds if batch_seconds else None,
+    "peak_rss_mb": bench_utils.peak_rss_mb(),
+}))
+"""
+
+
+def bench_encoder(backend: str, model_name: str, queries: List[str]) -> dict:
+    """Import, load, per-query latency and peak RSS of one backend in a fresh process."""
+    result = subprocess.run(
+        [sys.executable, "-c", BENCH_SCRIPT, backend, model_name, json.dumps(queries)],
+        cwd=Path(__file__).parent, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {"error": (result.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv: List[str] = None):
+    import argparse
+    
+    import rag
+    
+    parser = argparse.ArgumentParser(prog="python encoders.py", description="Embedding encoder backends")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    export = commands.add_parser("export-onnx", help="Export the embedding model to int8 ONNX")
+    export.add_argument("--model", default=rag.EMBEDDING_MODEL_NAME)
+    export.add_argument("--output", help=f"Directory (default: {ONNX_MODELS_DIR}/<model>-int8)")
+    
+    bench = commands.add_parser("bench", help="Compare RSS, import time and encode latency")
+    bench.add_argument("--encoders", nargs="+", choices=ENCODERS, default=ENCODERS)
+    bench.add_argument("--model", default=rag.EMBEDDING_MODEL_NAME)
+    bench.add_argument("--queries", type=int, default=BENCH_QUERIES)
+    bench.add_argument("--output", help="JSON results path (default: ~/.sage_evals/encoder_bench_<timestamp>.json)")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "export-onnx":
+        output_dir = export_onnx(args.model, args.output)
+        print(f"✅ Exported to {output_dir}. Use it with SAGE_ENCODER=onnx")
+        return output_dir
+    
+    import rag_bench
+    
+    queries = rag_bench.generate_queries(args.queries)
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "model": args.model,
+        "ollama_model": OLLAMA_EMBED_MODEL,
+        "n_queries": args.queries,
+        "encoders": {}
+    }
+    for backend in args.encoders:
+        print(f"🧮 {backend}...", end=" ", flush=True)
+        result = bench_encoder(backend, args.model, queries)
+        results["encoders"][backend] = result
+        if "error" in result:
+            print(f"❌ {result['error']}")
+            continue
+        print(f"import {result['import_seconds']:.2f}s · load {result['load_seconds']:.2f}s · "
+              f"{result['peak_rss_mb']:.0f} MB RSS · encode p50 {result['p50_ms']:.1f}ms "
+              f"p95 {result['p95_ms']:.1f}ms · batched {result['batch_queries_per_second']:,.0f} queries/s")
+    
+    if args.output:
+        filepath = Path(args.output)
+    else:
+        rag_bench.RESULTS_DIR.mkdir(exist_ok=True)
+        filepath = rag_bench.RESULTS_DIR / f"encoder_bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    filepath.write_text(json.dumps(results, indent=2))
+    print(f"\n📁 Results saved to: {filepath}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Sage Request Estimator
+Token counts for the assembled prompt, plus output size and latency
+predictions learned from past responses in interactions.log.
+"""
+
+import bisect
+import itertools
+import json
+import re
+import statistics
+import threading
+from collections import deque
+from pathlib import Path
+from typing import List, Optional
+
+# Lazy import: tiktoken fetches its encoding file once on first use and caches
+# it; without tiktoken (or offline before that) counts fall back to a heuristic
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# System prompt token counts, keyed by PROMPT_VERSION
+_system_token_counts = {}
+
+# Parsed log history, reused until the log file changes
+_history_cache = {"key": None, "samples": []}
+_history_lock = threading.Lock()
+
+# cl100k_base isn't Claude's or Llama's tokenizer, but its counts land within
+# a few percent of both on English prose.
+TOKENIZER_ENCODING = "cl100k_base"
+
+# Fallbacks until the log has enough history
+DEFAULT_OUTPUT_TOKENS = 400
+DEFAULT_LATENCY = {"claude": 6.0, "ollama": 7.0}
+MIN_SAMPLES = 3  # Per (context, backend) before trusting its median
+HISTORY_MAX_ENTRIES = 2000  # Most recent log lines considered
+
+
+def get_encoding():
+    """Lazy load the tiktoken encoding. Returns None if tiktoken isn't installed."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception:
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens in text.
+    
+    Uses tiktoken when available. Otherwise a word-level heuristic: common
+    words are one token, long words split about every 8 characters, and
+    each punctuation mark is its own token.
+    """
+    if not text:
+        return 0
+    
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    
+    words = re.findall(r"\w+", text)
+    punctuation = re.findall(r"[^\w\s]", text)
+    return sum(1 + len(w) // 8 for w in words) + len(punctuation)
+
+
+def count_word_tokens(text: str) -> List[int]:
+    """
+    Tokens attributed to each whitespace-separated word of text, from one
+    tokenization of the whole text. Unless text is all whitespace, the counts
+    sum to count_tokens(text), so any run of words can be sized by adding up
+    its entries.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        # The heuristic is per word already; a plain word is a single \w+ run
+        return [1 + len(word) // 8 if word.isalnum() else count_tokens(word) for word in text.split()]
+    
+    words = list(re.finditer(r"\S+", text))
+    if not words:
+        return []
+    
+    # Each token counts toward the word it starts in, or the next word if it
+    # starts in the whitespace before it. ASCII text's byte offsets are its
+    # character offsets, which saves decoding offsets token by token.
+    tokens = encoding.encode_ordinary(text)
+    if text.isascii():
+        starts = list(itertools.accumulate((len(b) for b in encoding.decode_tokens_bytes(tokens)), initial=0))
+    else:
+        _, starts = encoding.decode_with_offsets(tokens)
+    before = [bisect.bisect_left(starts, w.end(), hi=len(tokens)) for w in words]
+    before[-1] = len(tokens)  # Trailing whitespace counts toward the last word
+    return [b - a for a, b in zip([0] + before[:-1], before)]
+
+
+def tokenizer_id() -> str:
+    """Which tokenizer count_tokens uses: "tiktoken/<encoding>" or "heuristic"."""
+    return f"tiktoken/{TOKENIZER_ENCODING}" if get_encoding() is not None else "heuristic"
+
+
+def count_system_tokens(system_prompt: str, prompt_version: str) -> int:
+    """Token count of the system prompt, computed once per prompt version."""
+    if prompt_version not in _system_token_counts:
+        _system_token_counts[prompt_version] = count_tokens(system_prompt)
+    return _system_token_counts[prompt_version]
+
+
+def _parse_log_entry(line: str) -> Optional[dict]:
+    """Extract (context, backend, output_tokens, latency) from a response log line."""
+    try:
+        entry = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if entry.get("event") != "response":
+        return None
+    
+    data = entry.get("data", {})
+    if data.get("backend") not in DEFAULT_LATENCY or not data.get("latency"):
+        return None
+    
+    # Newer entries log token counts; older ones only have the text (or its length when redacted)
+    output_tokens = data.get("output_tokens")
+    if not output_tokens:
+        if data.get("output"):
+            output_tokens = count_tokens(data["output"])
+        elif data.get("output_length"):
+            output_tokens = data["output_length"] // 4
+    if not output_tokens:
+        return None
+    
+    return {
+        "context": data.get("context"),
+        "backend": data["backend"],
+        "output_tokens": output_tokens,
+        "latency": data["latency"],
+    }
+
+
+def load_history(log_file: Path) -> list:
+    """
+    Response samples from the most recent HISTORY_MAX_ENTRIES log lines.
+    
+    Parsed once and reused until the log file's size or mtime changes.
+    """
+    log_file = Path(log_file)
+    if not log_file.exists():
+        return []
+    
+    stat = log_file.stat()
+    key = (str(log_file), stat.st_size, stat.st_mtime)
+    with _history_lock:
+        if _history_cache["key"] == key:
+            return _history_cache["samples"]
+    
+    with open(log_file) as f:
+        lines = deque(f, maxlen=HISTORY_MAX_ENTRIES)
+    samples = [s for s in map(_parse_log_entry, lines) if s]
+    
+    with _history_lock:
+        _history_cache["key"] = key
+        _history_cache["samples"] = samples
+    return samples
+
+
+def predict_response(log_file: Path, backend: str, context: str = None) -> dict:
+    """
+    Predict output tokens and latency from past responses.
+    
+    Uses the median for this context and backend when there are at least
+    MIN_SAMPLES of them, then the backend's median across contexts, then
+    the defaults.
+    
+    Returns:
+        Dict with output_tokens, latency, samples and basis
+        ("context", "backend" or "default")
+    """
+    samples = [s for s in load_history(log_file) if s["backend"] == backend]
+    in_context = [s for s in samples if s["context"] == context]
+    
+    for basis, pool in (("context", in_context), ("backend", samples)):
+        if len(pool) >= MIN_SAMPLES:
+            return {
+                "output_tokens": int(statistics.median(s["output_tokens"] for s in pool)),
+                "latency": statistics.median(s["latency"] for s in pool),
+                "samples": len(pool),
+                "basis": basis,
+            }
+    
+    return {
+        "output_tokens": DEFAULT_OUTPUT_TOKENS,
+        "latency": DEFAULT_LATENCY.get(backend, DEFAULT_LATENCY["claude"]),
+        "samples": len(samples),
+        "basis": "default",
+    }
+
+
+def estimate_request(system_prompt: str, prompt_version: str, user_message: str,
+                     rag_context: str, log_file: Path, backend: str,
+                     context: str = None) -> dict:
+    """
+    Estimate token usage and latency for one request.
+    
+    Args:
+        system_prompt: System prompt sent with the request
+        prompt_version: Version of the system prompt (keys its cached count)
+        user_message: The assembled user message, including rag_context
+        rag_context: The retrieved framework context inside user_message
+        log_file: interactions.log to learn output size and latency from
+        backend: "claude" or "ollama"
+        context: Situation the user picked, for per-context predictions
+    
+    Returns:
+        Dict with user, system, rag, output and total tokens, plus latency,
+        samples and basis from predict_response
+    """
+    system_tokens = count_system_tokens(system_prompt, prompt_version)
+    rag_tokens = count_tokens(rag_context)
+    user_tokens = max(count_tokens(user_message) - rag_tokens, 0)
+    prediction = predict_response(log_file, backend, context)
+    
+    return {
+        "user": user_tokens,
+        "system": system_tokens,
+        "rag": rag_tokens,
+        "output": prediction["output_tokens"],
+        "total": user_tokens + system_tokens + rag_tokens + prediction["output_tokens"],
+        "latency": prediction["latency"],
+        "samples": prediction["samples"],
+        "basis": prediction["basis"],
+    }
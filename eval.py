@@ -7,8 +7,10 @@ Run synthetic test entries through different configurations and compare results.
 import json
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from concurrency import DEFAULT_CLAUDE_WORKERS, DEFAULT_OLLAMA_WORKERS
 from test_entries import TEST_ENTRIES, get_entries_by_difficulty
 
 # Results directory
@@ -66,30 +68,42 @@ def calculate_pattern_metrics(expected: list, detected: list) -> dict:
 
 
 def run_single_test(entry_key: str, entry: dict, use_rag: bool, use_ollama: bool, 
-                    api_key: str = None, ollama_model: str = "llama3.1:8b") -> dict:
-    """Run a single test and return results."""
+                    api_key: str = None, ollama_model: str = "llama3.1:8b",
+                    use_cache: bool = False, prompt_caching: bool = False,
+                    rag_result: tuple = None) -> dict:
+    """
+    Run a single test and return results.
+    
+    rag_result is an optional precomputed (rag_context, rag_sources), e.g.
+    from a batched retrieval over the whole suite.
+    """
     
     # Import here to avoid loading heavy deps at module level
     if use_ollama:
-        from app import call_ollama
-        response, stats = call_ollama(
+        from app import cached_call_ollama
+        response, stats = cached_call_ollama(
             model=ollama_model,
             context=entry["context"],
             user_input=entry["entry"],
-            use_rag=use_rag
+            use_rag=use_rag,
+            use_cache=use_cache,
+            rag_result=rag_result
         )
     else:
-        from app import call_anthropic
+        from app import cached_call_anthropic
         if not api_key:
             api_key = os.environ.get("ANTHROPIC_API_KEY")
         if not api_key:
             raise ValueError("No API key provided")
         
-        response, stats = call_anthropic(
+        response, stats = cached_call_anthropic(
             api_key=api_key,
             context=entry["context"],
             user_input=entry["entry"],
-            use_rag=use_rag
+            use_rag=use_rag,
+            use_cache=use_cache,
+            prompt_caching=prompt_caching,
+            rag_result=rag_result
         )
     
     # Extract detected patterns
@@ -116,12 +130,27 @@ def run_single_test(entry_key: str, entry: dict, use_rag: bool, use_ollama: bool
     }
 
 
+def _run_test_safely(entry_key: str, **kwargs) -> dict:
+    """Run a single test, returning an error record instead of raising."""
+    try:
+        return run_single_test(entry_key=entry_key, **kwargs)
+    except Exception as e:
+        return {
+            "entry_key": entry_key,
+            "error": str(e)
+        }
+
+
 def run_eval_suite(
     entries: dict = None,
     configurations: list = None,
     api_key: str = None,
     ollama_model: str = "llama3.1:8b",
-    save_results: bool = True
+    save_results: bool = True,
+    claude_workers: int = DEFAULT_CLAUDE_WORKERS,
+    ollama_workers: int = DEFAULT_OLLAMA_WORKERS,
+    use_cache: bool = False,
+    prompt_caching: bool = False
 ) -> dict:
     """
     Run evaluation suite across multiple entries and configurations.
@@ -132,10 +161,16 @@ def run_eval_suite(
         api_key: Anthropic API key (required for Claude tests)
         ollama_model: Which Ollama model to use
         save_results: Whether to save results to file
+        claude_workers: Max concurrent Claude requests
+        ollama_workers: Max concurrent Ollama requests
+        use_cache: Reuse cached responses for unchanged entries, model and prompt version
+        prompt_caching: Cache Claude's system prompt across requests
     
     Returns:
         Aggregated results dict
     """
+    start_time = time.time()
+    
     if entries is None:
         entries = TEST_ENTRIES
     
@@ -146,8 +181,8 @@ def run_eval_suite(
         ]
         # Only add Ollama configs if available
         try:
-            import requests
-            r = requests.get("http://localhost:11434/api/tags", timeout=2)
+            from app import OLLAMA_HOST, get_ollama_session
+            r = get_ollama_session().get(f"{OLLAMA_HOST}/api/tags", timeout=2)
             if r.status_code == 200:
                 configurations.extend([
                     {"use_rag": True, "use_ollama": True, "name": "Ollama + RAG"},
@@ -156,74 +191,149 @@ def run_eval_suite(
         except:
             print("⚠️  Ollama not available, skipping Ollama tests")
     
+    # Start loading the RAG model and index before the first request needs them
+    if any(config["use_rag"] for config in configurations):
+        try:
+            import rag
+            rag.start_warmup()
+        except Exception:
+            pass
+    
+    # Likewise load the Ollama model so the first case doesn't count as a cold start
+    if any(config["use_ollama"] for config in configurations):
+        from app import preload_ollama_model
+        preload_ollama_model(ollama_model)
+    
+    # Retrieve context for every entry in one batch, shared by all RAG configs
+    rag_results = {}
+    if any(config["use_rag"] for config in configurations):
+        from app import get_rag_contexts
+        rag_results = dict(zip(entries, get_rag_contexts([entry["entry"] for entry in entries.values()])))
+    
     results = {
         "timestamp": datetime.now().isoformat(),
         "configurations": {},
         "summary": {}
     }
     
-    for config in configurations:
-        config_name = config.get("name", f"rag={config['use_rag']}_ollama={config['use_ollama']}")
-        print(f"\n{'='*60}")
-        print(f"Running: {config_name}")
-        print(f"{'='*60}")
-        
-        config_results = []
-        total_time = 0
-        total_cost = 0
+    # One bounded pool per backend so Claude and Ollama run side by side
+    # without the local server being flooded.
+    pools = {
+        False: ThreadPoolExecutor(max_workers=max(1, claude_workers), thread_name_prefix="eval-claude"),
+        True: ThreadPoolExecutor(max_workers=max(1, ollama_workers), thread_name_prefix="eval-ollama"),
+    }
+    
+    try:
+        # Submit everything up front; results are collected below in the
+        # original config × entry order, so output stays deterministic.
+        # Ollama work goes first so it never waits on Claude prompt-cache priming.
+        jobs = [(index, entry_key, entry) for index in range(len(configurations)) for entry_key, entry in entries.items()]
+        jobs.sort(key=lambda job: not configurations[job[0]]["use_ollama"])
+        submitted = {}
+        primed = not prompt_caching
+        for index, entry_key, entry in jobs:
+            config = configurations[index]
+            future = pools[config["use_ollama"]].submit(
+                _run_test_safely,
+                entry_key=entry_key,
+                entry=entry,
+                use_rag=config["use_rag"],
+                use_ollama=config["use_ollama"],
+                api_key=api_key,
+                ollama_model=ollama_model,
+                use_cache=use_cache,
+                prompt_caching=prompt_caching,
+                rag_result=rag_results.get(entry_key) if config["use_rag"] else None
+            )
+            submitted[(index, entry_key)] = future
+            if not primed and not config["use_ollama"]:
+                # Let the first Claude request write the prompt cache before
+                # the rest are submitted, so they read it instead of each writing it
+                future.result()
+                primed = True
+        pending = [
+            (config, [(entry_key, submitted[(index, entry_key)]) for entry_key in entries])
+            for index, config in enumerate(configurations)
+        ]
         
-        for entry_key, entry in entries.items():
-            print(f"  Testing: {entry_key}...", end=" ", flush=True)
+        for config, futures in pending:
+            config_name = config.get("name", f"rag={config['use_rag']}_ollama={config['use_ollama']}")
+            print(f"\n{'='*60}")
+            print(f"Running: {config_name}")
+            print(f"{'='*60}")
+            
+            config_results = []
+            total_time = 0
+            total_cost = 0
+            total_input_tokens = 0
+            total_output_tokens = 0
+            total_cache_read_tokens = 0
+            total_load_time = 0
+            cold_starts = 0
+            speeds = []
             
-            try:
-                result = run_single_test(
-                    entry_key=entry_key,
-                    entry=entry,
-                    use_rag=config["use_rag"],
-                    use_ollama=config["use_ollama"],
-                    api_key=api_key,
-                    ollama_model=ollama_model
-                )
+            for entry_key, future in futures:
+                print(f"  Testing: {entry_key}...", end=" ", flush=True)
+                
+                result = future.result()
                 config_results.append(result)
+                
+                if "error" in result:
+                    print(f"❌ error: {result['error']}")
+                    continue
+                
                 total_time += result["stats"].get("time", 0)
                 total_cost += result["stats"].get("cost", 0)
+                total_input_tokens += result["stats"].get("input_tokens", 0)
+                total_output_tokens += result["stats"].get("output_tokens", 0)
+                total_cache_read_tokens += result["stats"].get("cache_read_tokens", 0)
+                # Ollama only: generation speed and model load time
+                total_load_time += result["stats"].get("load_time", 0)
+                if result["stats"].get("model_state") == "cold" and not result["stats"].get("cached"):
+                    cold_starts += 1
+                if result["stats"].get("tokens_per_second"):
+                    speeds.append(result["stats"]["tokens_per_second"])
                 
                 # Show quick result
                 if result["metrics"]["exact_match"]:
                     print("✅ exact match")
                 else:
                     print(f"⚠️  expected {result['expected_patterns']}, got {result['detected_patterns']}")
-                    
-            except Exception as e:
-                print(f"❌ error: {e}")
-                config_results.append({
-                    "entry_key": entry_key,
-                    "error": str(e)
-                })
-        
-        # Calculate aggregate metrics
-        successful = [r for r in config_results if "metrics" in r]
-        if successful:
-            avg_precision = sum(r["metrics"]["precision"] for r in successful) / len(successful)
-            avg_recall = sum(r["metrics"]["recall"] for r in successful) / len(successful)
-            avg_f1 = sum(r["metrics"]["f1"] for r in successful) / len(successful)
-            exact_matches = sum(1 for r in successful if r["metrics"]["exact_match"])
             
-            results["configurations"][config_name] = {
-                "results": config_results,
-                "aggregate": {
-                    "total_entries": len(entries),
-                    "successful": len(successful),
-                    "exact_matches": exact_matches,
-                    "exact_match_rate": exact_matches / len(successful) if successful else 0,
-                    "avg_precision": avg_precision,
-                    "avg_recall": avg_recall,
-                    "avg_f1": avg_f1,
-                    "total_time": total_time,
-                    "avg_time": total_time / len(successful) if successful else 0,
-                    "total_cost": total_cost
+            # Calculate aggregate metrics
+            successful = [r for r in config_results if "metrics" in r]
+            if successful:
+                avg_precision = sum(r["metrics"]["precision"] for r in successful) / len(successful)
+                avg_recall = sum(r["metrics"]["recall"] for r in successful) / len(successful)
+                avg_f1 = sum(r["metrics"]["f1"] for r in successful) / len(successful)
+                exact_matches = sum(1 for r in successful if r["metrics"]["exact_match"])
+                
+                results["configurations"][config_name] = {
+                    "results": config_results,
+                    "aggregate": {
+                        "total_entries": len(entries),
+                        "successful": len(successful),
+                        "exact_matches": exact_matches,
+                        "exact_match_rate": exact_matches / len(successful) if successful else 0,
+                        "avg_precision": avg_precision,
+                        "avg_recall": avg_recall,
+                        "avg_f1": avg_f1,
+                        "total_time": total_time,
+                        "avg_time": total_time / len(successful) if successful else 0,
+                        "total_cost": total_cost,
+                        "total_input_tokens": total_input_tokens,
+                        "total_output_tokens": total_output_tokens,
+                        "total_cache_read_tokens": total_cache_read_tokens,
+                        "avg_tokens_per_second": sum(speeds) / len(speeds) if speeds else None,
+                        "total_load_time": total_load_time,
+                        "cold_starts": cold_starts
+                    }
                 }
-            }
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    results["wall_time"] = time.time() - start_time
     
     # Print summary
     print(f"\n{'='*60}")
@@ -237,6 +347,14 @@ def run_eval_suite(
         print(f"  Avg F1: {agg['avg_f1']:.3f}")
         print(f"  Avg time: {agg['avg_time']:.2f}s")
         print(f"  Total cost: ${agg['total_cost']:.4f}")
+        print(f"  Tokens: {agg['total_input_tokens']:,} in / {agg['total_output_tokens']:,} out")
+        if agg['total_cache_read_tokens']:
+            print(f"  Prompt cache: {agg['total_cache_read_tokens']:,} tokens read")
+        if agg['avg_tokens_per_second'] is not None:
+            print(f"  Generation: {agg['avg_tokens_per_second']:.1f} tok/s, {agg['total_load_time']:.1f}s loading model "
+                  f"({agg['cold_starts']} cold starts)")
+    
+    print(f"\nWall time: {results['wall_time']:.1f}s")
     
     # Save results
     if save_results:
@@ -256,7 +374,7 @@ def run_eval_suite(
     return results
 
 
-def quick_test(api_key: str = None):
+def quick_test(api_key: str = None, **kwargs):
     """Run a quick test with just a few entries."""
     quick_entries = {
         k: v for k, v in TEST_ENTRIES.items() 
@@ -264,7 +382,8 @@ def quick_test(api_key: str = None):
     }
     return run_eval_suite(
         entries=dict(list(quick_entries.items())[:3]),
-        api_key=api_key
+        api_key=api_key,
+        **kwargs
     )
 
 
@@ -276,15 +395,40 @@ if __name__ == "__main__":
     parser.add_argument("--difficulty", choices=["obvious", "subtle", "complex", "edge"], 
                         help="Only test entries of this difficulty")
     parser.add_argument("--api-key", help="Anthropic API key")
+    parser.add_argument("--workers", type=int, default=DEFAULT_CLAUDE_WORKERS,
+                        help="Concurrent Claude requests")
+    parser.add_argument("--ollama-workers", type=int, default=DEFAULT_OLLAMA_WORKERS,
+                        help="Concurrent Ollama requests")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse cached responses from earlier runs")
+    parser.add_argument("--prompt-cache", action="store_true",
+                        help="Use Anthropic prompt caching for the system prompt")
+    parser.add_argument("--mock", action="store_true",
+                        help="Run against the offline mock LLM server instead of real backends")
     
     args = parser.parse_args()
     
     api_key = args.api_key or os.environ.get("ANTHROPIC_API_KEY")
     
+    if args.mock:
+        # Must happen before app is imported, which reads both settings
+        from mock_llm import start_mock_server
+        mock_server, mock_url = start_mock_server()
+        os.environ["ANTHROPIC_BASE_URL"] = mock_url
+        os.environ["OLLAMA_HOST"] = mock_url
+        api_key = api_key or "mock-key"
+        print(f"🧪 Using mock LLM server at {mock_url}")
+    options = {
+        "claude_workers": args.workers,
+        "ollama_workers": args.ollama_workers,
+        "use_cache": args.cache,
+        "prompt_caching": args.prompt_cache,
+    }
+    
     if args.quick:
-        quick_test(api_key)
+        quick_test(api_key, **options)
     elif args.difficulty:
         entries = dict(get_entries_by_difficulty(args.difficulty))
-        run_eval_suite(entries=entries, api_key=api_key)
+        run_eval_suite(entries=entries, api_key=api_key, **options)
     else:
-        run_eval_suite(api_key=api_key)
+        run_eval_suite(api_key=api_key, **options)
@@ -0,0 +1,418 @@
+"""
+Sage Mock LLM Server
+Offline stand-in for the Anthropic Messages API and Ollama, for benchmarking
+and CI without API spend or a local model.
+
+Point the app or eval harness at it with:
+    ANTHROPIC_BASE_URL=http://localhost:8765 OLLAMA_HOST=http://localhost:8765
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+
+import estimator
+
+DEFAULT_PORT = 8765
+DEFAULT_OLLAMA_MODELS = ["llama3.1:8b"]
+EMBED_DIM = 384
+
+SABOTEURS = [
+    ("Parrot", "Inner Critic", "the voice telling you you're not enough"),
+    ("Peacock", "Insecure Performer", "the need to prove your worth through output"),
+    ("Octopus", "Anxious Controller", "the urge to hold every detail so nothing slips"),
+    ("Golden Retriever", "Compulsive Pleaser", "the fear of disappointing anyone"),
+    ("Rabbit", "Restless Escapist", "the pull to get out of an uncomfortable moment"),
+]
+
+
+@dataclass
+class LatencyProfile:
+    """How the mock behaves. Timings are in seconds."""
+    ttft: float = 0.3  # Time to first token
+    tokens_per_second: float = 50.0
+    error_rate: float = 0.0  # Fraction of requests that fail
+    load_time: float = 0.0  # Ollama only: first request per model pays this
+    seed: int = 0
+    responses: List[str] = field(default_factory=list)  # Canned responses, used in rotation
+
+
+def generate_response(prompt: str, seed: int = 0) -> str:
+    """
+    Deterministic coaching-style response for a prompt.
+    
+    The same prompt and seed always produce the same text, and it names one
+    or two saboteurs so eval scoring has something to detect.
+    """
+    digest = hashlib.md5(f"{seed}|{prompt}".encode()).hexdigest()
+    rng = random.Random(digest)
+    primary, secondary = rng.sample(SABOTEURS, 2)
+    
+    lines = [
+        f"What you're describing sounds like the **{primary[0]}** — your {primary[1]}. "
+        f"It's {primary[2]}.",
+        "",
+        "That reaction makes sense given what's at stake for you. "
+        "Notice the story it's telling, and ask whether that story is the whole picture.",
+    ]
+    if rng.random() < 0.5:
+        lines += [
+            "",
+            f"There may also be a bit of the **{secondary[0]}** ({secondary[1]}) here: {secondary[2]}.",
+        ]
+    lines += [
+        "",
+        "**A grounded reframe:** one outcome is information, not a verdict on who you are. "
+        "What's one small step you'd take if you trusted your own judgment today?",
+    ]
+    return "\n".join(lines)
+
+
+def embed_text(text: str, dim: int = EMBED_DIM) -> List[float]:
+    """
+    Deterministic hashed bag-of-words embedding, L2-normalized.
+    
+    Texts sharing words land close together, which is enough for retrieval
+    to behave plausibly offline.
+    """
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dim] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def split_tokens(text: str) -> List[str]:
+    """Split text into word-sized chunks for streaming, each keeping its trailing whitespace."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+class MockState:
+    """Counters and per-model state shared across request threads."""
+    
+    def __init__(self, profile: LatencyProfile, ollama_models: List[str]):
+        self.profile = profile
+        self.ollama_models = ollama_models
+        self.lock = threading.Lock()
+        self.rng = random.Random(profile.seed)
+        self.request_count = 0
+        self.loaded_models = set()
+        self.cached_prefixes = set()
+    
+    def next_request(self) -> tuple[int, bool]:
+        """Number this request and decide whether it should fail."""
+        with self.lock:
+            self.request_count += 1
+            fail = self.rng.random() < self.profile.error_rate
+            return self.request_count, fail
+    
+    def pick_response(self, prompt: str, request_number: int) -> str:
+        if self.profile.responses:
+            return self.profile.responses[(request_number - 1) % len(self.profile.responses)]
+        return generate_response(prompt, self.profile.seed)
+    
+    def load_model(self, model: str) -> float:
+        """Mark a model loaded. Returns the load time this request pays."""
+        with self.lock:
+            if model in self.loaded_models:
+                return 0.0
+            self.loaded_models.add(model)
+        return self.profile.load_time
+    
+    def cache_prefix(self, prefix: str) -> bool:
+        """Record a prompt-cache prefix. Returns True if it was already cached."""
+        key = hashlib.md5(prefix.encode()).hexdigest()
+        with self.lock:
+            if key in self.cached_prefixes:
+                return True
+            self.cached_prefixes.add(key)
+            return False
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Routes Anthropic (/v1/messages) and Ollama (/api/*) requests, including /api/embed."""
+    
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real servers
+    state: MockState = None
+    
+    def log_message(self, format, *args):
+        pass
+    
+    # --- Plumbing ---
+    
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+    
+    def send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+    
+    def write_chunk(self, data: str):
+        raw = data.encode()
+        self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+        self.wfile.flush()
+    
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+    
+    def token_delay(self) -> float:
+        rate = self.state.profile.tokens_per_second
+        return 1.0 / rate if rate > 0 else 0.0
+    
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self.send_json(200, {"models": [{"name": m, "model": m} for m in self.state.ollama_models]})
+        elif self.path == "/api/ps":
+            with self.state.lock:
+                loaded = sorted(self.state.loaded_models)
+            self.send_json(200, {"models": [{"name": m, "model": m, "expires_at": None} for m in loaded]})
+        else:
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+    
+    def do_POST(self):
+        if self.path.startswith("/v1/messages"):
+            self.handle_anthropic(self.read_json())
+        elif self.path == "/api/generate":
+            self.handle_ollama(self.read_json())
+        elif self.path == "/api/embed":
+            self.handle_ollama_embed(self.read_json())
+        else:
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+    
+    # --- Anthropic Messages API ---
+    
+    def handle_anthropic(self, request: dict):
+        request_number, fail = self.state.next_request()
+        if fail:
+            self.send_json(529, {"type": "error", "error": {"type": "overloaded_error",
+                                                            "message": "Overloaded (mock)"}})
+            return
+        
+        system = request.get("system", "")
+        messages = request.get("messages", [])
+        system_text = system if isinstance(system, str) else "".join(b.get("text", "") for b in system)
+        message_texts = [
+            m["content"] if isinstance(m["content"], str) else "".join(b.get("text", "") for b in m["content"])
+            for m in messages
+        ]
+        prompt_tokens = estimator.count_tokens(system_text) + sum(map(estimator.count_tokens, message_texts))
+        
+        # Prompt caching: everything up to the last cache_control block is the prefix
+        cached_tokens = 0
+        cache_hit = False
+        if isinstance(system, list) and any("cache_control" in b for b in system):
+            cached_tokens = estimator.count_tokens(system_text)
+            prefix = system_text
+            for m, text in zip(messages, message_texts):
+                if isinstance(m["content"], list) and any("cache_control" in b for b in m["content"]):
+                    cached_tokens = estimator.count_tokens(prefix + text)
+                prefix += text
+            cache_hit = self.state.cache_prefix(system_text + "".join(message_texts[:-1]))
+        usage = {
+            "input_tokens": prompt_tokens - cached_tokens,
+            "cache_creation_input_tokens": 0 if cache_hit else cached_tokens,
+            "cache_read_input_tokens": cached_tokens if cache_hit else 0,
+        }
+        
+        text = self.state.pick_response(message_texts[-1] if message_texts else "", request_number)
+        tokens = split_tokens(text)[:request.get("max_tokens", 1024)]
+        text = "".join(tokens)
+        message = {
+            "id": f"msg_mock_{uuid.uuid4().hex[:16]}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", "mock"),
+            "content": [],
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": {**usage, "output_tokens": 0},
+        }
+        
+        time.sleep(self.state.profile.ttft)
+        
+        if not request.get("stream"):
+            time.sleep(self.token_delay() * len(tokens))
+            message.update({
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": {**usage, "output_tokens": len(tokens)},
+            })
+            self.send_json(200, message)
+            return
+        
+        def event(name: str, data: dict):
+            self.write_chunk(f"event: {name}\ndata: {json.dumps(data)}\n\n")
+        
+        self.start_chunked("text/event-stream")
+        event("message_start", {"type": "message_start", "message": message})
+        event("content_block_start", {"type": "content_block_start", "index": 0,
+                                      "content_block": {"type": "text", "text": ""}})
+        event("ping", {"type": "ping"})
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_delay())
+            event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                          "delta": {"type": "text_delta", "text": token}})
+        event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        event("message_delta", {"type": "message_delta",
+                                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                "usage": {"output_tokens": len(tokens)}})
+        event("message_stop", {"type": "message_stop"})
+        self.end_chunked()
+    
+    # --- Ollama ---
+    
+    def handle_ollama(self, request: dict):
+        model = request.get("model", "")
+        if model not in self.state.ollama_models:
+            self.send_json(404, {"error": f"model '{model}' not found, try pulling it first"})
+            return
+        
+        start = time.perf_counter()
+        load_time = self.state.load_model(model)
+        time.sleep(load_time)
+        
+        # No prompt: just load the model (used for preloading)
+        if "prompt" not in request:
+            self.send_json(200, {"model": model, "response": "", "done": True, "done_reason": "load"})
+            return
+        
+        request_number, fail = self.state.next_request()
+        if fail:
+            self.send_json(500, {"error": "mock failure"})
+            return
+        
+        prompt = request["prompt"]
+        tokens = split_tokens(self.state.pick_response(prompt, request_number))
+        prompt_eval_start = time.perf_counter()
+        time.sleep(self.state.profile.ttft)
+        prompt_eval_time = time.perf_counter() - prompt_eval_start
+        
+        def final(eval_time: float) -> dict:
+            return {
+                "model": model,
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": estimator.count_tokens(prompt),
+                "eval_count": len(tokens),
+                "load_duration": int(load_time * 1e9),
+                "prompt_eval_duration": int(prompt_eval_time * 1e9),
+                "eval_duration": int(eval_time * 1e9),
+                "total_duration": int((time.perf_counter() - start) * 1e9),
+            }
+        
+        eval_start = time.perf_counter()
+        if not request.get("stream", True):
+            time.sleep(self.token_delay() * len(tokens))
+            self.send_json(200, {**final(time.perf_counter() - eval_start), "response": "".join(tokens)})
+            return
+        
+        self.start_chunked("application/x-ndjson")
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_delay())
+            self.write_chunk(json.dumps({"model": model, "response": token, "done": False}) + "\n")
+        self.write_chunk(json.dumps({**final(time.perf_counter() - eval_start), "response": ""}) + "\n")
+        self.end_chunked()
+    
+    def handle_ollama_embed(self, request: dict):
+        # Any model name is accepted: the mock embeds the same way for all of them
+        request_number, fail = self.state.next_request()
+        if fail:
+            self.send_json(500, {"error": "mock failure"})
+            return
+        
+        inputs = request.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        self.send_json(200, {
+            "model": request.get("model"),
+            "embeddings": [embed_text(text) for text in inputs],
+            "prompt_eval_count": sum(estimator.count_tokens(text) for text in inputs),
+        })
+
+
+def start_mock_server(profile: LatencyProfile = None, port: int = 0,
+                      ollama_models: List[str] = None) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Start the mock server in a background thread.
+    
+    Args:
+        profile: Latency and error behavior (defaults to LatencyProfile())
+        port: Port to listen on; 0 picks a free one
+        ollama_models: Model names to advertise on /api/tags
+    
+    Returns:
+        (server, base_url). Call server.shutdown() to stop it.
+    """
+    state = MockState(profile or LatencyProfile(), ollama_models or DEFAULT_OLLAMA_MODELS)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def load_responses(path: Optional[str]) -> List[str]:
+    """Canned responses from a .json list, or a text file with responses separated by '---' lines."""
+    if not path:
+        return []
+    content = Path(path).read_text()
+    if path.endswith(".json"):
+        return json.loads(content)
+    return [r.strip() for r in content.split("\n---\n") if r.strip()]
+
+
+# CLI for serving
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Anthropic and Ollama APIs")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail (0-1)")
+    parser.add_argument("--load-time", type=float, default=0.0,
+                        help="Seconds the first Ollama request per model spends loading it")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generated responses and errors")
+    parser.add_argument("--responses", help="Canned responses (.json list, or text separated by '---' lines)")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_OLLAMA_MODELS, help="Ollama models to advertise")
+    
+    args = parser.parse_args()
+    
+    profile = LatencyProfile(
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        load_time=args.load_time,
+        seed=args.seed,
+        responses=load_responses(args.responses),
+    )
+    server, url = start_mock_server(profile, port=args.port, ollama_models=args.models)
+    print(f"🧪 Mock LLM server on {url}")
+    print(f"   ANTHROPIC_BASE_URL={url} OLLAMA_HOST={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
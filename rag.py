@@ -1,53 +1,321 @@
 """
 Sage RAG Module
-Local embeddings with Sentence Transformers + ChromaDB for vector storage.
+Local embeddings with Sentence Transformers + ChromaDB (or a NumPy index) for vector storage.
 """
 
 import os
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 import hashlib
 import json
+import re
+import threading
+import time
+
+import encoders
+import estimator
 
 # Lazy imports to avoid loading heavy libs until needed
 _embedding_model = None
 _chroma_client = None
 _collection = None
 
+# Loads can be triggered by the warm-up thread and by requests at the same
+# time; the locks make sure only one of them does the work.
+_model_lock = threading.Lock()
+_collection_lock = threading.Lock()
+_warmup_lock = threading.Lock()
+_warmup_future = None
+
+# Seconds spent in each load stage, for observability
+LOAD_TIMINGS = {}
+
+_query_cache = OrderedDict()
+_query_cache_lock = threading.Lock()
+_query_cache_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
 KNOWLEDGE_DIR = Path(__file__).parent / "knowledge"
 CHROMA_DIR = Path.home() / ".sage_chroma"
-CACHE_FILE = CHROMA_DIR / "doc_hashes.json"
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Encoder backend from encoders.py: "sentence-transformers", "onnx" (int8,
+# no torch) or "ollama". Each encoder's vectors get their own index, so a
+# query is never compared against chunks embedded by a different model.
+EMBEDDING_ENCODER = os.environ.get("SAGE_ENCODER", "sentence-transformers")
+ENCODER_ID = encoders.encoder_id(EMBEDDING_ENCODER, EMBEDDING_MODEL_NAME)
+# The default encoder keeps the original, unsuffixed index names
+INDEX_SUFFIX = "" if EMBEDDING_ENCODER == "sentence-transformers" else "-" + re.sub(r"[^A-Za-z0-9]+", "-", ENCODER_ID)
+
+# Vector store backend: "chroma", or "numpy" for the lighter exact-search
+# index in vector_store.py (no chromadb import or HNSW startup)
+VECTOR_STORE = os.environ.get("SAGE_VECTOR_STORE", "chroma")
+VECTOR_DTYPE = os.environ.get("SAGE_VECTOR_DTYPE", "float32")  # numpy only; float16: half the size, slower search
+COLLECTION_NAME = f"sage_knowledge{INDEX_SUFFIX}"
+NUMPY_STORE_DIR = CHROMA_DIR / f"numpy_store{INDEX_SUFFIX}"
+
+# Each store and encoder records which documents it has indexed separately
+CACHE_FILE = (NUMPY_STORE_DIR if VECTOR_STORE == "numpy" else CHROMA_DIR) / f"doc_hashes{INDEX_SUFFIX}.json"
+
+# Recorded alongside the doc hashes; indexes built with positional chunk IDs
+# ("parrot_0") or the old character-sized chunker don't match it, so they get
+# fully re-synced once.
+INDEX_FORMAT = "content-addressed-v2"
+
+# Chunks follow the markdown's sections and are sized in tokens; a section
+# only spans several chunks when it doesn't fit in one
+CHUNK_MAX_TOKENS = 160
+CHUNK_OVERLAP_TOKENS = 20  # Carried between chunks of the same section
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Indexing streams chunks through encode and add in fixed-size batches, so
+# memory stays flat however large the knowledge base grows
+INDEX_BATCH_SIZE = 256  # Chunks per encode + add
+INDEX_READ_WORKERS = 8  # Threads reading files ahead of the encoder
+
+# Context packing: over-fetch candidates, drop repeated text, then fill the
+# token budget best-first. Every RAG request pays for these tokens in cost
+# and time to first token.
+CONTEXT_TOKEN_BUDGET = 350  # About what three chunks used to cost
+CONTEXT_CANDIDATES = 10  # Chunks fetched before packing
+RELEVANCE_THRESHOLD = 0.3  # Minimum similarity to be considered
+DUPLICATE_THRESHOLD = 0.8  # Share of a chunk's word trigrams already packed that makes it a duplicate
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Query embedding cache: the same text is embedded again on regenerate, in
+# compare mode and across eval configurations
+QUERY_CACHE_SIZE = 1024  # In-process LRU entries
+QUERY_CACHE_ON_DISK = os.environ.get("SAGE_QUERY_CACHE_ON_DISK") == "1"
+QUERY_CACHE_DIR = CHROMA_DIR / "query_embeddings"
+QUERY_CACHE_DISK_MAX = 10_000  # Files kept on disk
 
 
 def get_embedding_model():
-    """Lazy load the embedding model."""
+    """Lazy load the encoder selected by EMBEDDING_ENCODER."""
     global _embedding_model
     if _embedding_model is None:
-        from sentence_transformers import SentenceTransformer
-        # all-MiniLM-L6-v2 is fast and good enough for this use case
-        _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        with _model_lock:
+            if _embedding_model is None:
+                start = time.perf_counter()
+                # all-MiniLM-L6-v2 is fast and good enough for this use case
+                _embedding_model = encoders.create_encoder(EMBEDDING_ENCODER, EMBEDDING_MODEL_NAME)
+                LOAD_TIMINGS["import_encoder"] = _embedding_model.import_seconds
+                LOAD_TIMINGS["load_embedding_model"] = time.perf_counter() - start - _embedding_model.import_seconds
     return _embedding_model
 
 
 def get_collection():
-    """Get or create the ChromaDB collection."""
+    """Get or create the knowledge collection in the configured VECTOR_STORE."""
     global _chroma_client, _collection
     if _collection is None:
-        import chromadb
-        from chromadb.config import Settings
+        with _collection_lock:
+            if _collection is None:
+                if VECTOR_STORE == "numpy":
+                    start = time.perf_counter()
+                    from vector_store import NumpyVectorStore
+                    _collection = NumpyVectorStore(NUMPY_STORE_DIR, dtype=VECTOR_DTYPE)
+                    LOAD_TIMINGS["open_collection"] = time.perf_counter() - start
+                else:
+                    start = time.perf_counter()
+                    import chromadb
+                    from chromadb.config import Settings
+                    LOAD_TIMINGS["import_chromadb"] = time.perf_counter() - start
+                    
+                    CHROMA_DIR.mkdir(exist_ok=True)
+                    
+                    start = time.perf_counter()
+                    _chroma_client = chromadb.PersistentClient(
+                        path=str(CHROMA_DIR),
+                        settings=Settings(anonymized_telemetry=False)
+                    )
+                    
+                    _collection = _chroma_client.get_or_create_collection(
+                        name=COLLECTION_NAME,
+                        metadata={"hnsw:space": "cosine", "encoder": ENCODER_ID}
+                    )
+                    LOAD_TIMINGS["open_collection"] = time.perf_counter() - start
+    return _collection
+
+
+def get_max_batch_size() -> int:
+    """Most records the vector store accepts in one add/update/delete call."""
+    get_collection()
+    return getattr(_chroma_client, "max_batch_size", None) or 5_000
+
+
+def _warm_up(future: Future):
+    """Load everything retrieve() needs, then resolve the future."""
+    try:
+        start = time.perf_counter()
+        model = get_embedding_model()
+        collection = get_collection()
+        if collection.count() == 0:
+            index_knowledge_base()
+        
+        # The first encode pays one-off setup costs; get them out of the way
+        encode_start = time.perf_counter()
+        model.encode(["warm up"])
+        LOAD_TIMINGS["first_encode"] = time.perf_counter() - encode_start
         
-        CHROMA_DIR.mkdir(exist_ok=True)
+        LOAD_TIMINGS["warmup_total"] = time.perf_counter() - start
+        future.set_result(dict(LOAD_TIMINGS))
+    except Exception as e:
+        future.set_exception(e)
+
+
+def start_warmup() -> Future:
+    """
+    Start loading the embedding model and collection in a background thread.
+    
+    Safe to call repeatedly; only the first call starts a load. Returns a
+    future that resolves to the load timings once everything is ready.
+    """
+    global _warmup_future
+    with _warmup_lock:
+        if _warmup_future is None:
+            _warmup_future = Future()
+            threading.Thread(
+                target=_warm_up,
+                args=(_warmup_future,),
+                name="rag-warmup",
+                daemon=True
+            ).start()
+    return _warmup_future
+
+
+def wait_until_ready(timeout: float = None):
+    """
+    Block until a started warm-up finishes.
+    
+    A failed warm-up is not raised here; the caller's own load attempt will
+    surface the real error.
+    """
+    if _warmup_future is None:
+        return
+    try:
+        _warmup_future.result(timeout=timeout)
+    except Exception:
+        pass
+
+
+def get_load_status() -> dict:
+    """Warm-up state ("not started", "loading", "ready", "failed") and stage timings in seconds."""
+    if _warmup_future is None:
+        state = "not started"
+    elif not _warmup_future.done():
+        state = "loading"
+    elif _warmup_future.exception() is not None:
+        state = "failed"
+    else:
+        state = "ready"
+    return {"state": state, "timings": dict(LOAD_TIMINGS)}
+
+
+def _remember_query_embedding(key: str, embedding):
+    """Insert into the in-process LRU. Caller holds _query_cache_lock."""
+    _query_cache[key] = embedding
+    _query_cache.move_to_end(key)
+    while len(_query_cache) > QUERY_CACHE_SIZE:
+        _query_cache.popitem(last=False)
+        _query_cache_stats["evictions"] += 1
+
+
+def _prune_query_cache_dir():
+    """Drop the oldest on-disk embeddings beyond QUERY_CACHE_DISK_MAX."""
+    files = sorted(QUERY_CACHE_DIR.glob("*.npy"), key=lambda f: f.stat().st_mtime)
+    for f in files[:max(0, len(files) - QUERY_CACHE_DISK_MAX)]:
+        f.unlink(missing_ok=True)
+
+
+def embed_query(query: str):
+    """
+    Embed a query, reusing cached embeddings of identical text.
+    
+    Keyed by a hash of the encoder and text. Returns a read-only float32 vector.
+    """
+    return embed_queries([query])[0]
+
+
+def embed_queries(queries: List[str]) -> list:
+    """
+    Embed several queries, encoding all cache misses in one batched call.
+    
+    Returns:
+        Read-only float32 vectors, in the same order as queries
+    """
+    import numpy as np
+    
+    keys = [hashlib.sha256(f"{ENCODER_ID}|{query}".encode()).hexdigest() for query in queries]
+    embeddings = [None] * len(queries)
+    
+    with _query_cache_lock:
+        for i, key in enumerate(keys):
+            if key in _query_cache:
+                _query_cache.move_to_end(key)
+                _query_cache_stats["hits"] += 1
+                embeddings[i] = _query_cache[key]
+    
+    if QUERY_CACHE_ON_DISK:
+        for i, key in enumerate(keys):
+            disk_path = QUERY_CACHE_DIR / f"{key}.npy"
+            if embeddings[i] is not None or not disk_path.exists():
+                continue
+            try:
+                embedding = np.load(disk_path)
+                embedding.setflags(write=False)
+                with _query_cache_lock:
+                    _query_cache_stats["disk_hits"] += 1
+                    _remember_query_embedding(key, embedding)
+                embeddings[i] = embedding
+            except Exception:
+                pass
+    
+    # Each distinct missing text is encoded once
+    missing = {}
+    for i, key in enumerate(keys):
+        if embeddings[i] is None:
+            missing.setdefault(key, []).append(i)
+    if not missing:
+        return embeddings
+    
+    texts = [queries[indexes[0]] for indexes in missing.values()]
+    encoded = np.asarray(get_embedding_model().encode(texts), dtype=np.float32)
+    
+    for key, embedding in zip(missing, encoded):
+        embedding.setflags(write=False)
+        for i in missing[key]:
+            embeddings[i] = embedding
         
-        _chroma_client = chromadb.PersistentClient(
-            path=str(CHROMA_DIR),
-            settings=Settings(anonymized_telemetry=False)
-        )
+        with _query_cache_lock:
+            _query_cache_stats["misses"] += 1
+            _remember_query_embedding(key, embedding)
+            misses = _query_cache_stats["misses"]
         
-        _collection = _chroma_client.get_or_create_collection(
-            name="sage_knowledge",
-            metadata={"hnsw:space": "cosine"}
-        )
-    return _collection
+        if QUERY_CACHE_ON_DISK:
+            QUERY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            np.save(QUERY_CACHE_DIR / f"{key}.npy", embedding)
+            if misses % 100 == 0:
+                _prune_query_cache_dir()
+    
+    return embeddings
+
+
+def get_query_cache_stats() -> dict:
+    """Query embedding cache counters plus current size."""
+    with _query_cache_lock:
+        return {**_query_cache_stats, "size": len(_query_cache)}
+
+
+def clear_query_cache():
+    """Empty the in-process and on-disk query embedding caches."""
+    with _query_cache_lock:
+        _query_cache.clear()
+    if QUERY_CACHE_DIR.exists():
+        for f in QUERY_CACHE_DIR.glob("*.npy"):
+            f.unlink(missing_ok=True)
 
 
 def compute_doc_hash(content: str) -> str:
@@ -64,118 +332,375 @@ def load_doc_hashes() -> dict:
 
 def save_doc_hashes(hashes: dict):
     """Save document hashes."""
-    CHROMA_DIR.mkdir(exist_ok=True)
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
     CACHE_FILE.write_text(json.dumps(hashes))
 
 
-def chunk_document(content: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+def _iter_blocks(content: str) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (level, heading_line) for each markdown heading and (0, text) for
+    each blank-line-separated block between them. Headings inside code
+    fences are treated as text.
+    """
+    block = []
+    in_fence = False
+    for line in content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(stripped)
+        if match or (not stripped and not in_fence):
+            if block:
+                yield 0, "\n".join(block).strip()
+                block = []
+            if match:
+                yield len(match.group(1)), stripped
+            continue
+        block.append(line)
+    if block:
+        yield 0, "\n".join(block).strip()
+
+
+def _split_block(text: str, max_tokens: int) -> Iterator[Tuple[str, int, Optional[List[int]]]]:
+    """
+    Yield (piece, tokens, word_tokens) for a block, splitting at sentences,
+    then words, if it exceeds max_tokens.
+    
+    A block that has to be split is tokenized once more for per-word counts;
+    sentence and piece sizes are sums of those, so splitting stays linear in
+    the block's length. word_tokens is the count of each word of piece, or
+    None for a block that fit whole.
+    """
+    tokens = estimator.count_tokens(text)
+    if tokens <= max_tokens:
+        yield text, tokens, None
+        return
+    
+    word_tokens = estimator.count_word_tokens(text)
+    piece, piece_tokens, piece_word_tokens = [], 0, []
+    position = 0
+    for sentence in SENTENCE_END_RE.split(text):
+        sentence_words = sentence.split()
+        counts = word_tokens[position:position + len(sentence_words)]
+        position += len(sentence_words)
+        sentence_tokens = sum(counts)
+        if sentence_tokens <= max_tokens:
+            units = [(sentence, sentence_tokens, counts)]
+        else:
+            units = [(word, count, [count]) for word, count in zip(sentence_words, counts)]
+        for unit, unit_tokens, unit_word_tokens in units:
+            if piece and piece_tokens + unit_tokens > max_tokens:
+                yield " ".join(piece), piece_tokens, piece_word_tokens
+                piece, piece_tokens, piece_word_tokens = [], 0, []
+            piece.append(unit)
+            piece_tokens += unit_tokens
+            piece_word_tokens += unit_word_tokens
+    if piece:
+        yield " ".join(piece), piece_tokens, piece_word_tokens
+
+
+def _tail(text: str, word_tokens: Optional[List[int]], max_tokens: int) -> Tuple[str, int]:
+    """
+    The last words of text, up to max_tokens, and their token count.
+    word_tokens gives each word's count if known; otherwise only the words
+    walked back over are counted.
+    """
+    words = text.split()
+    start, tokens = len(words), 0
+    while start:
+        count = word_tokens[start - 1] if word_tokens is not None else estimator.count_tokens(words[start - 1])
+        if tokens + count > max_tokens:
+            break
+        start -= 1
+        tokens += count
+    return " ".join(words[start:]), tokens
+
+
+def _join_chunk(heading: str, parts: List[str]) -> str:
+    """Chunk text: the section heading on its own line, then the blocks."""
+    body = "\n\n".join(parts)
+    return f"{heading}\n{body}" if heading else body
+
+
+def iter_chunks(content: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Iterator[Tuple[str, str]]:
     """
-    Split document into overlapping chunks.
+    Split a markdown document into chunks that follow its sections.
+    
+    Each chunk holds text from one section, starts with that section's
+    heading, and stays within max_tokens. A section too long for one chunk
+    is split at paragraphs, then sentences, then words, with the last
+    overlap_tokens of each piece repeated at the start of the next. Runs in
+    one pass over the document.
     
     Args:
         content: Full document text
-        chunk_size: Target characters per chunk
-        overlap: Overlap between chunks
+        max_tokens: Most tokens per chunk, heading included
+        overlap_tokens: Tokens repeated between chunks of the same section
+    
+    Yields:
+        (chunk_text, section_path) where section_path is the heading trail,
+        e.g. "🦜 The Parrot (Inner Critic) > Core Fear"
+    """
+    path = []  # (level, title) of the enclosing headings
+    heading, heading_tokens = "", 0
+    parts, tokens = [], 0
+    last_word_tokens = None  # Per-word counts of parts[-1], if known, for the overlap
+    
+    for level, text in _iter_blocks(content):
+        if level:
+            if parts:
+                yield _join_chunk(heading, parts), " > ".join(t for _, t in path)
+                parts = []
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, HEADING_RE.match(text).group(2)))
+            heading, heading_tokens = text, estimator.count_tokens(text)
+            continue
+        
+        piece_max = max(max_tokens - heading_tokens - overlap_tokens, 1)
+        for piece, piece_tokens, word_tokens in _split_block(text, piece_max):
+            if parts and tokens + piece_tokens > max_tokens:
+                yield _join_chunk(heading, parts), " > ".join(t for _, t in path)
+                overlap, overlap_count = _tail(parts[-1], last_word_tokens, overlap_tokens)
+                parts, tokens = ([overlap], heading_tokens + overlap_count) if overlap else ([], heading_tokens)
+            if not parts:
+                tokens = heading_tokens
+            parts.append(piece)
+            tokens += piece_tokens
+            last_word_tokens = word_tokens
+    
+    if parts:
+        yield _join_chunk(heading, parts), " > ".join(t for _, t in path)
+
+
+def chunk_document(content: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                   overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Split document into section-aligned chunks.
+    
+    Args:
+        content: Full document text
+        max_tokens: Most tokens per chunk
+        overlap_tokens: Overlap between chunks of the same section
     
     Returns:
-        List of text chunks
+        List of text chunks (see iter_chunks for their section paths)
+    """
+    return [chunk for chunk, _ in iter_chunks(content, max_tokens, overlap_tokens)]
+
+
+def compute_chunk_id(doc_name: str, chunk: str, occurrence: int = 0) -> str:
+    """
+    Content-addressed chunk ID: unchanged text keeps its ID when other parts
+    of the document are edited. occurrence disambiguates repeated chunks.
     """
-    # Split by paragraphs first
-    paragraphs = content.split('\n\n')
+    chunk_hash = hashlib.sha256(chunk.encode()).hexdigest()[:16]
+    return f"{doc_name}:{chunk_hash}:{occurrence}"
+
+
+def list_knowledge_files() -> List[Path]:
+    """All markdown files under KNOWLEDGE_DIR, including subdirectories, in a stable order."""
+    return sorted(KNOWLEDGE_DIR.rglob("*.md"))
+
+
+def get_doc_name(filepath: Path) -> str:
+    """Document name: path under KNOWLEDGE_DIR without suffix ("parrot", "teams/launch")."""
+    return filepath.relative_to(KNOWLEDGE_DIR).with_suffix("").as_posix()
+
+
+def _read_document(filepath: Path) -> Tuple[str, str, str]:
+    """(doc_name, content, content_hash) for one file."""
+    content = filepath.read_text()
+    return get_doc_name(filepath), content, compute_doc_hash(content)
+
+
+def iter_documents(files: Iterable[Path], workers: int = INDEX_READ_WORKERS) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yield (doc_name, content, content_hash) per file, in order.
     
-    chunks = []
-    current_chunk = ""
+    Files are read on a thread pool a few ahead of the consumer; at most
+    workers * 2 documents are held in memory at once.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-read") as pool:
+        pending = deque()
+        for filepath in files:
+            pending.append(pool.submit(_read_document, filepath))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _encode_batch(texts: List[str]) -> list:
+    """Embed one batch of chunks. Runs in this process or in a pool worker."""
+    return get_embedding_model().encode(texts).tolist()
+
+
+def embed_batches(batches: Iterable[dict], processes: int = 1) -> Iterator[Tuple[dict, list]]:
+    """
+    Yield (batch, embeddings) for each batch of chunks, in order.
     
-    for para in paragraphs:
-        para = para.strip()
-        if not para:
-            continue
-            
-        # If adding this paragraph exceeds chunk size, save current and start new
-        if len(current_chunk) + len(para) > chunk_size and current_chunk:
-            chunks.append(current_chunk.strip())
-            # Keep some overlap
-            words = current_chunk.split()
-            overlap_words = words[-overlap//5:] if len(words) > overlap//5 else []
-            current_chunk = ' '.join(overlap_words) + ' ' + para
-        else:
-            current_chunk += '\n\n' + para if current_chunk else para
+    Args:
+        batches: Dicts with "ids", "documents" and "metadatas" lists
+        processes: Encode across this many worker processes, each with its
+            own copy of the model. At most processes * 2 batches are in flight.
+    """
+    if processes <= 1:
+        for batch in batches:
+            yield batch, _encode_batch(batch["documents"])
+        return
     
-    # Don't forget the last chunk
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
+    from concurrent.futures import ProcessPoolExecutor
     
-    return chunks
+    with ProcessPoolExecutor(max_workers=processes, initializer=get_embedding_model) as pool:
+        in_flight = deque()
+        for batch in batches:
+            in_flight.append((batch, pool.submit(_encode_batch, batch["documents"])))
+            if len(in_flight) >= processes * 2:
+                batch, future = in_flight.popleft()
+                yield batch, future.result()
+        while in_flight:
+            batch, future = in_flight.popleft()
+            yield batch, future.result()
 
 
-def index_knowledge_base(force: bool = False) -> int:
+def index_knowledge_base(force: bool = False, processes: int = 1,
+                         progress: Callable[[dict], None] = None,
+                         max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> dict:
     """
-    Index all knowledge documents into ChromaDB.
+    Sync knowledge documents into ChromaDB, embedding only new or changed chunks.
+    
+    Walks KNOWLEDGE_DIR recursively and streams chunks through encode and
+    add in batches of INDEX_BATCH_SIZE. Chunks are stored under
+    content-addressed IDs, so if indexing is interrupted the batches already
+    written are kept and the next run picks up where it stopped. Chunks that
+    no longer appear in any document (edited text, deleted files) are removed.
     
     Args:
-        force: If True, re-index everything even if unchanged
+        force: If True, drop and re-embed every chunk even if unchanged
+        processes: Worker processes for encoding (1 encodes in this process)
+        progress: Called after each written batch with files_done,
+            files_total, added and kept counts
+        max_tokens: Chunk size passed to iter_chunks
+        overlap_tokens: Overlap passed to iter_chunks
     
     Returns:
-        Number of chunks indexed
+        Dict with counts of "added", "kept" and "removed" chunks
     """
     collection = get_collection()
-    model = get_embedding_model()
-    
-    # Load existing hashes
+    files = list_knowledge_files()
     old_hashes = load_doc_hashes()
-    new_hashes = {}
     
-    all_chunks = []
-    all_ids = []
-    all_metadatas = []
+    if force:
+        # Forget the hashes first, so an interrupted forced run can't leave
+        # documents marked unchanged whose chunks are already gone
+        CACHE_FILE.unlink(missing_ok=True)
+        old_hashes = {}
+        existing_ids = collection.get(include=[])["ids"]
+        batch_size = get_max_batch_size()
+        for i in range(0, len(existing_ids), batch_size):
+            collection.delete(ids=existing_ids[i:i + batch_size])
     
-    # Process each knowledge file
-    for filepath in KNOWLEDGE_DIR.glob("*.md"):
-        content = filepath.read_text()
-        doc_hash = compute_doc_hash(content)
-        doc_name = filepath.stem
-        
-        new_hashes[doc_name] = doc_hash
-        
-        # Skip if unchanged and not forcing
-        if not force and old_hashes.get(doc_name) == doc_hash:
+    # An unchanged file's chunks are already in the collection, unless the
+    # index was built in an older format, by another encoder, or with another
+    # chunk size or tokenizer (token counts decide where chunks split)
+    chunking = f"{max_tokens}/{overlap_tokens}/{estimator.tokenizer_id()}"
+    trust_hashes = (old_hashes.get("_format") == INDEX_FORMAT and old_hashes.get("_encoder") == ENCODER_ID
+                    and old_hashes.get("_chunking") == chunking and collection.count() > 0)
+    
+    existing_metadata = None  # Fetched only once some document needs syncing
+    new_hashes = {"_format": INDEX_FORMAT, "_encoder": ENCODER_ID, "_chunking": chunking}
+    unchanged_docs = set()
+    seen_ids = set()
+    counts = {"files_done": 0, "files_total": len(files), "added": 0, "kept": 0}
+    moved = {"ids": [], "metadatas": []}
+    
+    def report():
+        if progress:
+            progress(dict(counts))
+    
+    def flush_moved():
+        # Kept chunks may have moved within their document; fix positions without re-embedding
+        if moved["ids"]:
+            collection.update(ids=moved["ids"], metadatas=moved["metadatas"])
+            moved["ids"], moved["metadatas"] = [], []
+    
+    def new_chunk_batches() -> Iterator[dict]:
+        nonlocal existing_metadata
+        batch = {"ids": [], "documents": [], "metadatas": []}
+        for doc_name, content, content_hash in iter_documents(files):
+            new_hashes[doc_name] = content_hash
+            counts["files_done"] += 1
+            if trust_hashes and old_hashes.get(doc_name) == content_hash:
+                unchanged_docs.add(doc_name)
+                continue
+            
+            if existing_metadata is None:
+                existing = collection.get(include=["metadatas"])
+                existing_metadata = dict(zip(existing["ids"], existing["metadatas"]))
+            
+            chunks = list(iter_chunks(content, max_tokens, overlap_tokens))
+            occurrences = {}
+            for i, (chunk, section) in enumerate(chunks):
+                occurrence = occurrences.get(chunk, 0)
+                occurrences[chunk] = occurrence + 1
+                chunk_id = compute_chunk_id(doc_name, chunk, occurrence)
+                metadata = {"source": doc_name, "section": section, "chunk_index": i, "total_chunks": len(chunks)}
+                seen_ids.add(chunk_id)
+                
+                if chunk_id in existing_metadata:
+                    counts["kept"] += 1
+                    if existing_metadata[chunk_id] != metadata:
+                        moved["ids"].append(chunk_id)
+                        moved["metadatas"].append(metadata)
+                        if len(moved["ids"]) >= INDEX_BATCH_SIZE:
+                            flush_moved()
+                    continue
+                
+                batch["ids"].append(chunk_id)
+                batch["documents"].append(chunk)
+                batch["metadatas"].append(metadata)
+                if len(batch["ids"]) >= INDEX_BATCH_SIZE:
+                    yield batch
+                    batch = {"ids": [], "documents": [], "metadatas": []}
+        if batch["ids"]:
+            yield batch
+    
+    for batch, embeddings in embed_batches(new_chunk_batches(), processes):
+        collection.add(embeddings=embeddings, **batch)
+        counts["added"] += len(batch["ids"])
+        report()
+    flush_moved()
+    
+    # Fast path: no file changed, appeared or disappeared since the last sync
+    old_docs = set(old_hashes) - {"_format", "_encoder", "_chunking"}
+    if existing_metadata is None and unchanged_docs == old_docs:
+        counts["kept"] = collection.count()
+        report()
+        save_doc_hashes(new_hashes)
+        return {"added": 0, "kept": counts["kept"], "removed": 0}
+    
+    # Remove chunks no current document produced. Runs last, so an
+    # interrupted sync never drops chunks before their replacements exist.
+    existing = collection.get(include=["metadatas"])
+    stale_ids = []
+    for chunk_id, metadata in zip(existing["ids"], existing["metadatas"]):
+        if chunk_id in seen_ids:
             continue
-        
-        # Delete old chunks for this document
-        try:
-            existing = collection.get(where={"source": doc_name})
-            if existing['ids']:
-                collection.delete(ids=existing['ids'])
-        except:
-            pass
-        
-        # Chunk the document
-        chunks = chunk_document(content)
-        
-        for i, chunk in enumerate(chunks):
-            chunk_id = f"{doc_name}_{i}"
-            all_chunks.append(chunk)
-            all_ids.append(chunk_id)
-            all_metadatas.append({
-                "source": doc_name,
-                "chunk_index": i,
-                "total_chunks": len(chunks)
-            })
-    
-    # Embed and store
-    if all_chunks:
-        embeddings = model.encode(all_chunks).tolist()
-        collection.add(
-            ids=all_ids,
-            embeddings=embeddings,
-            documents=all_chunks,
-            metadatas=all_metadatas
-        )
-    
-    # Save new hashes
+        if metadata.get("source") in unchanged_docs:
+            counts["kept"] += 1
+        else:
+            stale_ids.append(chunk_id)
+    
+    batch_size = get_max_batch_size()
+    for i in range(0, len(stale_ids), batch_size):
+        collection.delete(ids=stale_ids[i:i + batch_size])
+    
+    report()
     save_doc_hashes(new_hashes)
     
-    return len(all_chunks)
+    return {"added": counts["added"], "kept": counts["kept"], "removed": len(stale_ids)}
 
 
 def retrieve(query: str, n_results: int = 3) -> List[Tuple[str, str, float]]:
@@ -189,75 +714,228 @@ def retrieve(query: str, n_results: int = 3) -> List[Tuple[str, str, float]]:
     Returns:
         List of (chunk_text, source_doc, relevance_score) tuples
     """
+    return retrieve_many([query], n_results)[0]
+
+
+def retrieve_many(queries: List[str], n_results: int = 3) -> List[List[Tuple[str, str, float]]]:
+    """
+    Retrieve the most relevant chunks for several queries at once.
+    
+    All queries are embedded in one batched encode and searched in one
+    multi-query call, instead of one of each per query.
+    
+    Args:
+        queries: User input texts
+        n_results: Number of chunks to retrieve per query
+    
+    Returns:
+        One list of (chunk_text, source_doc, relevance_score) tuples per query
+    """
+    if not queries:
+        return []
+    
+    # Let an in-flight warm-up finish rather than starting a second load
+    wait_until_ready()
+    
     collection = get_collection()
-    model = get_embedding_model()
     
     # Ensure knowledge base is indexed
     if collection.count() == 0:
         index_knowledge_base()
     
-    # Embed the query
-    query_embedding = model.encode([query]).tolist()
+    # Embed the queries
+    query_embeddings = embed_queries(queries)
     
     # Search
     results = collection.query(
-        query_embeddings=query_embedding,
+        query_embeddings=[embedding.tolist() for embedding in query_embeddings],
         n_results=n_results,
         include=["documents", "metadatas", "distances"]
     )
     
     # Format results
-    retrieved = []
-    for doc, metadata, distance in zip(
-        results['documents'][0],
-        results['metadatas'][0],
-        results['distances'][0]
-    ):
-        # Convert distance to similarity (cosine distance → similarity)
-        similarity = 1 - distance
-        retrieved.append((doc, metadata['source'], similarity))
+    all_retrieved = []
+    for documents, metadatas, distances in zip(results['documents'], results['metadatas'], results['distances']):
+        retrieved = []
+        for doc, metadata, distance in zip(documents, metadatas, distances):
+            # Convert distance to similarity (cosine distance → similarity)
+            similarity = 1 - distance
+            retrieved.append((doc, metadata['source'], similarity))
+        all_retrieved.append(retrieved)
     
-    return retrieved
+    return all_retrieved
 
 
-def build_context(query: str, n_results: int = 3) -> Tuple[str, List[str]]:
+def _shingles(words: List[str]) -> List[tuple]:
+    """Word trigrams, the unit overlap is measured in."""
+    return [tuple(words[i:i + 3]) for i in range(max(len(words) - 2, 1))]
+
+
+def remove_overlap(chunk: str, seen: set) -> str:
     """
-    Build context string from retrieved chunks.
+    Drop text already covered by seen trigrams from either end of chunk.
+    
+    Chunks of a long section repeat the previous chunk's last few words
+    (iter_chunks' overlap); this trims that repetition while keeping the
+    chunk's formatting and its heading line. Returns "" if the chunk is a
+    near-duplicate of what's been seen.
+    """
+    # Every document shares headings like "## Core Fear"; only the body counts
+    heading, _, body = chunk.partition("\n")
+    if not HEADING_RE.match(heading):
+        heading, body = "", chunk
+    
+    spans = [m.span() for m in re.finditer(r"\S+", body)]
+    words = [body[a:b].lower() for a, b in spans]
+    shingles = _shingles(words)
+    covered = [shingle in seen for shingle in shingles]
+    if not words or sum(covered) >= DUPLICATE_THRESHOLD * len(covered):
+        return ""
+    
+    # Leading and trailing runs of covered trigrams: those words were all
+    # packed already. Runs under three trigrams are common phrases, not overlap.
+    head = next((i for i, c in enumerate(covered) if not c), len(covered))
+    tail = next((i for i, c in enumerate(reversed(covered)) if not c), len(covered))
+    head = head if head >= 3 else 0
+    tail = tail if tail >= 3 else 0
+    first_word = head + 2 if head else 0
+    last_word = len(words) - tail - 2 if tail else len(words)
+    if first_word >= last_word:
+        return ""
+    
+    trimmed = body[spans[first_word][0]:spans[last_word - 1][1]]
+    if trimmed == body.strip():
+        return chunk
+    return f"{heading}\n{trimmed}" if heading else trimmed
+
+
+def pack_context(retrieved: List[Tuple[str, str, float]], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 max_chunks: int = None, threshold: float = RELEVANCE_THRESHOLD) -> Tuple[str, List[str], dict]:
+    """
+    Pack the best retrieved chunks into a context string within a token budget.
+    
+    Candidates are taken best-first. Ones not above threshold or
+    repeating already-packed text are skipped, partial overlaps are trimmed,
+    and any that would overflow the budget are passed over for smaller ones.
     
     Args:
-        query: User's input text
-        n_results: Number of chunks to retrieve
+        retrieved: (chunk_text, source_doc, relevance_score) tuples from retrieve()
+        token_budget: Most tokens the context may use
+        max_chunks: Optional cap on chunks packed
+        threshold: Relevance a chunk must exceed to be packed
     
     Returns:
-        (context_string, list_of_sources)
+        (context_string, list_of_sources, stats) where stats counts candidates,
+        relevant, duplicates, trimmed, over_budget and packed chunks, and tokens
     """
-    retrieved = retrieve(query, n_results)
-    
-    if not retrieved:
-        return "", []
+    stats = {"candidates": len(retrieved), "relevant": 0, "duplicates": 0, "trimmed": 0,
+             "over_budget": 0, "packed": 0, "tokens": 0, "budget": token_budget}
+    separator_tokens = estimator.count_tokens(CONTEXT_SEPARATOR)
     
     context_parts = []
     sources = []
+    seen = set()
     
-    for chunk, source, score in retrieved:
-        # Only include if relevance is above threshold
-        if score > 0.3:
-            context_parts.append(f"[From: {source}]\n{chunk}")
-            if source not in sources:
-                sources.append(source)
+    for chunk, source, score in sorted(retrieved, key=lambda r: r[2], reverse=True):
+        if score <= threshold:
+            continue
+        stats["relevant"] += 1
+        if max_chunks is not None and len(context_parts) >= max_chunks:
+            break
+        
+        text = remove_overlap(chunk, seen)
+        if not text:
+            stats["duplicates"] += 1
+            continue
+        if text != chunk:
+            stats["trimmed"] += 1
+        
+        part = f"[From: {source}]\n{text}"
+        tokens = estimator.count_tokens(part) + (separator_tokens if context_parts else 0)
+        if stats["tokens"] + tokens > token_budget:
+            stats["over_budget"] += 1
+            continue
+        
+        context_parts.append(part)
+        stats["tokens"] += tokens
+        seen.update(_shingles(re.findall(r"\S+", text.lower())))
+        if source not in sources:
+            sources.append(source)
+    
+    stats["packed"] = len(context_parts)
+    return CONTEXT_SEPARATOR.join(context_parts), sources, stats
+
+
+def build_context_with_stats(query: str, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                             n_results: int = None) -> Tuple[str, List[str], dict]:
+    """
+    Retrieve candidates for a query and pack them within token_budget.
+    
+    Args:
+        query: User's input text
+        token_budget: Most tokens the context may use
+        n_results: Optional cap on chunks in the context
     
-    context = "\n\n---\n\n".join(context_parts)
+    Returns:
+        (context_string, list_of_sources, stats) - see pack_context
+    """
+    n_candidates = max(CONTEXT_CANDIDATES, n_results or 0)
+    return pack_context(retrieve(query, n_candidates), token_budget, n_results)
+
+
+def build_context(query: str, n_results: int = None,
+                  token_budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[str, List[str]]:
+    """
+    Build context string from retrieved chunks.
+    
+    Args:
+        query: User's input text
+        n_results: Optional cap on chunks in the context
+        token_budget: Most tokens the context may use
+    
+    Returns:
+        (context_string, list_of_sources)
+    """
+    context, sources, _ = build_context_with_stats(query, token_budget, n_results)
     return context, sources
 
 
+def build_context_many(queries: List[str], n_results: int = None,
+                       token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[Tuple[str, List[str]]]:
+    """
+    Build context strings for several queries with one batched retrieval.
+    
+    Args:
+        queries: User input texts
+        n_results: Optional cap on chunks per context
+        token_budget: Most tokens each context may use
+    
+    Returns:
+        One (context_string, list_of_sources) per query, as build_context returns
+    """
+    n_candidates = max(CONTEXT_CANDIDATES, n_results or 0)
+    contexts = []
+    for retrieved in retrieve_many(queries, n_candidates):
+        context, sources, _ = pack_context(retrieved, token_budget, n_results)
+        contexts.append((context, sources))
+    return contexts
+
+
 # CLI for testing
 if __name__ == "__main__":
     import sys
     
     if len(sys.argv) > 1 and sys.argv[1] == "index":
         print("Indexing knowledge base...")
-        n = index_knowledge_base(force=True)
-        print(f"Indexed {n} chunks")
+        processes = int(sys.argv[sys.argv.index("--processes") + 1]) if "--processes" in sys.argv else 1
+        
+        def show_progress(p):
+            print(f"\r  {p['files_done']}/{p['files_total']} files · {p['added']} added · {p['kept']} kept",
+                  end="", flush=True)
+        
+        counts = index_knowledge_base(force="--force" in sys.argv, processes=processes, progress=show_progress)
+        print()
+        print(f"Added {counts['added']} chunks, kept {counts['kept']}, removed {counts['removed']}")
     
     elif len(sys.argv) > 1 and sys.argv[1] == "search":
         query = " ".join(sys.argv[2:]) if len(sys.argv) > 2 else "I feel like a failure after rejection"
@@ -269,7 +947,21 @@ if __name__ == "__main__":
             print(chunk[:300] + "..." if len(chunk) > 300 else chunk)
             print()
     
+    elif len(sys.argv) > 1 and sys.argv[1] == "context":
+        query = " ".join(sys.argv[2:]) if len(sys.argv) > 2 else "I feel like a failure after rejection"
+        context, sources, stats = build_context_with_stats(query)
+        print(context)
+        print(f"\n{stats['tokens']}/{stats['budget']} tokens · {stats['packed']} of {stats['candidates']} candidates packed "
+              f"({stats['relevant']} relevant, {stats['duplicates']} duplicate, {stats['trimmed']} trimmed, "
+              f"{stats['over_budget']} over budget)")
+    
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        from rag_bench import main
+        main(sys.argv[2:])
+    
     else:
         print("Usage:")
-        print("  python rag.py index          # Index knowledge base")
+        print("  python rag.py index          # Index new/changed chunks (--force re-embeds all, --processes N)")
         print("  python rag.py search <query> # Search for relevant chunks")
+        print("  python rag.py context <query> # Packed context and its token count")
+        print("  python rag.py bench [opts]   # Benchmark scaling (see --help)")
@@ -0,0 +1,280 @@
+"""
+Sage RAG Benchmark
+Measures how chunking, embedding, indexing and retrieval scale with corpus size,
+using synthetic documents built from the knowledge base's own vocabulary.
+
+Run with: python rag.py bench [--sizes 10 100 1000] [--queries 100] [--stores chroma numpy]
+"""
+
+import json
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+import rag
+from bench_utils import STORES, open_store, peak_rss_mb, percentile
+
+DEFAULT_SIZES = [10, 100, 1_000, 10_000, 100_000]
+DEFAULT_N_RESULTS = [1, 3, 5, 10]
+DEFAULT_QUERIES = 100
+DEFAULT_STORES = ["chroma"]
+EMBED_BATCH_SIZE = 64
+ADD_BATCH_SIZE = 5_000  # Under Chroma's per-call cap
+RESULTS_DIR = Path.home() / ".sage_evals"
+
+
+def load_vocabulary() -> List[str]:
+    """Words from the knowledge base, with their natural frequencies."""
+    words = []
+    for filepath in rag.list_knowledge_files():
+        words.extend(re.findall(r"[A-Za-z']+", filepath.read_text()))
+    return words or ["saboteur", "pattern", "reframe", "product", "manager"]
+
+
+def generate_document(rng: random.Random, vocabulary: List[str], paragraphs: int = 12) -> str:
+    """A markdown document of headed sections and paragraphs of 30-90 words."""
+    parts = [f"# {' '.join(rng.choices(vocabulary, k=3)).title()}"]
+    for i in range(paragraphs):
+        if i % 4 == 0:
+            parts.append(f"## {' '.join(rng.choices(vocabulary, k=4)).title()}")
+        parts.append(" ".join(rng.choices(vocabulary, k=rng.randint(30, 90))) + ".")
+    return "\n\n".join(parts)
+
+
+def generate_corpus(n_chunks: int, seed: int = 0) -> List[str]:
+    """Enough synthetic documents that chunk_document yields at least n_chunks."""
+    rng = random.Random(seed)
+    vocabulary = load_vocabulary()
+    documents = []
+    total = 0
+    while total < n_chunks:
+        document = generate_document(rng, vocabulary)
+        documents.append(document)
+        total += len(rag.chunk_document(document))
+    return documents
+
+
+def generate_queries(n: int, seed: int = 1) -> List[str]:
+    """Distinct journal-length queries, so every retrieve misses the query cache."""
+    rng = random.Random(seed)
+    vocabulary = load_vocabulary()
+    return [f"{i}: " + " ".join(rng.choices(vocabulary, k=rng.randint(12, 40))) for i in range(n)]
+
+
+def dir_size(path: Path) -> int:
+    """Total bytes of all files under path."""
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+@contextmanager
+def use_collection(collection):
+    """Point rag.retrieve at a benchmark collection, restoring the real one afterwards."""
+    previous = rag._collection
+    rag._collection = collection
+    try:
+        yield
+    finally:
+        rag._collection = previous
+
+
+# Runs in a fresh interpreter so imports and file opens are genuinely cold
+COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import bench_utils
+collection = bench_utils.open_store(sys.argv[1], sys.argv[2])
+opened = time.perf_counter()
+collection.query(query_embeddings=[json.loads(sys.argv[3])], n_results=3)
+done = time.perf_counter()
+print(json.dumps({
+    "open_seconds": opened - start,
+    "first_query_seconds": done - opened,
+    "peak_rss_mb": bench_utils.peak_rss_mb(),
+}))
+"""
+
+
+def measure_cold_start(store: str, path: Path, query_embedding: list) -> dict:
+    """Import, open and first-query time plus peak RSS of a fresh process using the store."""
+    output = subprocess.run(
+        [sys.executable, "-c", COLD_START_SCRIPT, store, str(path), json.dumps(query_embedding)],
+        cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_store(store: str, chunks: List[str], embeddings: list, n_documents: int,
+                queries: List[str], n_results_list: List[int], n_queries: int) -> dict:
+    """
+    Build one store from precomputed embeddings and measure it.
+    
+    Returns:
+        Dict of add time, disk size, cold start and query latency measurements
+    """
+    bench_dir = Path(tempfile.mkdtemp(prefix=f"sage_rag_bench_{store}_"))
+    try:
+        collection = open_store(store, bench_dir)
+        
+        # Index build
+        start = time.perf_counter()
+        for i in range(0, len(chunks), ADD_BATCH_SIZE):
+            collection.add(
+                ids=[f"chunk_{j}" for j in range(i, min(i + ADD_BATCH_SIZE, len(chunks)))],
+                embeddings=embeddings[i:i + ADD_BATCH_SIZE],
+                documents=chunks[i:i + ADD_BATCH_SIZE],
+                metadatas=[{"source": f"doc_{j % n_documents}"} for j in range(i, min(i + ADD_BATCH_SIZE, len(chunks)))]
+            )
+        add_seconds = time.perf_counter() - start
+        disk_bytes = dir_size(bench_dir)
+        
+        cold_start = measure_cold_start(store, bench_dir, embeddings[0])
+        
+        # Query latency through rag.retrieve (embed + search), fresh queries each time
+        query_latency = {}
+        with use_collection(collection):
+            rag.retrieve(queries[0], n_results=1)  # Untimed: first query pays one-off setup
+            for k, n_results in enumerate(n_results_list):
+                latencies = []
+                for query in queries[k * n_queries:(k + 1) * n_queries]:
+                    start = time.perf_counter()
+                    rag.retrieve(query, n_results=n_results)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                query_latency[str(n_results)] = {
+                    "p50_ms": percentile(latencies, 50),
+                    "p95_ms": percentile(latencies, 95),
+                    "p99_ms": percentile(latencies, 99),
+                    "mean_ms": statistics.mean(latencies),
+                }
+    finally:
+        shutil.rmtree(bench_dir, ignore_errors=True)
+    
+    return {
+        "add_seconds": add_seconds,
+        "disk_bytes": disk_bytes,
+        "cold_start": cold_start,
+        "query_latency": query_latency,
+    }
+
+
+def bench_size(n_chunks: int, n_results_list: List[int], n_queries: int, seed: int = 0,
+               stores: List[str] = None) -> dict:
+    """
+    Benchmark one corpus size, embedding it once and building each store from it.
+    
+    Returns:
+        Dict of chunking and embedding measurements, plus bench_store results per store
+    """
+    model = rag.get_embedding_model()
+    documents = generate_corpus(n_chunks, seed)
+    total_chars = sum(len(d) for d in documents)
+    
+    # Chunking
+    start = time.perf_counter()
+    chunks = [chunk for document in documents for chunk in rag.chunk_document(document)]
+    chunk_seconds = time.perf_counter() - start
+    chunks = chunks[:n_chunks]
+    
+    # Embedding
+    start = time.perf_counter()
+    embeddings = model.encode(chunks, batch_size=EMBED_BATCH_SIZE).tolist()
+    embed_seconds = time.perf_counter() - start
+    
+    queries = generate_queries(n_queries * len(n_results_list), seed + 1)
+    
+    return {
+        "chunks": len(chunks),
+        "documents": len(documents),
+        "corpus_chars": total_chars,
+        "chunk_seconds": chunk_seconds,
+        "chunk_chars_per_second": total_chars / chunk_seconds if chunk_seconds else None,
+        "embed_seconds": embed_seconds,
+        "embed_chunks_per_second": len(chunks) / embed_seconds if embed_seconds else None,
+        "stores": {
+            store: bench_store(store, chunks, embeddings, len(documents), queries, n_results_list, n_queries)
+            for store in stores or DEFAULT_STORES
+        },
+    }
+
+
+def run_benchmark(sizes: List[int] = None, n_results_list: List[int] = None,
+                  n_queries: int = DEFAULT_QUERIES, seed: int = 0, stores: List[str] = None) -> dict:
+    """Benchmark each corpus size in turn, printing a summary line per size and store."""
+    sizes = sizes or DEFAULT_SIZES
+    n_results_list = n_results_list or DEFAULT_N_RESULTS
+    stores = stores or DEFAULT_STORES
+    
+    chromadb_version = None
+    if "chroma" in stores:
+        import chromadb
+        chromadb_version = chromadb.__version__
+    
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "embedding_model": rag.EMBEDDING_MODEL_NAME,
+        "encoder": rag.ENCODER_ID,
+        "chromadb_version": chromadb_version,
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "n_queries": n_queries,
+        "seed": seed,
+        "stores": stores,
+        "sizes": {}
+    }
+    
+    for n_chunks in sizes:
+        print(f"📏 {n_chunks:,} chunks...", end=" ", flush=True)
+        size_results = bench_size(n_chunks, n_results_list, n_queries, seed, stores)
+        results["sizes"][str(n_chunks)] = size_results
+        print(f"embed {size_results['embed_chunks_per_second']:,.0f} chunks/s")
+        for store, store_results in size_results["stores"].items():
+            latency = store_results["query_latency"][str(n_results_list[0])]
+            cold_start = store_results["cold_start"]
+            print(f"   {store:<14} build {size_results['embed_seconds'] + store_results['add_seconds']:.1f}s · "
+                  f"{store_results['disk_bytes'] / 1e6:.1f} MB · "
+                  f"cold start {cold_start['open_seconds'] + cold_start['first_query_seconds']:.2f}s "
+                  f"({cold_start['peak_rss_mb']:.0f} MB RSS) · "
+                  f"retrieve p50 {latency['p50_ms']:.1f}ms p99 {latency['p99_ms']:.1f}ms "
+                  f"(n_results={n_results_list[0]})")
+    
+    return results
+
+
+def main(argv: List[str] = None):
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="python rag.py bench", description="Benchmark RAG scaling")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Corpus sizes in chunks")
+    parser.add_argument("--n-results", type=int, nargs="+", default=DEFAULT_N_RESULTS,
+                        help="n_results values to measure retrieve latency at")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="Queries per n_results value")
+    parser.add_argument("--stores", nargs="+", choices=STORES, default=DEFAULT_STORES,
+                        help="Vector stores to compare")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results path (default: ~/.sage_evals/rag_bench_<timestamp>.json)")
+    
+    args = parser.parse_args(argv)
+    
+    results = run_benchmark(args.sizes, args.n_results, args.queries, args.seed, args.stores)
+    
+    if args.output:
+        filepath = Path(args.output)
+    else:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        filepath = RESULTS_DIR / f"rag_bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    filepath.write_text(json.dumps(results, indent=2))
+    print(f"\n📁 Results saved to: {filepath}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
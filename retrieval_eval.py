@@ -0,0 +1,270 @@
+"""
+Sage Retrieval Eval
+Scores retrieval on its own against the golden dataset: for each labeled
+entry, does the context the app would send include knowledge/<primary_saboteur>.md,
+and how high? No LLM calls, so a full sweep runs in seconds.
+
+Each configuration is built and queried through rag itself: the knowledge
+base is indexed with index_knowledge_base, candidates come from retrieve and
+the context from pack_context, so scores reflect exactly what reaches the
+prompt. Sweeps encoder x chunk size x candidates retrieved x relevance
+threshold x token budget, reports recall, MRR, context tokens and per-query
+latency for each, and prints the ones on the quality/cost Pareto frontier.
+
+Run with: python retrieval_eval.py [--encoders onnx] [--chunk-sizes 80 160 320]
+          [--n-results 3 5 10] [--thresholds 0 0.3 0.5] [--budgets 200 350 600]
+"""
+
+import json
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Tuple
+
+import bench_utils
+import encoders
+import rag
+import rag_bench
+from golden_dataset import GOLDEN_DATASET
+
+DEFAULT_CHUNK_SIZES = [80, rag.CHUNK_MAX_TOKENS, 320]
+DEFAULT_N_RESULTS = [3, 5, rag.CONTEXT_CANDIDATES]
+DEFAULT_THRESHOLDS = [0.0, rag.RELEVANCE_THRESHOLD, 0.5]
+DEFAULT_BUDGETS = [200, rag.CONTEXT_TOKEN_BUDGET, 600]
+
+# Higher is better for quality, lower for cost
+QUALITY_METRICS = ["recall", "mrr"]
+COST_METRICS = ["p50_ms", "context_tokens"]
+
+# rag globals a temporary index replaces while it's in use
+PATCHED = ["_collection", "_embedding_model", "ENCODER_ID", "CACHE_FILE", "QUERY_CACHE_ON_DISK", "QUERY_CACHE_DIR"]
+
+
+def labeled_cases() -> List[Tuple[str, str]]:
+    """(journal text, expected document stem) for every entry with a primary saboteur."""
+    return [(entry["text"], entry["primary_saboteur"]) for entry in GOLDEN_DATASET if entry["primary_saboteur"]]
+
+
+@contextmanager
+def use_index(encoder_name: str, encoder, store: str, path: Path):
+    """
+    Point rag's indexing and retrieval at a temporary index in path.
+    
+    The collection, hash file and query cache all live in path, so the real
+    index and the on-disk query cache are never touched.
+    """
+    saved = {name: getattr(rag, name) for name in PATCHED}
+    rag._collection = bench_utils.open_store(store, path / "collection")
+    rag._embedding_model = encoder
+    rag.ENCODER_ID = encoders.encoder_id(encoder_name, rag.EMBEDDING_MODEL_NAME)
+    rag.CACHE_FILE = path / "doc_hashes.json"
+    rag.QUERY_CACHE_ON_DISK = False
+    rag.QUERY_CACHE_DIR = path / "query_embeddings"
+    rag.clear_query_cache()
+    try:
+        yield
+    finally:
+        rag.clear_query_cache()
+        for name, value in saved.items():
+            setattr(rag, name, value)
+
+
+def retrieve_cases(cases: List[Tuple[str, str]], n_results_list: List[int]) -> dict:
+    """
+    Run rag.retrieve for every case at every n_results, one query at a time
+    as the app does, with the query embedding cache emptied before each.
+    
+    Returns:
+        Dict of n_results -> list per case of (retrieved, latency_ms), where
+        latency covers the query embed plus search
+    """
+    rag.retrieve("warm up", n_results=1)  # Untimed: the first query pays one-off setup
+    
+    searches = {n_results: [] for n_results in n_results_list}
+    for text, _ in cases:
+        for n_results in n_results_list:
+            rag.clear_query_cache()
+            start = time.perf_counter()
+            retrieved = rag.retrieve(text, n_results=n_results)
+            searches[n_results].append((retrieved, (time.perf_counter() - start) * 1000))
+    return searches
+
+
+def score(searches: List[Tuple[list, float]], cases: List[Tuple[str, str]],
+          threshold: float, token_budget: int) -> dict:
+    """
+    Quality and cost of the contexts pack_context builds from searches.
+    
+    A case's reciprocal rank is 1 / the position of the expected document
+    among the context's sources, which are in best-first order.
+    
+    Returns:
+        Dict of recall (share of cases whose document is in the context), mrr,
+        no_context (share with an empty context), mean context_tokens and
+        per-query latency percentiles of retrieve plus packing
+    """
+    hits, reciprocal_ranks, empty, tokens, latencies = 0, [], 0, [], []
+    for (retrieved, retrieve_ms), (_, expected) in zip(searches, cases):
+        start = time.perf_counter()
+        _, sources, stats = rag.pack_context(retrieved, token_budget, threshold=threshold)
+        latencies.append(retrieve_ms + (time.perf_counter() - start) * 1000)
+        
+        documents = [Path(source).name for source in sources]
+        if expected in documents:
+            hits += 1
+            reciprocal_ranks.append(1 / (documents.index(expected) + 1))
+        else:
+            reciprocal_ranks.append(0.0)
+        empty += not sources
+        tokens.append(stats["tokens"])
+    
+    return {
+        "recall": hits / len(cases),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "no_context": empty / len(cases),
+        "context_tokens": statistics.mean(tokens),
+        "p50_ms": bench_utils.percentile(latencies, 50),
+        "p95_ms": bench_utils.percentile(latencies, 95),
+    }
+
+
+def pareto_frontier(rows: List[dict]) -> List[dict]:
+    """Rows no other row matches or beats on every quality and cost metric and beats on one."""
+    def dominates(a: dict, b: dict) -> bool:
+        no_worse = (all(a[m] >= b[m] for m in QUALITY_METRICS) and all(a[m] <= b[m] for m in COST_METRICS))
+        better = (any(a[m] > b[m] for m in QUALITY_METRICS) or any(a[m] < b[m] for m in COST_METRICS))
+        return no_worse and better
+    
+    return [row for row in rows if not any(dominates(other, row) for other in rows)]
+
+
+def is_current(row: dict) -> bool:
+    """Whether row is the configuration the app currently builds context with."""
+    return (row["encoder"] == rag.EMBEDDING_ENCODER and row["chunk_tokens"] == rag.CHUNK_MAX_TOKENS
+            and row["n_results"] == rag.CONTEXT_CANDIDATES and row["threshold"] == rag.RELEVANCE_THRESHOLD
+            and row["token_budget"] == rag.CONTEXT_TOKEN_BUDGET)
+
+
+def run_sweep(encoder_names: List[str] = None, chunk_sizes: List[int] = None, n_results_list: List[int] = None,
+              thresholds: List[float] = None, budgets: List[int] = None, store: str = None) -> dict:
+    """Evaluate every configuration, printing a line per index built."""
+    encoder_names = encoder_names or [rag.EMBEDDING_ENCODER]
+    chunk_sizes = chunk_sizes or DEFAULT_CHUNK_SIZES
+    n_results_list = n_results_list or DEFAULT_N_RESULTS
+    thresholds = thresholds if thresholds is not None else DEFAULT_THRESHOLDS
+    budgets = budgets or DEFAULT_BUDGETS
+    store = store or rag.VECTOR_STORE
+    cases = labeled_cases()
+    
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "embedding_model": rag.EMBEDDING_MODEL_NAME,
+        "store": store,
+        "n_cases": len(cases),
+        "indexes": {},
+        "configs": [],
+    }
+    
+    for encoder_name in encoder_names:
+        try:
+            encoder = encoders.create_encoder(encoder_name, rag.EMBEDDING_MODEL_NAME)
+        except Exception as e:
+            print(f"🧮 {encoder_name}... ❌ {type(e).__name__}: {e}")
+            results["indexes"][encoder_name] = {"error": str(e)}
+            continue
+        
+        for chunk_tokens in chunk_sizes:
+            print(f"🧮 {encoder_name} · {chunk_tokens}-token chunks...", end=" ", flush=True)
+            index_dir = Path(tempfile.mkdtemp(prefix="sage_retrieval_eval_"))
+            try:
+                with use_index(encoder_name, encoder, store, index_dir):
+                    start = time.perf_counter()
+                    counts = rag.index_knowledge_base(
+                        max_tokens=chunk_tokens, overlap_tokens=min(rag.CHUNK_OVERLAP_TOKENS, chunk_tokens // 4)
+                    )
+                    build_seconds = time.perf_counter() - start
+                    searches = retrieve_cases(cases, n_results_list)
+            finally:
+                shutil.rmtree(index_dir, ignore_errors=True)
+            results["indexes"][f"{encoder_name}/{chunk_tokens}"] = {"chunks": counts["added"],
+                                                                    "build_seconds": build_seconds}
+            print(f"{counts['added']} chunks in {build_seconds:.1f}s")
+            
+            for n_results in n_results_list:
+                for threshold in thresholds:
+                    for token_budget in budgets:
+                        results["configs"].append({
+                            "encoder": encoder_name,
+                            "chunk_tokens": chunk_tokens,
+                            "n_results": n_results,
+                            "threshold": threshold,
+                            "token_budget": token_budget,
+                            **score(searches[n_results], cases, threshold, token_budget),
+                        })
+    
+    results["frontier"] = pareto_frontier(results["configs"])
+    return results
+
+
+def format_row(row: dict) -> str:
+    marker = "*" if is_current(row) else " "
+    return (f"{marker} {row['encoder']:<22} {row['chunk_tokens']:>6} {row['n_results']:>3} {row['threshold']:>5.2f} "
+            f"{row['token_budget']:>6} {row['recall']:>7.0%} {row['mrr']:>6.3f} {row['no_context']:>6.0%} "
+            f"{row['context_tokens']:>7.0f} {row['p50_ms']:>7.1f} {row['p95_ms']:>7.1f}")
+
+
+def print_frontier(results: dict):
+    """Print the Pareto-optimal configurations, best recall first, and where the current one stands."""
+    header = (f"  {'encoder':<22} {'chunk':>6} {'k':>3} {'thr':>5} {'budget':>6} {'recall':>7} {'mrr':>6} "
+              f"{'empty':>6} {'tokens':>7} {'p50 ms':>7} {'p95 ms':>7}")
+    frontier = sorted(results["frontier"], key=lambda row: (-row["recall"], -row["mrr"], row["p50_ms"]))
+    
+    print(f"\n📈 Pareto frontier: {len(frontier)} of {len(results['configs'])} configurations "
+          f"({results['n_cases']} golden cases, recall · MRR vs latency · context tokens)")
+    print(header)
+    for row in frontier:
+        print(format_row(row))
+    
+    current = [row for row in results["configs"] if is_current(row)]
+    if current and current[0] not in frontier:
+        print("  Current configuration (dominated):")
+        print(format_row(current[0]))
+
+
+def main(argv: List[str] = None):
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="python retrieval_eval.py",
+                                     description="Retrieval recall, MRR and latency on the golden dataset")
+    parser.add_argument("--encoders", nargs="+", choices=encoders.ENCODERS, default=[rag.EMBEDDING_ENCODER])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=DEFAULT_CHUNK_SIZES,
+                        help="Chunk max tokens to index with")
+    parser.add_argument("--n-results", type=int, nargs="+", default=DEFAULT_N_RESULTS,
+                        help="Candidate chunks retrieved before packing (k)")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=DEFAULT_THRESHOLDS,
+                        help="Relevance a chunk must exceed to be packed")
+    parser.add_argument("--budgets", type=int, nargs="+", default=DEFAULT_BUDGETS, help="Context token budgets")
+    parser.add_argument("--store", choices=bench_utils.STORES, default=rag.VECTOR_STORE)
+    parser.add_argument("--output", help="JSON results path (default: ~/.sage_evals/retrieval_eval_<timestamp>.json)")
+    
+    args = parser.parse_args(argv)
+    
+    results = run_sweep(args.encoders, args.chunk_sizes, args.n_results, args.thresholds, args.budgets, args.store)
+    print_frontier(results)
+    
+    if args.output:
+        filepath = Path(args.output)
+    else:
+        rag_bench.RESULTS_DIR.mkdir(exist_ok=True)
+        filepath = rag_bench.RESULTS_DIR / f"retrieval_eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    filepath.write_text(json.dumps(results, indent=2))
+    print(f"\n📁 Results saved to: {filepath}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
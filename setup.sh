@@ -23,7 +23,7 @@ echo "✅ Python found"
 
 # Install Python dependencies
 echo "📦 Installing Python dependencies..."
-pip3 install streamlit anthropic requests sentence-transformers chromadb --quiet
+pip3 install streamlit anthropic requests sentence-transformers chromadb numpy tiktoken --quiet
 if [ $? -eq 0 ]; then
     echo "✅ Python dependencies installed"
 else
@@ -34,7 +34,7 @@ fi
 # Build RAG index
 echo "🔍 Building knowledge base index..."
 cd "$(dirname "$0")"
-python3 -c "from rag import index_knowledge_base; n = index_knowledge_base(force=True); print(f'✅ Indexed {n} chunks')" 2>/dev/null
+python3 -c "from rag import index_knowledge_base; n = index_knowledge_base(); print(f'✅ Indexed {n[\"added\"]} new chunks ({n[\"kept\"]} unchanged, {n[\"removed\"]} removed)')" 2>/dev/null
 if [ $? -ne 0 ]; then
     echo "⚠️  RAG index build skipped (will build on first use)"
 fi
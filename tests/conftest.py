@@ -0,0 +1,58 @@
+"""
+Shared fixtures. LLM and embedding calls go to the offline mock server
+(mock_llm.py), and HOME points at a scratch directory so importing app or
+rag never touches real caches, indexes or logs.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["HOME"] = tempfile.mkdtemp(prefix="sage_tests_home_")
+
+
+@pytest.fixture(scope="session")
+def mock_llm_url():
+    """Base URL of a mock LLM server that answers instantly."""
+    from mock_llm import LatencyProfile, start_mock_server
+    server, url = start_mock_server(LatencyProfile(ttft=0.0, tokens_per_second=0.0))
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture
+def mock_encoder(mock_llm_url):
+    """Ollama encoder backed by the mock server's /api/embed."""
+    from encoders import OllamaEncoder
+    return OllamaEncoder(host=mock_llm_url)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, mock_llm_url):
+    """The app module with a fresh cache database, calling the mock server."""
+    import app as app_module
+    monkeypatch.setattr(app_module, "CACHE_DB", tmp_path / "cache.db")
+    monkeypatch.setattr(app_module, "ANTHROPIC_BASE_URL", mock_llm_url)
+    monkeypatch.setattr(app_module, "OLLAMA_HOST", mock_llm_url)
+    app_module.init_cache_db.clear()
+    app_module.get_semantic_indexes.clear()
+    yield app_module
+    app_module.init_cache_db.clear()
+    app_module.get_semantic_indexes.clear()
+
+
+@pytest.fixture
+def mock_rag(monkeypatch, mock_encoder):
+    """rag embedding through the mock encoder, with an in-memory query cache only."""
+    import encoders
+    import rag
+    monkeypatch.setattr(rag, "_embedding_model", mock_encoder)
+    monkeypatch.setattr(rag, "ENCODER_ID", encoders.encoder_id("ollama", rag.EMBEDDING_MODEL_NAME))
+    monkeypatch.setattr(rag, "QUERY_CACHE_ON_DISK", False)
+    rag.clear_query_cache()
+    yield rag
+    rag.clear_query_cache()
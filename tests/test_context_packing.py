@@ -0,0 +1,105 @@
+"""Context packing: trigram de-duplication, overlap trimming, threshold and token budget."""
+
+import re
+
+import pytest
+
+import rag
+from vector_store import NumpyVectorStore
+
+SENTENCES = [
+    "The Parrot repeats every harsh thing you once heard about yourself.",
+    "It speaks in absolutes like always and never and sounds like the truth.",
+    "Notice the voice and ask whose words these really are before acting.",
+    "A friend would describe the same missed deadline very differently.",
+]
+
+
+def seen_from(text: str) -> set:
+    return set(rag._shingles(re.findall(r"\S+", text.lower())))
+
+
+def test_unseen_chunk_is_kept_whole():
+    chunk = "## Voice\n" + " ".join(SENTENCES[:2])
+    assert rag.remove_overlap(chunk, set()) == chunk
+
+
+def test_leading_overlap_is_trimmed_and_heading_kept():
+    previous = " ".join(SENTENCES[:2])
+    chunk = "## Voice\n" + " ".join(SENTENCES[1:3])
+    assert rag.remove_overlap(chunk, seen_from(previous)) == "## Voice\n" + SENTENCES[2]
+
+
+def test_trailing_overlap_is_trimmed():
+    later = " ".join(SENTENCES[2:4])
+    chunk = " ".join(SENTENCES[1:3])
+    assert rag.remove_overlap(chunk, seen_from(later)) == SENTENCES[1]
+
+
+def test_short_shared_phrase_is_not_overlap():
+    # Two trigrams ("the parrot repeats", "parrot repeats every") are a phrase, not a repeated chunk
+    chunk = "The Parrot repeats every word " + SENTENCES[3]
+    assert rag.remove_overlap(chunk, seen_from(SENTENCES[0])) == chunk
+
+
+def test_shared_heading_does_not_make_a_duplicate():
+    first = "## Core Fear\n" + SENTENCES[0]
+    second = "## Core Fear\n" + SENTENCES[3]
+    assert rag.remove_overlap(second, seen_from(first)) == second
+
+
+def test_near_duplicate_is_dropped():
+    chunk = " ".join(SENTENCES[:3])
+    assert rag.remove_overlap(chunk + " Really.", seen_from(chunk)) == ""
+
+
+def test_pack_context_skips_irrelevant_duplicates_and_overflow():
+    retrieved = [
+        (SENTENCES[0], "parrot.md", 0.9),
+        (SENTENCES[0], "parrot_copy.md", 0.8),
+        (" ".join(SENTENCES) * 10, "long.md", 0.7),
+        (SENTENCES[2], "octopus.md", 0.6),
+        (SENTENCES[3], "rabbit.md", rag.RELEVANCE_THRESHOLD),
+    ]
+    context, sources, stats = rag.pack_context(retrieved, token_budget=60)
+    
+    assert sources == ["parrot.md", "octopus.md"]
+    assert context == f"[From: parrot.md]\n{SENTENCES[0]}{rag.CONTEXT_SEPARATOR}[From: octopus.md]\n{SENTENCES[2]}"
+    assert stats["tokens"] <= stats["budget"] == 60
+    assert (stats["candidates"], stats["relevant"], stats["duplicates"], stats["over_budget"], stats["packed"]) == \
+        (5, 4, 1, 1, 2)
+
+
+def test_pack_context_takes_best_first_and_caps_chunks():
+    retrieved = [(SENTENCES[i], f"doc{i}.md", 0.4 + i / 10) for i in range(4)]
+    _, sources, stats = rag.pack_context(retrieved, token_budget=1000, max_chunks=2)
+    assert sources == ["doc3.md", "doc2.md"]
+    assert stats["packed"] == 2
+
+
+def test_nothing_relevant_packs_nothing():
+    context, sources, stats = rag.pack_context([(SENTENCES[0], "parrot.md", 0.1)], threshold=0.5)
+    assert (context, sources, stats["packed"], stats["tokens"]) == ("", [], 0, 0)
+
+
+@pytest.fixture
+def indexed(tmp_path, monkeypatch, mock_rag):
+    """rag over a scratch knowledge base whose chunks overlap, embedded through the mock server."""
+    knowledge = tmp_path / "knowledge"
+    knowledge.mkdir()
+    (knowledge / "parrot.md").write_text("# The Parrot\n\n## Voice\n\n" + " ".join(SENTENCES * 4))
+    monkeypatch.setattr(mock_rag, "KNOWLEDGE_DIR", knowledge)
+    monkeypatch.setattr(mock_rag, "CACHE_FILE", tmp_path / "doc_hashes.json")
+    monkeypatch.setattr(mock_rag, "_collection", NumpyVectorStore(tmp_path / "collection"))
+    mock_rag.index_knowledge_base(max_tokens=40, overlap_tokens=10)
+    return mock_rag
+
+
+def test_build_context_within_budget(indexed):
+    context, sources, stats = indexed.build_context_with_stats(SENTENCES[1], token_budget=120)
+    packed = indexed.pack_context(indexed.retrieve(SENTENCES[1], indexed.CONTEXT_CANDIDATES), 120)
+    
+    assert (context, sources, stats) == packed
+    assert sources == ["parrot"]
+    assert 0 < stats["tokens"] <= 120
+    assert stats["duplicates"] > 0  # The document repeats itself, so later chunks add nothing
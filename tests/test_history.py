@@ -0,0 +1,62 @@
+"""Conversation history compaction, summarizing through the mock server."""
+
+import pytest
+
+
+def conversation(exchanges: int) -> list:
+    history = []
+    for i in range(exchanges):
+        history.append({"role": "user", "content": f"Turn {i}: " + "I keep worrying about the roadmap review. " * 20})
+        history.append({"role": "assistant", "content": f"Reply {i}: " + "That sounds like the Octopus. " * 20})
+    return history
+
+
+@pytest.fixture
+def summaries(app, monkeypatch):
+    """Count summarize_history calls while still sending them to the mock server."""
+    calls = []
+    real = app.summarize_history
+    
+    def counting(api_key, messages, previous_summary=""):
+        calls.append(len(messages))
+        return real(api_key, messages, previous_summary)
+    
+    monkeypatch.setattr(app, "summarize_history", counting)
+    return calls
+
+
+def test_under_budget_is_sent_verbatim(app, summaries):
+    history = conversation(2)
+    messages, info = app.compact_history("mock-key", history, {}, budget=100_000)
+    assert messages == history
+    assert info["history_tokens_saved"] == 0
+    assert summaries == []
+
+
+def test_over_budget_summarizes_older_turns(app, summaries):
+    history = conversation(4)
+    messages, info = app.compact_history("mock-key", history, {}, budget=100, keep_recent=1)
+    assert summaries == [6]
+    assert messages[0]["content"].startswith("[Summary of our conversation so far]")
+    assert messages[2:] == history[-2:]
+    assert info["history_tokens_saved"] > 0
+    assert info["history_tokens"] == app.estimate_history_tokens(history)
+
+
+def test_keep_recent_zero_compacts_everything(app, summaries):
+    history = conversation(3)
+    messages, _ = app.compact_history("mock-key", history, {}, budget=100, keep_recent=0)
+    assert summaries == [6]
+    assert len(messages) == 2
+
+
+def test_summary_is_extended_not_redone(app, summaries):
+    state = {}
+    history = conversation(4)
+    app.compact_history("mock-key", history, state, budget=100, keep_recent=1)
+    app.compact_history("mock-key", history, state, budget=100, keep_recent=1)
+    assert summaries == [6]
+    
+    history += conversation(1)
+    app.compact_history("mock-key", history, state, budget=100, keep_recent=1)
+    assert summaries == [6, 2]
@@ -0,0 +1,132 @@
+"""Content-addressed re-indexing: only new or changed chunks are embedded, stale ones removed."""
+
+import pytest
+
+from vector_store import NumpyVectorStore
+
+SMALL_CHUNKS = {"max_tokens": 40, "overlap_tokens": 8}
+
+DOCUMENTS = {
+    "parrot.md": ("# The Parrot\n\n## Voice\n\n" + "The Parrot repeats every harsh thing you once heard. " * 6
+                  + "\n\n## Antidote\n\n" + "Name the voice and ask whose words these really are. " * 6),
+    "octopus.md": ("# The Octopus\n\n## Grip\n\n" + "The Octopus holds every task so nothing can slip. " * 6
+                   + "\n\n## Antidote\n\n" + "Pick one thing to hand over and let it land imperfectly. " * 6),
+    "teams/launch.md": "# Launch\n\n" + "A launch review is a chance to learn, not a verdict. " * 6,
+}
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch, mock_rag):
+    """rag indexing a scratch knowledge base into a numpy store, embedding through the mock server."""
+    knowledge = tmp_path / "knowledge"
+    for name, content in DOCUMENTS.items():
+        (knowledge / name).parent.mkdir(parents=True, exist_ok=True)
+        (knowledge / name).write_text(content)
+    
+    monkeypatch.setattr(mock_rag, "KNOWLEDGE_DIR", knowledge)
+    monkeypatch.setattr(mock_rag, "CACHE_FILE", tmp_path / "doc_hashes.json")
+    monkeypatch.setattr(mock_rag, "_collection", NumpyVectorStore(tmp_path / "collection"))
+    return knowledge
+
+
+def sources(rag) -> dict:
+    """Chunk count per source document in the collection."""
+    counts = {}
+    for metadata in rag.get_collection().get(include=["metadatas"])["metadatas"]:
+        counts[metadata["source"]] = counts.get(metadata["source"], 0) + 1
+    return counts
+
+
+def test_unchanged_knowledge_base_embeds_nothing(kb, mock_rag):
+    first = mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    assert first["added"] > 3 and first["removed"] == 0
+    assert set(sources(mock_rag)) == {"parrot", "octopus", "teams/launch"}
+    
+    second = mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    assert second == {"added": 0, "kept": first["added"], "removed": 0}
+
+
+def test_edit_reembeds_only_changed_chunks(kb, mock_rag):
+    first = mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    before = sources(mock_rag)
+    
+    parrot = kb / "parrot.md"
+    parrot.write_text(parrot.read_text().replace("whose words these really are", "what a friend would say"))
+    counts = mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    
+    assert 0 < counts["added"] < before["parrot"]
+    assert counts["removed"] == counts["added"]
+    assert counts["kept"] == first["added"] - counts["removed"]
+    assert sources(mock_rag) == before
+
+
+def test_deleted_document_is_removed(kb, mock_rag):
+    mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    before = sources(mock_rag)
+    
+    (kb / "teams" / "launch.md").unlink()
+    counts = mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    
+    assert counts["added"] == 0
+    assert counts["removed"] == before["teams/launch"]
+    assert "teams/launch" not in sources(mock_rag)
+
+
+def test_interrupted_sync_resumes_without_reembedding(kb, mock_rag, monkeypatch):
+    monkeypatch.setattr(mock_rag, "INDEX_BATCH_SIZE", 2)
+    collection = mock_rag.get_collection()
+    real_add = collection.add
+    calls = []
+    
+    def crash_on_second_batch(**kwargs):
+        calls.append(len(kwargs["ids"]))
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        real_add(**kwargs)
+    
+    monkeypatch.setattr(collection, "add", crash_on_second_batch)
+    with pytest.raises(KeyboardInterrupt):
+        mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    assert collection.count() == 2
+    
+    monkeypatch.setattr(collection, "add", real_add)
+    counts = mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    assert counts["kept"] == 2
+    assert counts["removed"] == 0
+    assert collection.count() == counts["added"] + 2
+
+
+def test_new_chunk_size_resyncs_every_document(kb, mock_rag):
+    mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    counts = mock_rag.index_knowledge_base(max_tokens=80, overlap_tokens=16)
+    
+    assert counts["added"] > 0 and counts["removed"] > 0
+    assert mock_rag.load_doc_hashes()["_chunking"].startswith("80/16")
+    assert mock_rag.index_knowledge_base(max_tokens=80, overlap_tokens=16)["added"] == 0
+
+
+def test_force_reembeds_everything(kb, mock_rag):
+    first = mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    forced = mock_rag.index_knowledge_base(force=True, **SMALL_CHUNKS)
+    assert forced == {"added": first["added"], "kept": 0, "removed": 0}
+
+
+def test_new_tokenizer_resyncs_every_document(kb, mock_rag, monkeypatch):
+    first = mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    assert mock_rag.load_doc_hashes()["_chunking"] == f"40/8/{mock_rag.estimator.tokenizer_id()}"
+    
+    monkeypatch.setattr(mock_rag.estimator, "tokenizer_id", lambda: "tiktoken/other")
+    counts = mock_rag.index_knowledge_base(**SMALL_CHUNKS)
+    assert counts == {"added": 0, "kept": first["added"], "removed": 0}  # Same chunks, but every document was re-chunked
+    assert mock_rag.load_doc_hashes()["_chunking"] == "40/8/tiktoken/other"
+
+
+def test_long_paragraph_chunks_stay_within_budget(mock_rag):
+    paragraph = " ".join(f"Point {i} about the launch review and what it taught the team." for i in range(200))
+    chunks = list(mock_rag.iter_chunks("# Launch\n\n" + paragraph, max_tokens=60, overlap_tokens=12))
+    
+    assert len(chunks) > 10
+    assert all(mock_rag.estimator.count_tokens(chunk) <= 60 for chunk, _ in chunks)
+    assert all(chunk.startswith("# Launch\n") for chunk, _ in chunks)
+    for (previous, _), (chunk, _) in zip(chunks, chunks[1:]):
+        assert chunk.split("\n", 1)[1].split()[0] in previous.split()[-12:]  # Starts with the previous chunk's tail
@@ -0,0 +1,60 @@
+"""SQLite response cache: round-trip through the mock server, TTL and LRU eviction."""
+
+import time
+
+
+def test_round_trip_through_mock_server(app):
+    response, stats = app.cached_call_anthropic("mock-key", "setback", "I missed the launch date.", use_rag=False)
+    assert response
+    assert not stats.get("cached")
+    
+    cached, cached_stats = app.cached_call_anthropic("mock-key", "setback", "I missed the launch date.", use_rag=False)
+    assert cached == response
+    assert cached_stats["cached"] and cached_stats["cache_tier"] == "exact"
+    assert cached_stats["cost"] == 0.0
+    
+    stats = app.get_cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_key_includes_model_and_rag_context(app):
+    app.cache_response("setback", "text", True, "response", {}, model="a", rag_context="ctx")
+    assert app.get_cached_response("setback", "text", True, model="a", rag_context="ctx")[0] == "response"
+    assert app.get_cached_response("setback", "text", True, model="b", rag_context="ctx") is None
+    assert app.get_cached_response("setback", "text", True, model="a", rag_context="other") is None
+
+
+def test_expired_entry_is_a_miss_and_removed(app, monkeypatch):
+    app.cache_response("setback", "old", False, "response", {})
+    real_time = time.time
+    monkeypatch.setattr(app.time, "time", lambda: real_time() + app.CACHE_TTL_SECONDS + 1)
+    
+    assert app.get_cached_response("setback", "old", False) is None
+    assert app.get_cache_size() == 0
+
+
+def test_eviction_keeps_most_recently_used(app, monkeypatch):
+    monkeypatch.setattr(app, "CACHE_MAX_ENTRIES", 3)
+    for i in range(5):
+        app.cache_response("setback", f"entry {i}", False, f"response {i}", {})
+        time.sleep(0.01)
+    app.get_cached_response("setback", "entry 0", False)  # Touch the oldest
+    
+    conn = app.connect_cache_db()
+    try:
+        app.evict_cache(conn)
+    finally:
+        conn.close()
+    
+    assert app.get_cache_size() == 3
+    assert app.get_cached_response("setback", "entry 0", False) is not None
+    assert app.get_cached_response("setback", "entry 1", False) is None
+    assert app.get_cached_response("setback", "entry 4", False) is not None
+
+
+def test_clear_cache(app):
+    app.cache_response("setback", "text", False, "response", {})
+    app.record_cache_stats(hits=1)
+    app.clear_cache()
+    assert app.get_cache_size() == 0
+    assert app.get_cache_stats()["hits"] == 0
@@ -0,0 +1,111 @@
+"""Semantic cache tier: in-memory index sync, eviction, encoder switches and clears."""
+
+import numpy as np
+
+
+def unit(seed: int, dim: int = 384) -> np.ndarray:
+    vector = np.random.default_rng(seed).normal(size=dim).astype("float32")
+    return vector / np.linalg.norm(vector)
+
+
+def test_near_duplicate_hits_through_mock_server(app, mock_rag):
+    first, _ = app.cached_call_anthropic("mock-key", "setback", "I missed the launch date again",
+                                         use_rag=False, semantic=True)
+    second, stats = app.cached_call_anthropic("mock-key", "setback", "I missed the launch date, again!",
+                                              use_rag=False, semantic=True)
+    assert second == first
+    assert stats["cache_tier"] == "semantic"
+    assert app.get_cache_stats()["semantic_hits"] == 1
+
+
+def test_match_is_scoped(app, mock_rag):
+    vector = unit(0)
+    app.cache_response("setback", "text", True, "response", {}, model="m", embedding=vector)
+    assert app.find_semantic_match("setback", True, "m", vector)[0] == "response"
+    assert app.find_semantic_match("decision", True, "m", vector) is None
+    assert app.find_semantic_match("setback", True, "other", vector) is None
+
+
+def test_rows_written_after_load_are_picked_up(app, mock_rag):
+    app.cache_response("setback", "a", True, "response a", {}, model="m", embedding=unit(1))
+    assert app.find_semantic_match("setback", True, "m", unit(1))
+    app.cache_response("setback", "b", True, "response b", {}, model="m", embedding=unit(2))
+    assert app.find_semantic_match("setback", True, "m", unit(2))[0] == "response b"
+
+
+def test_eviction_removes_rows_from_memory(app, mock_rag, monkeypatch):
+    for i in range(10):
+        app.cache_response("setback", f"text {i}", True, f"response {i}", {}, model="m", embedding=unit(i))
+    assert app.find_semantic_match("setback", True, "m", unit(0))
+    
+    monkeypatch.setattr(app, "CACHE_MAX_ENTRIES", 4)
+    conn = app.connect_cache_db()
+    try:
+        app.evict_cache(conn)
+    finally:
+        conn.close()
+    
+    index = next(iter(app.get_semantic_indexes()["scopes"].values()))
+    assert index["size"] == 4
+    assert all(index["keys"][position] == key for key, position in index["positions"].items())
+    assert sum(app.find_semantic_match("setback", True, "m", unit(i)) is not None for i in range(10)) == 4
+
+
+def test_encoder_switch_is_a_miss_not_an_error(app, mock_rag, monkeypatch):
+    app.cache_response("setback", "text", True, "response", {}, model="m", embedding=unit(0))
+    assert app.find_semantic_match("setback", True, "m", unit(0))
+    
+    monkeypatch.setattr(mock_rag, "ENCODER_ID", "ollama/wider-model")
+    assert app.find_semantic_match("setback", True, "m", unit(0, dim=768)) is None
+    app.cache_response("setback", "text 2", True, "wide", {}, model="m", embedding=unit(1, dim=768))
+    assert app.find_semantic_match("setback", True, "m", unit(1, dim=768))[0] == "wide"
+
+
+def test_width_mismatch_within_a_scope_is_skipped(app, mock_rag):
+    app.cache_response("setback", "text", True, "response", {}, model="m", embedding=unit(0))
+    app.cache_response("setback", "wide", True, "wide", {}, model="m", embedding=unit(1, dim=768))
+    assert app.find_semantic_match("setback", True, "m", unit(0))[0] == "response"
+    assert app.find_semantic_match("setback", True, "m", unit(1, dim=768)) is None
+
+
+def test_clear_by_another_process_is_detected(app, mock_rag, monkeypatch):
+    for i in range(3):
+        app.cache_response("setback", f"old {i}", True, f"old {i}", {}, model="m", embedding=unit(i))
+    assert app.find_semantic_match("setback", True, "m", unit(0))
+    
+    # Another process clears the cache (its in-memory reset doesn't reach us),
+    # then writes at least as many rows as this process had loaded
+    monkeypatch.setattr(app, "reset_semantic_index", lambda: None)
+    app.clear_cache()
+    for i in range(3):
+        app.cache_response("setback", f"new {i}", True, f"new {i}", {}, model="m", embedding=unit(100 + i))
+    
+    assert app.find_semantic_match("setback", True, "m", unit(0)) is None
+    assert app.find_semantic_match("setback", True, "m", unit(102))[0] == "new 2"
+
+
+def test_replaced_row_gets_a_new_id(app, mock_rag):
+    app.cache_response("setback", "text", True, "first", {}, model="m", embedding=unit(0))
+    assert app.find_semantic_match("setback", True, "m", unit(0))[0] == "first"
+    
+    # Rewriting the newest row must not reuse its id, or the new vector would be missed
+    app.cache_response("setback", "text", True, "second", {}, model="m", embedding=unit(5))
+    assert app.find_semantic_match("setback", True, "m", unit(5))[0] == "second"
+    assert app.find_semantic_match("setback", True, "m", unit(0)) is None
+
+
+def test_old_schema_is_rebuilt(app):
+    import sqlite3
+    conn = sqlite3.connect(app.CACHE_DB)
+    conn.execute("CREATE TABLE semantic_index (key TEXT PRIMARY KEY, scope TEXT NOT NULL, embedding BLOB NOT NULL)")
+    conn.execute("INSERT INTO semantic_index VALUES ('k', 's', x'00')")
+    conn.commit()
+    conn.close()
+    
+    conn = app.connect_cache_db()
+    try:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(semantic_index)")]
+        assert columns[0] == "id"
+        assert conn.execute("SELECT COUNT(*) FROM semantic_index").fetchone()[0] == 0
+    finally:
+        conn.close()
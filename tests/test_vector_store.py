@@ -0,0 +1,142 @@
+"""NumpyVectorStore: log replay, torn writes, compaction and several writers on one store."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import vector_store
+from vector_store import NumpyVectorStore
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def unit_vectors(n: int, dim: int = 8, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def add_rows(store: NumpyVectorStore, ids: list, vectors: np.ndarray):
+    store.add(ids=ids, embeddings=vectors.tolist(), documents=[f"doc {i}" for i in ids],
+              metadatas=[{"source": i} for i in ids])
+
+
+def assert_self_matches(store: NumpyVectorStore, ids: list, vectors: np.ndarray):
+    """Every stored vector's nearest neighbour is its own ID."""
+    result = store.query(vectors.tolist(), n_results=1)
+    assert [found[0] for found in result["ids"]] == ids
+    assert np.allclose([d[0] for d in result["distances"]], 0, atol=1e-5)
+
+
+def test_round_trip_survives_reopen(tmp_path):
+    ids = [f"c{i}" for i in range(10)]
+    vectors = unit_vectors(10)
+    store = NumpyVectorStore(tmp_path)
+    add_rows(store, ids, vectors)
+    store.update(ids=["c3"], metadatas=[{"source": "moved"}])
+    store.delete(ids=["c4"])
+    add_rows(store, ["c0"], vectors[:1])  # Existing IDs are ignored
+    
+    reopened = NumpyVectorStore(tmp_path)
+    assert reopened.count() == 9
+    assert reopened.get(ids=["c3"])["metadatas"] == [{"source": "moved"}]
+    assert reopened.get(ids=["c4"])["ids"] == []
+    live = [i for i in range(10) if i != 4]
+    assert_self_matches(reopened, [ids[i] for i in live], vectors[live])
+
+
+def test_float16_store(tmp_path):
+    ids = [f"c{i}" for i in range(5)]
+    vectors = unit_vectors(5)
+    add_rows(NumpyVectorStore(tmp_path, dtype="float16"), ids, vectors)
+    
+    reopened = NumpyVectorStore(tmp_path, dtype="float32")
+    assert reopened.dtype == np.float16
+    assert reopened.query(vectors.tolist(), n_results=1)["ids"] == [[i] for i in ids]
+
+
+def test_torn_log_write_is_cut_off(tmp_path):
+    vectors = unit_vectors(3)
+    add_rows(NumpyVectorStore(tmp_path), ["a", "b"], vectors[:2])
+    with open(tmp_path / vector_store.LOG_FILE, "a") as f:
+        f.write('{"op": "add", "row": 2, "id": "c"')
+    
+    store = NumpyVectorStore(tmp_path)
+    assert store.count() == 2
+    add_rows(store, ["c"], vectors[2:])
+    assert NumpyVectorStore(tmp_path).get()["ids"] == ["a", "b", "c"]
+
+
+def test_records_without_vectors_are_dropped(tmp_path):
+    vectors = unit_vectors(3)
+    add_rows(NumpyVectorStore(tmp_path), ["a", "b", "c"], vectors)
+    vectors_path = tmp_path / vector_store.VECTORS_FILE
+    vectors_path.write_bytes(vectors_path.read_bytes()[:2 * 8 * 4])  # Lose the last row
+    
+    store = NumpyVectorStore(tmp_path)
+    assert store.get()["ids"] == ["a", "b"]
+    add_rows(store, ["c"], vectors[2:])
+    assert_self_matches(NumpyVectorStore(tmp_path), ["a", "b", "c"], vectors)
+
+
+def test_compaction_rewrites_live_rows(tmp_path):
+    ids = [f"c{i}" for i in range(10)]
+    vectors = unit_vectors(10)
+    store = NumpyVectorStore(tmp_path)
+    add_rows(store, ids, vectors)
+    store.delete(ids=ids[:6])
+    
+    assert (tmp_path / vector_store.VECTORS_FILE).stat().st_size == 4 * 8 * 4
+    assert len((tmp_path / vector_store.LOG_FILE).read_text().splitlines()) == 4
+    assert_self_matches(store, ids[6:], vectors[6:])
+    assert_self_matches(NumpyVectorStore(tmp_path), ids[6:], vectors[6:])
+
+
+def test_two_instances_on_one_path(tmp_path):
+    vectors = unit_vectors(9)
+    first, second = NumpyVectorStore(tmp_path), NumpyVectorStore(tmp_path)
+    add_rows(first, ["a", "b", "c"], vectors[0:3])
+    add_rows(second, ["d", "e", "f"], vectors[3:6])
+    add_rows(first, ["g", "h", "i", "d"], np.vstack([vectors[6:9], vectors[3:4]]))
+    
+    assert first.count() == 9
+    assert_self_matches(NumpyVectorStore(tmp_path), list("abcdefghi"), vectors)
+
+
+def test_instance_sees_compaction_by_another(tmp_path):
+    vectors = unit_vectors(6)
+    first, second = NumpyVectorStore(tmp_path), NumpyVectorStore(tmp_path)
+    add_rows(first, list("abcd"), vectors[:4])
+    second.delete(ids=list("abc"))  # Compacts: "d" moves to row 0
+    add_rows(first, ["e", "f"], vectors[4:])
+    
+    assert first.get()["ids"] == ["d", "e", "f"]
+    assert_self_matches(NumpyVectorStore(tmp_path), ["d", "e", "f"], vectors[3:])
+
+
+WRITER_SCRIPT = """
+import sys
+import numpy as np
+from vector_store import NumpyVectorStore
+
+path, prefix, seed = sys.argv[1], sys.argv[2], int(sys.argv[3])
+store = NumpyVectorStore(path)
+vectors = np.random.default_rng(seed).normal(size=(40, 8))
+for i, vector in enumerate(vectors):
+    store.add(ids=[f"{prefix}{i}"], embeddings=[vector.tolist()])
+"""
+
+
+def test_concurrent_writer_processes(tmp_path):
+    writers = [
+        subprocess.Popen([sys.executable, "-c", WRITER_SCRIPT, str(tmp_path), prefix, str(seed)], cwd=REPO)
+        for seed, prefix in enumerate(["x", "y", "z"])
+    ]
+    assert all(writer.wait(timeout=120) == 0 for writer in writers)
+    
+    store = NumpyVectorStore(tmp_path)
+    assert store.count() == 120
+    for seed, prefix in enumerate(["x", "y", "z"]):
+        vectors = np.random.default_rng(seed).normal(size=(40, 8)).astype(np.float32)
+        assert_self_matches(store, [f"{prefix}{i}" for i in range(40)], vectors)
@@ -0,0 +1,334 @@
+"""
+Sage Vector Store
+A small exact-search vector index on NumPy, as a lighter alternative to
+ChromaDB for knowledge bases of a few thousand chunks.
+
+Embeddings are normalized and appended to a raw float32/float16 file that is
+memory-mapped for search. IDs, documents and metadata live in an append-only
+JSON-lines log next to it. Search is one matrix-vector product per query.
+Writers take an exclusive lock on the directory and first replay whatever
+other processes appended, so several processes can share one store.
+
+It implements the subset of Chroma's collection API that rag.py uses, so
+rag.get_collection() can return either.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, one writer at a time
+    fcntl = None
+
+VECTORS_FILE = "vectors.bin"
+LOG_FILE = "records.jsonl"
+HEADER_FILE = "header.json"
+LOCK_FILE = "lock"
+
+# Rewrite the files once deleted rows outnumber live ones
+COMPACT_RATIO = 0.5
+
+# Rows scored per block, bounding the float32 copy a float16 matrix needs
+SEARCH_BLOCK_ROWS = 65_536
+
+
+class NumpyVectorStore:
+    """
+    Persistent exact cosine-similarity index.
+    
+    Rows are only ever appended; updates and deletes are recorded in the log
+    and deleted rows are skipped at search time until compaction. Writing the
+    vectors before their log entries means a crash can at worst leave orphan
+    rows, which are ignored on load.
+    """
+    
+    def __init__(self, path: Path, dtype: str = "float32"):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        
+        with self._file_lock():
+            self._read_header()
+            self._load()
+    
+    # --- Persistence ---
+    
+    @contextmanager
+    def _file_lock(self):
+        """
+        Hold the thread lock and an exclusive lock on the store's directory.
+        
+        flock locks are per open file, so this must not be nested: only the
+        public methods take it.
+        """
+        with self._lock, open(self.path / LOCK_FILE, "a") as f:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _read_header(self):
+        """Take dim and dtype from the header once the first add has written it."""
+        header_path = self.path / HEADER_FILE
+        if header_path.exists():
+            header = json.loads(header_path.read_text())
+            self.dtype = np.dtype(header["dtype"])
+            self.dim = header["dim"]
+    
+    def _load(self):
+        """Replay the record log into memory and map the vectors file."""
+        self._ids = []  # Row -> ID, None once deleted
+        self._documents = []
+        self._metadatas = []
+        self._rows = {}  # ID -> row
+        self._log_offset = 0  # Bytes of the log replayed so far
+        self._log_inode = None  # Changes when compaction replaces the log
+        self._replay_log()
+        
+        self._matrix = None
+        self._mapped_rows = 0
+        self._live = None
+        
+        # Records whose vectors never made it to disk can't be searched; drop
+        # them and rewrite the log so row numbers match the file again
+        stored_rows = self._stored_rows()
+        if len(self._ids) > stored_rows:
+            for chunk_id in self._ids[stored_rows:]:
+                self._rows.pop(chunk_id, None)
+            del self._ids[stored_rows:], self._documents[stored_rows:], self._metadatas[stored_rows:]
+            self._compact()
+    
+    def _replay_log(self):
+        """Apply the records appended to the log since the last replay."""
+        log_path = self.path / LOG_FILE
+        if not log_path.exists():
+            return
+        with open(log_path, "rb+") as f:
+            f.seek(self._log_offset)
+            offset = self._log_offset
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise json.JSONDecodeError("unterminated record", "", 0)
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn final write; cut it off so later appends start on a clean line
+                    f.truncate(offset)
+                    break
+                self._apply(record)
+                offset += len(line)
+            self._log_offset = offset
+            self._log_inode = os.fstat(f.fileno()).st_ino
+        self._live = None
+    
+    def _sync(self):
+        """
+        Catch up with writes other processes made since this instance last
+        read the log. Call with the file lock held.
+        """
+        try:
+            stat = (self.path / LOG_FILE).stat()
+        except FileNotFoundError:
+            return
+        if self.dim is None:
+            self._read_header()
+        if stat.st_ino != self._log_inode or stat.st_size < self._log_offset:
+            self._load()  # Compacted elsewhere: row numbers have all changed
+        elif stat.st_size > self._log_offset:
+            self._replay_log()
+    
+    def _apply(self, record: dict):
+        """Apply one log record to the in-memory state."""
+        op = record["op"]
+        if op == "add":
+            row = record["row"]
+            while len(self._ids) < row:
+                self._ids.append(None)
+                self._documents.append(None)
+                self._metadatas.append(None)
+            self._ids.append(record["id"])
+            self._documents.append(record["document"])
+            self._metadatas.append(record["metadata"])
+            self._rows[record["id"]] = row
+        elif op == "update" and record["id"] in self._rows:
+            self._metadatas[self._rows[record["id"]]] = record["metadata"]
+        elif op == "delete" and record["id"] in self._rows:
+            row = self._rows.pop(record["id"])
+            self._ids[row] = None
+            self._documents[row] = None
+            self._metadatas[row] = None
+    
+    def _append_log(self, records: List[dict]):
+        with open(self.path / LOG_FILE, "ab") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in records).encode())
+            self._log_offset = f.tell()
+            self._log_inode = os.fstat(f.fileno()).st_ino
+        for record in records:
+            self._apply(record)
+        self._live = None
+    
+    def _stored_rows(self) -> int:
+        """Complete rows in the vectors file."""
+        vectors_path = self.path / VECTORS_FILE
+        if self.dim is None or not vectors_path.exists():
+            return 0
+        return vectors_path.stat().st_size // (self.dim * self.dtype.itemsize)
+    
+    def _get_matrix(self) -> np.ndarray:
+        """Memory-mapped (rows, dim) matrix, remapped after appends."""
+        rows = len(self._ids)
+        if self._matrix is None or self._mapped_rows != rows:
+            if rows == 0:
+                self._matrix = np.zeros((0, self.dim or 0), dtype=self.dtype)
+            else:
+                self._matrix = np.memmap(self.path / VECTORS_FILE, dtype=self.dtype,
+                                         mode="r", shape=(rows, self.dim))
+            self._mapped_rows = rows
+        return self._matrix
+    
+    def _get_live(self) -> np.ndarray:
+        """Boolean mask of rows that haven't been deleted."""
+        if self._live is None:
+            self._live = np.array([chunk_id is not None for chunk_id in self._ids], dtype=bool)
+        return self._live
+    
+    def _compact(self):
+        """Rewrite the vectors and log with only live rows."""
+        live = [row for row, chunk_id in enumerate(self._ids) if chunk_id is not None]
+        matrix = np.array(self._get_matrix()[live]) if live else np.zeros((0, self.dim), dtype=self.dtype)
+        records = [
+            {"op": "add", "row": new_row, "id": self._ids[row],
+             "document": self._documents[row], "metadata": self._metadatas[row]}
+            for new_row, row in enumerate(live)
+        ]
+        self._matrix = None
+        
+        vectors_tmp = self.path / (VECTORS_FILE + ".tmp")
+        log_tmp = self.path / (LOG_FILE + ".tmp")
+        matrix.tofile(vectors_tmp)
+        log_tmp.write_text("".join(json.dumps(r) + "\n" for r in records))
+        vectors_tmp.replace(self.path / VECTORS_FILE)
+        log_tmp.replace(self.path / LOG_FILE)
+        self._load()
+    
+    # --- Chroma-compatible collection API ---
+    
+    def count(self) -> int:
+        return len(self._rows)
+    
+    def add(self, ids: List[str], embeddings: list, documents: List[str] = None, metadatas: List[dict] = None):
+        """Add records. IDs already present are ignored, as in Chroma."""
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        
+        with self._file_lock():
+            self._sync()
+            keep = [i for i, chunk_id in enumerate(ids) if chunk_id not in self._rows]
+            if not keep:
+                return
+            
+            vectors = np.asarray(embeddings, dtype=np.float32)[keep]
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+            
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                (self.path / HEADER_FILE).write_text(json.dumps({"dim": self.dim, "dtype": self.dtype.name}))
+            
+            # The log, now replayed up to date, says how many rows the vectors
+            # file holds; drop any orphan rows from an interrupted add beyond them
+            start_row = len(self._ids)
+            with open(self.path / VECTORS_FILE, "ab") as f:
+                f.truncate(start_row * self.dim * self.dtype.itemsize)
+                f.write(vectors.astype(self.dtype).tobytes())
+            
+            self._append_log([
+                {"op": "add", "row": start_row + n, "id": ids[i],
+                 "document": documents[i], "metadata": metadatas[i]}
+                for n, i in enumerate(keep)
+            ])
+    
+    def update(self, ids: List[str], metadatas: List[dict]):
+        """Replace metadata of existing records."""
+        with self._file_lock():
+            self._sync()
+            self._append_log([
+                {"op": "update", "id": chunk_id, "metadata": metadata}
+                for chunk_id, metadata in zip(ids, metadatas)
+                if chunk_id in self._rows
+            ])
+    
+    def delete(self, ids: List[str]):
+        """Delete records by ID."""
+        with self._file_lock():
+            self._sync()
+            self._append_log([{"op": "delete", "id": chunk_id} for chunk_id in ids if chunk_id in self._rows])
+            if len(self._ids) - len(self._rows) > COMPACT_RATIO * len(self._ids):
+                self._compact()
+    
+    def get(self, ids: List[str] = None, include: List[str] = ("metadatas", "documents")) -> dict:
+        """Records by ID, or all records."""
+        with self._lock:
+            if ids is None:
+                rows = list(self._rows.values())
+            else:
+                rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+            
+            result = {"ids": [self._ids[row] for row in rows]}
+            if "documents" in include:
+                result["documents"] = [self._documents[row] for row in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[row] for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = np.array(self._get_matrix()[rows], dtype=np.float32)
+            return result
+    
+    def query(self, query_embeddings: list, n_results: int = 10,
+              include: List[str] = ("metadatas", "documents", "distances")) -> dict:
+        """
+        Exact top-n_results by cosine similarity for each query embedding.
+        
+        Returns:
+            Chroma-shaped dict of per-query lists; distances are 1 - similarity
+        """
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        
+        with self._lock:
+            matrix = self._get_matrix()
+            live = self._get_live()
+            ids, documents, metadatas = self._ids, self._documents, self._metadatas
+        
+        live_count = int(live.sum())
+        for query in np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1):
+            n = min(n_results, live_count)
+            if n == 0:
+                top, scores = np.array([], dtype=int), np.array([], dtype=np.float32)
+            else:
+                query = query / (np.linalg.norm(query) or 1)
+                scores = np.empty(len(matrix), dtype=np.float32)
+                for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+                    block = matrix[start:start + SEARCH_BLOCK_ROWS]
+                    scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+                scores[~live] = -np.inf
+                top = np.argpartition(-scores, n - 1)[:n]
+                top = top[np.argsort(-scores[top])]
+            
+            result["ids"].append([ids[row] for row in top])
+            result["documents"].append([documents[row] for row in top])
+            result["metadatas"].append([metadatas[row] for row in top])
+            result["distances"].append([float(1 - scores[row]) for row in top])
+        
+        return {key: value for key, value in result.items() if key == "ids" or key in include}